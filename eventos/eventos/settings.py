@@ -1,5 +1,7 @@
 import os
+import sys
 import environ
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 
 # 1. DEFINIR BASE_DIR
@@ -36,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders', 
     'rest_framework',
     'fiesta',
@@ -50,8 +53,27 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Paginación keyset opt-in (?page_size= / ?cursor=) en todos los ViewSets
+    'DEFAULT_PAGINATION_CLASS': 'fiesta.paginacion.PaginacionKeyset',
+    # ?fields= / ?omit= también recortan columnas y JOINs del queryset
+    'DEFAULT_FILTER_BACKENDS': ['fiesta.campos_dinamicos.PodaCamposBackend'],
+    # JSON con orjson + MessagePack (Accept: application/msgpack)
+    'DEFAULT_RENDERER_CLASSES': [
+        'fiesta.renderers.JSONRapidoRenderer',
+        'fiesta.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'fiesta.renderers.MessagePackParser',
+    ],
 }
 
+PAGINACION_PAGE_SIZE = env.int('PAGINACION_PAGE_SIZE', default=50)
+PAGINACION_MAX_PAGE_SIZE = env.int('PAGINACION_MAX_PAGE_SIZE', default=200)
+
 # MIDDLEWARE: El orden de CorsMiddleware es vital
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -101,6 +123,47 @@ DATABASES = {
     }
 }
 
+# Caches compartidas (snapshots del catálogo, carritos de invitados). Por defecto en
+# disco (filecache), compartida por todos los workers de gunicorn del host y sin
+# tocar la base; con más de un host, un Redis: CACHE_URL=redis://localhost:6379/1
+# La memoria local (locmem) es propia de cada proceso: solo sirve en DEBUG y en los tests
+CACHE_LOCAL_PERMITIDA = DEBUG or sys.argv[1:2] == ['test']
+CACHE_DIRECTORIO = env('CACHE_DIRECTORIO', default='/var/tmp/eventos')
+CACHES = {
+    # Versión y snapshots del catálogo: un incremento de versión tiene que verse en todos los workers
+    'default': env.cache(
+        'CACHE_URL', default='locmemcache://' if CACHE_LOCAL_PERMITIDA else f'filecache://{CACHE_DIRECTORIO}/catalogo',
+    ),
+    # Carritos de invitados: el POST y el GET / login siguiente caen en workers distintos.
+    # Nunca en la base (dbcache): navegar como invitado no escribe en la base principal
+    'carritos': env.cache(
+        'CARRITO_CACHE_URL',
+        default='locmemcache://carritos' if CACHE_LOCAL_PERMITIDA else f'filecache://{CACHE_DIRECTORIO}/carritos',
+    ),
+}
+CACHES_COMPARTIDAS = ('default', 'carritos')
+if not CACHE_LOCAL_PERMITIDA:
+    for _alias in CACHES_COMPARTIDAS:
+        if CACHES[_alias]['BACKEND'].endswith('LocMemCache'):
+            raise ImproperlyConfigured(
+                f"CACHES['{_alias}'] es locmem: con varios workers de gunicorn cada uno tendría "
+                f"su propia copia. Usar una cache compartida (dbcache://, redis://, filecache://)."
+            )
+CATALOGO_CACHE_TIMEOUT = env.int('CATALOGO_CACHE_TIMEOUT', default=86400)
+# Las señales ya invalidan el mes; el timeout cubre escrituras sin señales (.update())
+CALENDARIO_CACHE_TIMEOUT = env.int('CALENDARIO_CACHE_TIMEOUT', default=600)
+
+# Retención de horarios durante el checkout (minutos)
+BLOQUEO_HORARIO_MINUTOS = env.int('BLOQUEO_HORARIO_MINUTOS', default=10)
+BLOQUEO_HORARIO_MAX_MINUTOS = env.int('BLOQUEO_HORARIO_MAX_MINUTOS', default=30)
+
+# Carrito de invitado: alias de CACHES y vida de la cookie/entrada (segundos)
+CARRITO_INVITADO_CACHE = env('CARRITO_INVITADO_CACHE', default='carritos')
+CARRITO_INVITADO_TIMEOUT = env.int('CARRITO_INVITADO_TIMEOUT', default=7 * 24 * 3600)
+
+# Idempotency-Key: horas que se guarda la respuesta para repetirla en los reintentos
+IDEMPOTENCIA_TTL_HORAS = env.int('IDEMPOTENCIA_TTL_HORAS', default=24)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -138,6 +201,7 @@ CORS_ALLOW_HEADERS = [
     "x-csrftoken",
     "x-requested-with",
     "ngrok-skip-browser-warning",  # <--- Esta línea es vital
+    "idempotency-key",
 ]
 
 APPEND_SLASH = True
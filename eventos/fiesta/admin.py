@@ -2,8 +2,12 @@ from django.contrib import admin
 from .models import (
     RegistroUsuario, Categoria, Promocion, Servicio, Combo, ComboServicio,
     HorarioDisponible, Reserva, DetalleReserva, Pago, Cancelacion,
-    Carrito, ItemCarrito, ConfiguracionPago  # <--- AGREGADOS AQUÍ
+    Carrito, ItemCarrito, ConfiguracionPago,  # <--- AGREGADOS AQUÍ
+    PlantillaHorario, VentanaPlantilla,
 )
+from django.utils import timezone
+
+from .disponibilidad import generar_horarios
 
 # ==========================================
 # USUARIOS
@@ -52,10 +56,26 @@ class HorarioDisponibleAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'hora_inicio', 'hora_fin', 'disponible', 'capacidad_reserva')
     list_filter = ('fecha', 'disponible')
 
+class VentanaPlantillaInline(admin.TabularInline):
+    model = VentanaPlantilla
+    extra = 1
+
+@admin.register(PlantillaHorario)
+class PlantillaHorarioAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'dias_semana', 'capacidad_reserva', 'fecha_desde', 'fecha_hasta', 'activo')
+    list_filter = ('activo',)
+    inlines = [VentanaPlantillaInline]
+    actions = ['generar_horarios']
+
+    @admin.action(description='Generar horarios disponibles (desde hoy)')
+    def generar_horarios(self, request, queryset):
+        candidatos, fechas = generar_horarios(queryset.prefetch_related('ventanas'), desde=timezone.localdate())
+        self.message_user(request, f'{candidatos} horarios procesados en {len(fechas)} días (los existentes se conservan).')
+
 class DetalleReservaInline(admin.TabularInline):
     model = DetalleReserva
     extra = 0
-    readonly_fields = ('subtotal',)
+    readonly_fields = ('nombre_item', 'subtotal')
 
 @admin.register(Reserva)
 class ReservaAdmin(admin.ModelAdmin):
@@ -91,7 +111,7 @@ class ItemCarritoInline(admin.TabularInline):
     """
     model = ItemCarrito
     extra = 0
-    readonly_fields = ('subtotal',) # El subtotal es calculado, mejor solo lectura
+    readonly_fields = ('nombre_item', 'subtotal',) # Copia del producto y subtotal calculado: solo lectura
 
 @admin.register(Carrito)
 class CarritoAdmin(admin.ModelAdmin):
@@ -105,5 +125,5 @@ class ItemCarritoAdmin(admin.ModelAdmin):
     """
     Vista individual de items por si necesitas buscar algo específico fuera de un carrito.
     """
-    list_display = ('id', 'carrito', 'servicio', 'combo', 'cantidad', 'subtotal')
-    search_fields = ('carrito__cliente__email', 'servicio__nombre', 'combo__nombre')
\ No newline at end of file
+    list_display = ('id', 'carrito', 'nombre_item', 'cantidad', 'subtotal')
+    search_fields = ('carrito__cliente__email', 'nombre_item')
\ No newline at end of file
@@ -0,0 +1,160 @@
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q
+
+from .catalogo import obtener_version_catalogo
+from .models import Servicio, Combo, Promocion
+
+
+# (tipo, modelo, filtro de publicados)
+FUENTES_BUSQUEDA = (
+    ('servicio', Servicio, Q(disponible=True)),
+    ('combo', Combo, Q(activo=True)),
+    ('promocion', Promocion, Q(activo=True)),
+)
+
+UMBRAL_TRIGRAMA = 0.3
+
+
+def _campos(modelo):
+    # Promocion no tiene imagen propia
+    campos = ['id', 'nombre', 'descripcion']
+    return campos if modelo is Promocion else campos + ['imagen']
+
+
+def buscar_catalogo(texto, limite, offset=0):
+    """
+    Busca en servicios, combos y promociones y devuelve resultados ordenados
+    por relevancia: [{'tipo', 'id', 'nombre', 'descripcion', 'imagen', 'rank'}].
+    PostgreSQL usa tsvector + GIN y trigramas; otros motores el índice en memoria.
+    """
+    if connection.vendor == 'postgresql':
+        resultados = _buscar_postgres(texto, limite + offset)
+    else:
+        resultados = _obtener_indice_local().buscar(texto, limite + offset)
+    return resultados[offset:offset + limite]
+
+
+# ==========================================
+# POSTGRESQL (tsvector + pg_trgm)
+# ==========================================
+
+def _buscar_postgres(texto, n):
+    consulta = SearchQuery(texto, config='spanish', search_type='websearch')
+    resultados = []
+    for tipo, modelo, publicados in FUENTES_BUSQUEDA:
+        # `busqueda=consulta` usa el GIN de texto completo y
+        # `nombre__trigram_word_similar` el GIN de trigramas (typos)
+        filas = modelo.objects.filter(publicados).filter(
+            Q(busqueda=consulta) | Q(nombre__trigram_word_similar=texto)
+        ).annotate(
+            rank=SearchRank(F('busqueda'), consulta) + TrigramWordSimilarity(texto, 'nombre')
+        ).order_by('-rank', 'id').values(*_campos(modelo), 'rank')[:n]
+        for fila in filas:
+            resultados.append({
+                'tipo': tipo,
+                'id': fila['id'],
+                'nombre': fila['nombre'],
+                'descripcion': fila['descripcion'],
+                'imagen': fila.get('imagen'),
+                'rank': round(float(fila['rank']), 4),
+            })
+    resultados.sort(key=lambda r: -r['rank'])
+    return resultados[:n]
+
+
+# ==========================================
+# FALLBACK EN MEMORIA (SQLite / tests)
+# ==========================================
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Animación' -> 'animacion'."""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+def trigramas(palabra):
+    palabra = f'  {palabra} '
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+class IndiceCatalogoLocal:
+    """
+    Índice invertido en memoria con tolerancia a errores por trigramas.
+    Pensado como reemplazo del índice de PostgreSQL cuando el motor no lo tiene.
+    """
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.postings = defaultdict(set)          # token -> índices de documentos
+        self.tokens_en_nombre = defaultdict(set)  # token -> documentos con el token en el nombre
+        self.trigramas = defaultdict(set)         # trigrama -> tokens del vocabulario
+
+        for i, doc in enumerate(documentos):
+            for token in tokenizar(doc['nombre']):
+                self.tokens_en_nombre[token].add(i)
+                self.postings[token].add(i)
+            for token in tokenizar(doc['descripcion']):
+                self.postings[token].add(i)
+        for token in self.postings:
+            for trigrama in trigramas(token):
+                self.trigramas[trigrama].add(token)
+
+    def _similares(self, token):
+        """Tokens del vocabulario parecidos a `token` (similitud de Jaccard)."""
+        propios = trigramas(token)
+        candidatos = defaultdict(int)
+        for trigrama in propios:
+            for otro in self.trigramas.get(trigrama, ()):
+                candidatos[otro] += 1
+        similares = []
+        for otro, comunes in candidatos.items():
+            similitud = comunes / (len(propios) + len(trigramas(otro)) - comunes)
+            if similitud >= UMBRAL_TRIGRAMA:
+                similares.append((otro, similitud))
+        return similares
+
+    def buscar(self, texto, n):
+        puntajes = defaultdict(float)
+        for token in tokenizar(texto):
+            coincidencias = [(token, 1.0)] if token in self.postings else self._similares(token)
+            for palabra, peso in coincidencias:
+                for i in self.postings[palabra]:
+                    # El nombre pesa el doble que la descripción
+                    puntajes[i] += peso * (2 if i in self.tokens_en_nombre.get(palabra, ()) else 1)
+
+        mejores = sorted(puntajes.items(), key=lambda par: (-par[1], par[0]))[:n]
+        return [dict(self.documentos[i], rank=round(puntaje, 4)) for i, puntaje in mejores]
+
+
+_indice_local = {'version': None, 'indice': None}
+_indice_local_lock = threading.Lock()
+
+
+def _obtener_indice_local():
+    """Reconstruye el índice solo cuando cambia la versión del catálogo."""
+    version = obtener_version_catalogo()
+    with _indice_local_lock:
+        if _indice_local['version'] != version:
+            documentos = []
+            for tipo, modelo, publicados in FUENTES_BUSQUEDA:
+                for fila in modelo.objects.filter(publicados).values(*_campos(modelo)).order_by('id'):
+                    documentos.append({
+                        'tipo': tipo,
+                        'id': fila['id'],
+                        'nombre': fila['nombre'],
+                        'descripcion': fila['descripcion'],
+                        'imagen': fila.get('imagen'),
+                    })
+            _indice_local['indice'] = IndiceCatalogoLocal(documentos)
+            _indice_local['version'] = version
+        return _indice_local['indice']
@@ -0,0 +1,99 @@
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def _separar(valor):
+    return {campo.strip() for campo in (valor or '').split(',') if campo.strip()}
+
+
+def _rutas(arbol, prefijo=''):
+    """{'cliente': {'usuario': {}}} -> ['cliente__usuario']"""
+    rutas = []
+    for nombre, hijos in arbol.items():
+        ruta = f"{prefijo}{nombre}"
+        rutas.extend(_rutas(hijos, f"{ruta}__") if hijos else [ruta])
+    return rutas
+
+
+class CamposDinamicosMixin:
+    """
+    Sparse fieldsets para lecturas:
+      ?fields=id,nombre  -> solo esos campos
+      ?omit=descripcion  -> todos menos esos
+    Solo poda el serializer raíz (los anidados reciben el contexto después)
+    y solo en GET, las escrituras siempre validan con todos los campos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.campos_podados = False
+
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        solicitados = _separar(request.query_params.get('fields'))
+        omitidos = _separar(request.query_params.get('omit'))
+        if not solicitados and not omitidos:
+            return
+
+        permitidos = set(self.fields)
+        if solicitados:
+            permitidos &= solicitados
+        permitidos -= omitidos
+        for nombre in set(self.fields) - permitidos:
+            self.fields.pop(nombre)
+        self.campos_podados = True
+
+
+class PodaCamposBackend(BaseFilterBackend):
+    """
+    Acompaña a CamposDinamicosMixin del lado de la base de datos:
+    - .only() con las columnas que realmente se van a serializar
+    - quita select_related / prefetch_related de relaciones omitidas
+    Si queda algún SerializerMethodField (source='*') no se toca el queryset,
+    porque no sabemos qué columnas usa el método.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if request.method != 'GET' or not hasattr(view, 'get_serializer'):
+            return queryset
+        serializer = view.get_serializer()
+        if not getattr(serializer, 'campos_podados', False):
+            return queryset
+
+        modelo = queryset.model
+        concretos = {f.name: f for f in modelo._meta.concrete_fields}
+        multiples = {f.name for f in modelo._meta.many_to_many} | {
+            rel.get_accessor_name() for rel in modelo._meta.related_objects
+        }
+        columnas = {modelo._meta.pk.name}
+        relaciones = set()
+
+        for campo in serializer.fields.values():
+            origen = campo.source_attrs
+            if not origen:
+                return queryset
+            primero = origen[0]
+            if primero in concretos:
+                columnas.add(primero)
+                anidado = isinstance(campo, BaseSerializer) and not isinstance(campo, ListSerializer)
+                if concretos[primero].is_relation and (len(origen) > 1 or anidado):
+                    relaciones.add(primero)
+            elif primero in multiples:
+                # Relación inversa o M2M: la trae un prefetch
+                relaciones.add(primero)
+            else:
+                # Propiedad del modelo: puede leer cualquier columna
+                return queryset
+
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            queryset = queryset.select_related(None).select_related(
+                *[ruta for ruta in _rutas(select_related) if ruta.split('__')[0] in relaciones]
+            )
+
+        prefetch = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in relaciones
+        ]
+        return queryset.prefetch_related(None).prefetch_related(*prefetch).only(*columnas)
@@ -0,0 +1,78 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# ==========================================
+# CARRITO DE INVITADO
+# ==========================================
+# Los visitantes sin sesión arman el carrito en la cache (CARRITO_INVITADO_CACHE,
+# en disco o Redis, compartida entre workers; nunca dbcache), identificado por
+# una cookie firmada. La base principal no recibe escrituras hasta el login,
+# donde el carrito se fusiona con el Carrito persistente.
+
+COOKIE_CARRITO_INVITADO = 'carrito_invitado'
+SALT_CARRITO_INVITADO = 'fiesta.carrito_invitado'
+
+
+def _almacen():
+    return caches[settings.CARRITO_INVITADO_CACHE]
+
+
+def _clave_cache(clave):
+    return f'carrito_invitado:{clave}'
+
+
+def clave_de_request(request):
+    """Clave del carrito de la cookie firmada, o None si no hay cookie válida."""
+    return request.get_signed_cookie(
+        COOKIE_CARRITO_INVITADO, default=None, salt=SALT_CARRITO_INVITADO,
+        max_age=settings.CARRITO_INVITADO_TIMEOUT,
+    )
+
+
+def nueva_clave():
+    return uuid.uuid4().hex
+
+
+def leer_carrito(clave):
+    """{(tipo, item_id): cantidad} guardado para la clave ({} si no existe o expiró)."""
+    if not clave:
+        return {}
+    guardado = _almacen().get(_clave_cache(clave)) or {}
+    pedidos = {}
+    for producto, cantidad in guardado.items():
+        tipo, _, item_id = producto.partition(':')
+        pedidos[(tipo, int(item_id))] = cantidad
+    return pedidos
+
+
+def guardar_carrito(clave, pedidos):
+    """Reemplaza el carrito completo; un carrito vacío se borra."""
+    if not pedidos:
+        borrar_carrito(clave)
+        return
+    _almacen().set(
+        _clave_cache(clave),
+        {f'{tipo}:{item_id}': cantidad for (tipo, item_id), cantidad in pedidos.items()},
+        timeout=settings.CARRITO_INVITADO_TIMEOUT,
+    )
+
+
+def borrar_carrito(clave):
+    if clave:
+        _almacen().delete(_clave_cache(clave))
+
+
+def firmar_cookie(response, clave):
+    response.set_signed_cookie(
+        COOKIE_CARRITO_INVITADO, clave, salt=SALT_CARRITO_INVITADO,
+        max_age=settings.CARRITO_INVITADO_TIMEOUT, httponly=True,
+        # El frontend vive en otro dominio: sin SameSite=None el navegador no la envía
+        samesite='None', secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def borrar_cookie(response):
+    response.delete_cookie(COOKIE_CARRITO_INVITADO, samesite='None')
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+
+# ==========================================
+# VERSIÓN DEL CATÁLOGO
+# ==========================================
+
+CLAVE_VERSION_CATALOGO = 'catalogo:version'
+
+
+def obtener_version_catalogo():
+    """
+    Devuelve la versión actual del catálogo.
+    Si la clave no existe (cache vacía o expulsada) se inicializa con la hora
+    actual en milisegundos, así la versión nunca retrocede a un valor ya usado.
+    """
+    version = cache.get(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        cache.add(CLAVE_VERSION_CATALOGO, int(time.time() * 1000), timeout=None)
+        version = cache.get(CLAVE_VERSION_CATALOGO)
+    return version
+
+
+def incrementar_version_catalogo():
+    """
+    Invalida todos los snapshots del catálogo subiendo la versión.
+    Los snapshots viejos no se borran: quedan huérfanos y expiran solos.
+    """
+    try:
+        return cache.incr(CLAVE_VERSION_CATALOGO)
+    except ValueError:
+        # La clave no existía: la inicializamos y volvemos a incrementar
+        obtener_version_catalogo()
+        return cache.incr(CLAVE_VERSION_CATALOGO)
+
+
+# ==========================================
+# SNAPSHOTS CON ETAG
+# ==========================================
+
+class CatalogoSnapshotMixin:
+    """
+    Mixin para los ViewSets del catálogo.
+    Cachea el payload serializado de list/retrieve por versión de catálogo y
+    responde 304 cuando el cliente ya tiene la versión vigente (If-None-Match).
+    Una lectura con cache caliente no serializa ni consulta el catálogo.
+    La versión vive en CACHES['default'], compartida entre workers (settings).
+    """
+
+    def perform_authentication(self, request):
+        # Autenticación perezosa en lecturas: SoloLecturaOAdmin no necesita
+        # el usuario para GET, así evitamos la consulta del Token.
+        if request.method not in SAFE_METHODS:
+            super().perform_authentication(request)
+
+    def list(self, request, *args, **kwargs):
+        return self._responder_snapshot(request, lambda: super(CatalogoSnapshotMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._responder_snapshot(request, lambda: super(CatalogoSnapshotMixin, self).retrieve(request, *args, **kwargs))
+
+    def _responder_snapshot(self, request, generar_respuesta):
+        version = obtener_version_catalogo()
+        # URL absoluta (esquema + host): el payload lleva URLs absolutas del host pedido
+        huella = hashlib.sha1(
+            f"{request.build_absolute_uri()}|{request.accepted_media_type}".encode()
+        ).hexdigest()[:20]
+        etag = f'"{version}-{huella}"'
+        clave = f"catalogo:{version}:{huella}"
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(clave)
+            if data is None:
+                response = generar_respuesta()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                cache.set(clave, data, timeout=getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 86400))
+            response = Response(data)
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+# ==========================================
+# PROMOCIONES VIGENTES
+# ==========================================
+
+_promociones_activas = {'version': None, 'expira_en': None, 'data': None}
+_promociones_activas_lock = threading.Lock()
+
+
+def obtener_promociones_activas():
+    """
+    Promociones vigentes (activo y fecha_inicio <= ahora <= fecha_fin) serializadas.
+    Se guardan en memoria del proceso hasta el próximo borde (el inicio de la
+    siguiente promoción o el fin de una vigente), que es exactamente cuando el
+    conjunto cambia. Una edición del catálogo también las invalida.
+    """
+    from .models import Promocion
+    from .serializers import PromocionSerializer
+
+    version = obtener_version_catalogo()
+    ahora = timezone.now()
+    with _promociones_activas_lock:
+        cache_local = _promociones_activas
+        if (cache_local['version'] == version
+                and (cache_local['expira_en'] is None or ahora < cache_local['expira_en'])):
+            return cache_local['data']
+
+        # Ambas consultas usan promocion_vigencia_idx (activo, fecha_inicio, fecha_fin)
+        vigentes = list(Promocion.objects.filter(
+            activo=True, fecha_inicio__lte=ahora, fecha_fin__gte=ahora
+        ).order_by('fecha_fin', 'id'))
+        proximo_inicio = Promocion.objects.filter(
+            activo=True, fecha_inicio__gt=ahora
+        ).aggregate(proximo=Min('fecha_inicio'))['proximo']
+
+        # fecha_fin es inclusiva: la promoción deja de estar vigente justo después
+        bordes = [proximo_inicio] if proximo_inicio else []
+        if vigentes:
+            bordes.append(vigentes[0].fecha_fin + timedelta(microseconds=1))
+
+        cache_local.update(
+            version=version,
+            expira_en=min(bordes) if bordes else None,
+            data=PromocionSerializer(vigentes, many=True).data,
+        )
+        return cache_local['data']
@@ -0,0 +1,330 @@
+import base64
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import BloqueoHorario, HorarioDisponible, OcupacionHorario, Reserva
+
+
+# ==========================================
+# MOTOR DE DISPONIBILIDAD
+# ==========================================
+
+# Tope del rango consultable de una vez (el selector público pide por mes)
+MAX_DIAS_RANGO = 93
+
+
+def bloqueos_vigentes(cliente=None, using=None):
+    """Bloqueos no vencidos; sin los de `cliente` (los suyos no le restan cupo)."""
+    bloqueos = BloqueoHorario.objects.using(using).filter(expira_en__gt=timezone.now())
+    if cliente is not None:
+        bloqueos = bloqueos.exclude(cliente=cliente)
+    return bloqueos
+
+
+def horarios_con_ocupacion(desde, hasta, cliente=None):
+    """
+    Horarios habilitados entre `desde` y `hasta` (inclusive) con `cupos_libres`
+    anotado. Una sola consulta: el contador de OcupacionHorario llega con un
+    LEFT JOIN por clave primaria (sin fila = ninguna reserva activa) y los
+    bloqueos vigentes de otros clientes con una subconsulta por horario.
+    """
+    retenidos = (
+        bloqueos_vigentes(cliente).filter(horario=OuterRef('pk'))
+        .order_by().values('horario').annotate(total=Count('id')).values('total')
+    )
+    return (
+        HorarioDisponible.objects
+        .filter(fecha__range=(desde, hasta), disponible=True)
+        .annotate(cupos_libres=(
+            F('capacidad_reserva') - Coalesce('ocupacion__ocupados', 0) - Coalesce(Subquery(retenidos), 0)
+        ))
+        .order_by('fecha', 'hora_inicio')
+    )
+
+
+def horarios_con_cupo(desde, hasta, cliente=None):
+    """Solo los horarios del rango que aún tienen cupo (para `cliente`, si se indica)."""
+    return horarios_con_ocupacion(desde, hasta, cliente).filter(cupos_libres__gt=0)
+
+
+def primer_horario_con_cupo(fecha, cliente):
+    """Horario del día para el checkout: primero el que `cliente` tenga retenido."""
+    propio = bloqueos_vigentes().filter(horario=OuterRef('pk'), cliente=cliente)
+    return (
+        horarios_con_cupo(fecha, fecha, cliente)
+        .annotate(retenido=Exists(propio))
+        .order_by('-retenido', 'hora_inicio')
+        .first()
+    )
+
+
+# ==========================================
+# RESERVA DE CUPO (concurrencia)
+# ==========================================
+
+# SQLSTATE de Postgres para "could not obtain lock" (FOR UPDATE NOWAIT)
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+class HorarioBloqueado(Exception):
+    """Otro checkout tiene tomado el horario en este momento."""
+
+
+class HorarioSinCupo(Exception):
+    """El horario se llenó (o se deshabilitó) antes de tomar el lock."""
+
+
+def _lock_ocupado(error):
+    causa = error.__cause__
+    return LOCK_NOT_AVAILABLE in (getattr(causa, 'sqlstate', None), getattr(causa, 'pgcode', None))
+
+
+def _bloquear_horario(horario_id, cliente, using):
+    """
+    Bloquea la fila del horario (SELECT ... FOR UPDATE NOWAIT) y cuenta el
+    cupo ya con el lock tomado: capacidad - reservas activas - bloqueos
+    vigentes de otros clientes. Con NOWAIT el pedido concurrente falla al
+    instante (HorarioBloqueado) en lugar de hacer cola hasta el statement_timeout.
+    """
+    try:
+        horario = (
+            HorarioDisponible.objects.using(using)
+            .select_for_update(nowait=True)
+            .filter(pk=horario_id, disponible=True)
+            .first()
+        )
+    except OperationalError as e:
+        if _lock_ocupado(e):
+            raise HorarioBloqueado() from e
+        raise
+    if horario is None:
+        raise HorarioSinCupo()
+
+    # Consultas aparte (no un JOIN): con el lock ya tomado leen el último valor confirmado
+    ocupados = (
+        OcupacionHorario.objects.using(using)
+        .filter(horario_id=horario_id).values_list('ocupados', flat=True).first()
+    ) or 0
+    retenidos = bloqueos_vigentes(cliente, using).filter(horario_id=horario_id).count()
+    if ocupados + retenidos >= horario.capacidad_reserva:
+        raise HorarioSinCupo()
+    return horario
+
+
+def tomar_cupo(horario_id, using=None, cliente=None):
+    """
+    Verifica el cupo con el horario bloqueado y consume el bloqueo que
+    `cliente` tuviera sobre él. Debe llamarse dentro de transaction.atomic
+    (el lock se libera al confirmar o deshacer).
+    """
+    horario = _bloquear_horario(horario_id, cliente, using)
+    if cliente is not None:
+        BloqueoHorario.objects.using(using).filter(horario_id=horario_id, cliente=cliente).delete()
+    return horario
+
+
+def tomar_dia(fecha, using=None):
+    """
+    Checkout del carrito: un solo evento por día. Bloquea todos los horarios de
+    la fecha (FOR UPDATE NOWAIT, en orden de id) y con el lock tomado falla con
+    HorarioSinCupo si ya hay una reserva activa ese día (índice parcial
+    reserva_activa_fecha_idx). Dentro de transaction.atomic.
+    """
+    try:
+        list(
+            HorarioDisponible.objects.using(using).select_for_update(nowait=True)
+            .filter(fecha=fecha).order_by('pk').values_list('pk', flat=True)
+        )
+    except OperationalError as e:
+        if _lock_ocupado(e):
+            raise HorarioBloqueado() from e
+        raise
+    if Reserva.objects.using(using).filter(fecha_evento=fecha, estado__in=Reserva.ESTADOS_QUE_OCUPAN).exists():
+        raise HorarioSinCupo()
+
+
+def retener_horario(horario_id, cliente, minutos, using=None):
+    """
+    Retiene un cupo del horario para `cliente` durante `minutos`.
+    Si ya tenía un bloqueo sobre ese horario se extiende. Dentro de transaction.atomic.
+    """
+    horario = _bloquear_horario(horario_id, cliente, using)
+    bloqueo, _ = BloqueoHorario.objects.using(using).update_or_create(
+        horario=horario, cliente=cliente,
+        defaults={'expira_en': timezone.now() + timedelta(minutes=minutos)},
+    )
+    return bloqueo
+
+
+def expirar_bloqueos(using=None):
+    """
+    Borra los bloqueos vencidos con un único DELETE ... WHERE expira_en < now()
+    (BloqueoHorario no tiene señales ni dependientes, así Django no los carga
+    en memoria). Devuelve (borrados, fechas de los horarios liberados).
+    """
+    ahora = timezone.now()
+    vencidos = BloqueoHorario.objects.using(using).filter(expira_en__lt=ahora)
+    fechas = set(vencidos.values_list('horario__fecha', flat=True).distinct())
+    borrados, _ = vencidos.delete()
+    return borrados, fechas
+
+
+def leer_rango_fechas(params):
+    """
+    Lee `?desde=&hasta=` (o `?fecha=` para un solo día) de los query params.
+    Devuelve (desde, hasta, error); `error` es un mensaje listo para un 400.
+    """
+    desde_texto = params.get('desde') or params.get('fecha') or ''
+    hasta_texto = params.get('hasta') or desde_texto
+    try:
+        desde = parse_date(desde_texto)
+        hasta = parse_date(hasta_texto)
+    except ValueError:
+        return None, None, 'Fecha inválida (use AAAA-MM-DD)'
+
+    if not desde or not hasta:
+        return None, None, 'Falta fecha (use ?fecha= o ?desde=&hasta=, formato AAAA-MM-DD)'
+    if hasta < desde:
+        return None, None, '"hasta" no puede ser anterior a "desde"'
+    if hasta - desde > timedelta(days=MAX_DIAS_RANGO - 1):
+        return None, None, f'El rango máximo es de {MAX_DIAS_RANGO} días'
+    return desde, hasta, None
+
+
+# ==========================================
+# GENERACIÓN DESDE PLANTILLAS
+# ==========================================
+
+def _horarios_de_plantillas(plantillas, desde, hasta):
+    """Generador de HorarioDisponible (sin guardar) para cada día/ventana de las plantillas."""
+    for plantilla in plantillas:
+        inicio = max(desde, plantilla.fecha_desde) if desde else plantilla.fecha_desde
+        fin = min(hasta, plantilla.fecha_hasta) if hasta else plantilla.fecha_hasta
+        dias = plantilla.dias()
+        excluidas = plantilla.excluidas()
+        ventanas = list(plantilla.ventanas.all())
+        fecha = inicio
+        while fecha <= fin:
+            if fecha.weekday() in dias and fecha not in excluidas:
+                for ventana in ventanas:
+                    yield HorarioDisponible(
+                        fecha=fecha, hora_inicio=ventana.hora_inicio, hora_fin=ventana.hora_fin,
+                        capacidad_reserva=plantilla.capacidad_reserva,
+                    )
+            fecha += timedelta(days=1)
+
+
+def generar_horarios(plantillas, desde=None, hasta=None, lote=2000):
+    """
+    Materializa las plantillas entre `desde` y `hasta` (recortado a la vigencia
+    de cada una). Un bulk_create(ignore_conflicts=True) por lote: los horarios
+    que ya existen (unique_together fecha/hora_inicio/hora_fin) se saltan,
+    así correrlo dos veces no duplica nada ni pisa capacidades editadas.
+    Devuelve (candidatos, fechas) con las fechas generadas.
+    """
+    candidatos = 0
+    fechas = set()
+    buffer = []
+    for horario in _horarios_de_plantillas(plantillas, desde, hasta):
+        buffer.append(horario)
+        if len(buffer) >= lote:
+            HorarioDisponible.objects.bulk_create(buffer, ignore_conflicts=True)
+            candidatos += len(buffer)
+            fechas.update(h.fecha for h in buffer)
+            buffer = []
+    if buffer:
+        HorarioDisponible.objects.bulk_create(buffer, ignore_conflicts=True)
+        candidatos += len(buffer)
+        fechas.update(h.fecha for h in buffer)
+
+    # bulk_create no dispara señales: el calendario se invalida a mano, al confirmar
+    transaction.on_commit(lambda: invalidar_calendario(*fechas))
+    return candidatos, fechas
+
+
+# ==========================================
+# CALENDARIO MENSUAL
+# ==========================================
+
+def clave_calendario(anio, mes):
+    return f'calendario:{anio:04d}-{mes:02d}'
+
+
+def invalidar_calendario(*fechas):
+    """Borra de la cache los meses de las fechas dadas (date o 'AAAA-MM-DD')."""
+    fechas = [parse_date(f) if isinstance(f, str) else f for f in fechas]
+    claves = {clave_calendario(f.year, f.month) for f in fechas if f}
+    if claves:
+        cache.delete_many(list(claves))
+
+
+def leer_mes(texto):
+    """'AAAA-MM' -> (anio, mes) o None si no es válido."""
+    try:
+        anio, mes = (int(parte) for parte in (texto or '').split('-'))
+        date(anio, mes, 1)
+    except ValueError:
+        return None
+    return anio, mes
+
+
+def calendario_mes(anio, mes):
+    """
+    Cupos de todos los horarios habilitados del mes, agrupados por día:
+        {'AAAA-MM-DD': [{'id', 'hora_inicio', 'hora_fin', 'capacidad', 'cupos_libres'}, ...]}
+    Se cachea por mes; las señales de Reserva y HorarioDisponible borran el mes tocado.
+    """
+    clave = clave_calendario(anio, mes)
+    dias = cache.get(clave)
+    if dias is not None:
+        return dias
+
+    ultimo = calendar.monthrange(anio, mes)[1]
+    dias = {}
+    horarios = horarios_con_ocupacion(date(anio, mes, 1), date(anio, mes, ultimo)).values_list(
+        'id', 'fecha', 'hora_inicio', 'hora_fin', 'capacidad_reserva', 'cupos_libres'
+    )
+    for id_, fecha, hora_inicio, hora_fin, capacidad, cupos_libres in horarios:
+        dias.setdefault(fecha.isoformat(), []).append({
+            'id': id_,
+            'hora_inicio': hora_inicio.strftime('%H:%M'),
+            'hora_fin': hora_fin.strftime('%H:%M'),
+            'capacidad': capacidad,
+            'cupos_libres': max(cupos_libres, 0),
+        })
+
+    cache.set(clave, dias, timeout=settings.CALENDARIO_CACHE_TIMEOUT)
+    return dias
+
+
+def _bitset_base64(bits):
+    """Bit i -> byte i // 8, bit i % 8 (el menos significativo primero)."""
+    datos = bytearray((len(bits) + 7) // 8)
+    for i, encendido in enumerate(bits):
+        if encendido:
+            datos[i // 8] |= 1 << (i % 8)
+    return base64.b64encode(bytes(datos)).decode('ascii')
+
+
+def calendario_compacto(anio, mes, dias):
+    """
+    Versión compacta del calendario para pintar la vista de mes:
+    - dias_con_cupo: bitset base64, bit d-1 = el día d tiene algún horario libre
+    - horarios_por_dia: cantidad de horarios de cada día del mes
+    - horarios_libres: bitset base64 con un bit por horario, en orden (día, hora_inicio)
+    """
+    ultimo = calendar.monthrange(anio, mes)[1]
+    por_dia = [dias.get(date(anio, mes, d).isoformat(), []) for d in range(1, ultimo + 1)]
+    return {
+        'dias_con_cupo': _bitset_base64([any(h['cupos_libres'] > 0 for h in horarios) for horarios in por_dia]),
+        'horarios_por_dia': [len(horarios) for horarios in por_dia],
+        'horarios_libres': _bitset_base64([h['cupos_libres'] > 0 for horarios in por_dia for h in horarios]),
+    }
@@ -0,0 +1,140 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import RegistroUsuario, Reserva
+
+
+# ==========================================
+# FILTROS INDEXADOS
+# ==========================================
+# Cada filtro declara el índice que lo resuelve: un parámetro que no está
+# declarado se ignora y un ?ordering= fuera de la lista responde 400. Así el
+# backoffice no puede pedir una combinación que termine en Seq Scan.
+
+# Índices de trigramas (solo PostgreSQL, migración 0020_filtros_reserva)
+INDICES_TRIGRAMA = {
+    'reserva_codigo_trgm': ('reserva', 'codigo_reserva'),
+    'registro_usuario_nombre_trgm': ('registro_usuario', 'nombre'),
+    'registro_usuario_apellido_trgm': ('registro_usuario', 'apellido'),
+}
+
+MIN_LARGO_BUSQUEDA = 3  # Menos de 3 caracteres no forma un trigrama
+MAX_CLIENTES_BUSQUEDA = 500  # Más clientes que esto: 400, hay que afinar la búsqueda
+
+
+def _lista_de(choices):
+    validos = {valor for valor, _ in choices}
+
+    def convertir(texto):
+        valores = {v.strip() for v in texto.split(',') if v.strip()}
+        if not valores or valores - validos:
+            raise ValueError(f"valores permitidos: {', '.join(sorted(validos))}")
+        return sorted(valores)
+    return convertir
+
+
+def _fecha(texto):
+    fecha = parse_date(texto)
+    if fecha is None:
+        raise ValueError('formato esperado AAAA-MM-DD')
+    return fecha
+
+
+class Filtro:
+    """?parametro=valor -> filter(lookup=convertir(valor)), respaldado por `indice`."""
+
+    def __init__(self, lookup, indice, convertir=str):
+        self.lookup = lookup
+        self.indice = indice
+        self.convertir = convertir
+
+    def aplicar(self, queryset, valor):
+        return queryset.filter(**{self.lookup: self.convertir(valor)})
+
+
+class BusquedaReserva(Filtro):
+    """
+    ?q= busca en codigo_reserva y en nombre / apellido del cliente (icontains,
+    resuelto por los GIN de trigramas sobre UPPER(columna)). Los clientes se
+    buscan primero: `cliente_id IN (...)` junto al código es un BitmapOr de
+    dos índices, mientras que un OR con JOIN (o con una subconsulta) obligaría
+    a recorrer la tabla. Por eso la lista tiene tope: pasado el tope se
+    responde 400 en lugar de devolver resultados incompletos.
+    """
+
+    def __init__(self):
+        super().__init__('codigo_reserva__icontains', 'reserva_codigo_trgm')
+
+    def aplicar(self, queryset, valor):
+        texto = valor.strip()
+        if len(texto) < MIN_LARGO_BUSQUEDA:
+            raise ValueError(f'mínimo {MIN_LARGO_BUSQUEDA} caracteres')
+
+        # Cada palabra tiene que estar en el nombre o en el apellido ("ana pérez")
+        por_nombre = Q()
+        for palabra in texto.split():
+            por_nombre &= Q(nombre__icontains=palabra) | Q(apellido__icontains=palabra)
+        clientes = list(
+            RegistroUsuario.objects.filter(por_nombre).values_list('id', flat=True)[:MAX_CLIENTES_BUSQUEDA + 1]
+        )
+        if len(clientes) > MAX_CLIENTES_BUSQUEDA:
+            raise ValueError(f'más de {MAX_CLIENTES_BUSQUEDA} clientes coinciden, agregá más texto a la búsqueda')
+
+        condicion = Q(codigo_reserva__icontains=texto)
+        if clientes:
+            condicion |= Q(cliente_id__in=clientes)
+        return queryset.filter(condicion)
+
+
+# Filtros del backoffice de reservas (ReservaViewSet)
+FILTROS_RESERVA = {
+    'estado': Filtro('estado__in', 'reserva_estado_fecha_idx', _lista_de(Reserva.ESTADO_RESERVA_CHOICES)),
+    'desde': Filtro('fecha_evento__gte', 'reserva_fecha_evento_idx', _fecha),
+    'hasta': Filtro('fecha_evento__lte', 'reserva_fecha_evento_idx', _fecha),
+    'metodo_pago': Filtro('metodo_pago__in', 'reserva_metodo_pago_fecha_idx', _lista_de(Reserva.METODO_PAGO_CHOICES)),
+    'q': BusquedaReserva(),
+}
+
+# ?ordering= -> ORDER BY completo (el id desempata, y lo cubren los mismos índices)
+ORDENAMIENTOS_RESERVA = {
+    '-id': ('-id',),
+    'id': ('id',),
+    '-fecha_evento': ('-fecha_evento', '-id'),
+    'fecha_evento': ('fecha_evento', 'id'),
+}
+
+
+class FiltrosIndexadosBackend(BaseFilterBackend):
+    """
+    Aplica los filtros declarados en la vista (`filtros_indexados`) y el orden
+    de `ordenamientos_indexados`. Expone get_ordering, así PaginacionKeyset
+    pagina por cursor sobre el mismo orden que pidió el cliente.
+    La vista puede cambiar `orden_por_defecto` (por ejemplo una acción).
+    """
+    parametro_orden = 'ordering'
+
+    def get_ordering(self, request, queryset, view):
+        pedido = request.query_params.get(self.parametro_orden)
+        if not pedido:
+            return tuple(view.orden_por_defecto)
+        if pedido not in view.ordenamientos_indexados:
+            raise ValidationError({self.parametro_orden: (
+                f"Orden no permitido, opciones: {', '.join(view.ordenamientos_indexados)}"
+            )})
+        return view.ordenamientos_indexados[pedido]
+
+    def filter_queryset(self, request, queryset, view):
+        errores = {}
+        for parametro, filtro in view.filtros_indexados.items():
+            valor = request.query_params.get(parametro)
+            if valor is None or valor == '':
+                continue
+            try:
+                queryset = filtro.aplicar(queryset, valor)
+            except ValueError as e:
+                errores[parametro] = str(e)
+        if errores:
+            raise ValidationError(errores)
+        return queryset.order_by(*self.get_ordering(request, queryset, view))
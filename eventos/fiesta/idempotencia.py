@@ -0,0 +1,138 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import RespuestaIdempotente
+
+
+# ==========================================
+# IDEMPOTENCY-KEY
+# ==========================================
+# Un POST con `Idempotency-Key` se ejecuta una sola vez por usuario y clave:
+# los reintentos reciben la respuesta guardada (cabecera Idempotent-Replayed).
+# El registro se inserta antes de ejecutar la vista, en la misma transacción:
+# un duplicado concurrente se queda esperando en el índice único hasta que la
+# primera ejecución termina, y entonces repite su respuesta.
+
+CABECERA_IDEMPOTENCIA = 'Idempotency-Key'
+MAX_LARGO_CLAVE = 255
+# Las pone el renderer al repetir la respuesta: no se guardan
+CABECERAS_NO_GUARDADAS = {'content-type', 'content-length'}
+
+
+def _contenido_archivo(archivo):
+    digest = hashlib.sha256()
+    for bloque in archivo.chunks():
+        digest.update(bloque)
+    archivo.seek(0)  # La vista vuelve a leerlo al guardarlo
+    return f'{archivo.name}:{archivo.size}:{digest.hexdigest()}'
+
+
+def _valor_serializable(valor):
+    if isinstance(valor, UploadedFile):
+        return _contenido_archivo(valor)
+    return str(valor)
+
+
+def huella_peticion(request):
+    """sha256 del método, la ruta y el cuerpo ya parseado (los archivos por su contenido)."""
+    datos = request.data
+    if hasattr(datos, 'lists'):  # QueryDict de form/multipart
+        datos = dict(datos.lists())
+    cuerpo = json.dumps(datos, sort_keys=True, default=_valor_serializable)
+    return hashlib.sha256(f'{request.method} {request.path}\n{cuerpo}'.encode()).hexdigest()
+
+
+def _tomar_clave(usuario, clave, huella, endpoint, using):
+    """
+    Devuelve (registro, nuevo). Debe llamarse dentro de una transacción:
+    el INSERT queda pendiente hasta el commit y bloquea a los duplicados.
+    """
+    ahora = timezone.now()
+    expira_en = ahora + timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS)
+    respuestas = RespuestaIdempotente.objects.using(using)
+    # Dos intentos: la fila existente puede desaparecer por el barrido de vencidas
+    for _ in range(2):
+        try:
+            with transaction.atomic(using=using):
+                registro = respuestas.create(
+                    usuario=usuario, clave=clave, huella=huella, endpoint=endpoint, expira_en=expira_en,
+                )
+            return registro, True
+        except IntegrityError:
+            registro = respuestas.select_for_update().filter(usuario=usuario, clave=clave).first()
+        if registro is None:
+            continue
+        if registro.expira_en <= ahora:
+            # Vencida pero todavía no barrida: la clave se puede usar de nuevo
+            registro.huella, registro.endpoint, registro.expira_en = huella, endpoint, expira_en
+            registro.estado = registro.cuerpo = registro.cabeceras = None
+            registro.save(using=using)
+            return registro, True
+        return registro, False
+    raise IntegrityError(f'No se pudo registrar la clave de idempotencia {clave!r}')
+
+
+def idempotente(vista):
+    """
+    Decorador para vistas POST de DRF (para métodos de ViewSet: method_decorator).
+    Sin cabecera, o sin usuario autenticado, la vista se ejecuta como siempre.
+    Las respuestas 5xx y 409 (conflicto temporal: "intenta de nuevo", precios
+    que cambiaron) no se guardan: el reintento con la misma clave vuelve a ejecutar.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = request.headers.get(CABECERA_IDEMPOTENCIA)
+        if not clave or not request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+        if len(clave) > MAX_LARGO_CLAVE:
+            return Response(
+                {'error': f'{CABECERA_IDEMPOTENCIA} admite hasta {MAX_LARGO_CLAVE} caracteres'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        huella = huella_peticion(request)
+        using = router.db_for_write(RespuestaIdempotente)
+        with transaction.atomic(using=using):
+            registro, nuevo = _tomar_clave(request.user, clave, huella, request.path, using)
+            if not nuevo:
+                if registro.huella != huella:
+                    return Response(
+                        {'error': f'La {CABECERA_IDEMPOTENCIA} ya se usó con otra petición'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                return Response(registro.cuerpo, status=registro.estado, headers={
+                    **(registro.cabeceras or {}), 'Idempotent-Replayed': 'true',
+                })
+
+            respuesta = vista(request, *args, **kwargs)
+            if respuesta.status_code >= 500:
+                transaction.set_rollback(True, using=using)
+                return respuesta
+            if respuesta.status_code == status.HTTP_409_CONFLICT:
+                # Solo se libera la clave: lo que la vista corrigió (el carrito repreciado) queda
+                registro.delete(using=using)
+                return respuesta
+            registro.estado = respuesta.status_code
+            registro.cuerpo = getattr(respuesta, 'data', None)
+            registro.cabeceras = {
+                nombre: valor for nombre, valor in respuesta.items() if nombre.lower() not in CABECERAS_NO_GUARDADAS
+            }
+            registro.save(using=using, update_fields=['estado', 'cuerpo', 'cabeceras'])
+        return respuesta
+
+    return envoltura
+
+
+def expirar_respuestas(using=None):
+    """Borra las respuestas vencidas con un único DELETE. Devuelve cuántas borró."""
+    borrados, _ = RespuestaIdempotente.objects.using(using).filter(expira_en__lt=timezone.now()).delete()
+    return borrados
@@ -0,0 +1,55 @@
+"""
+Formato de intercambio del catálogo (compartido por catalog_export y catalog_import).
+
+Cada registro se identifica por su clave natural (nombres), no por id, para
+poder mover catálogos entre bases. Las FKs también viajan como nombres.
+"""
+from fiesta.models import Categoria, Promocion, Servicio, Combo, ComboServicio
+
+
+class EspecificacionModelo:
+    def __init__(self, modelo, campos, claves, fks):
+        self.modelo = modelo
+        # Columnas exportadas, en orden (las FKs con el nombre del campo FK)
+        self.campos = campos
+        # Campos que identifican un registro: ('nombre',) o ('combo', 'servicio')
+        self.claves = claves
+        # FK -> modelo referenciado (se resuelve por nombre)
+        self.fks = fks
+
+    @property
+    def nombre(self):
+        return self.modelo._meta.db_table
+
+    def valores_exportacion(self):
+        """Nombres para .values(): las FKs se leen como `<fk>__nombre`."""
+        return [f"{campo}__nombre" if campo in self.fks else campo for campo in self.campos]
+
+
+# En orden de dependencias: primero lo referenciado
+ESPECIFICACIONES = [
+    EspecificacionModelo(Categoria, ['nombre', 'descripcion', 'activo'], ('nombre',), {}),
+    EspecificacionModelo(
+        Promocion,
+        ['nombre', 'descripcion', 'descuento_porcentaje', 'descuento_monto', 'precio', 'cantidad',
+         'fecha_inicio', 'fecha_fin', 'activo'],
+        ('nombre',), {},
+    ),
+    EspecificacionModelo(
+        Servicio,
+        ['nombre', 'categoria', 'descripcion', 'precio_base', 'duracion_horas', 'capacidad_persona',
+         'imagen', 'disponible'],
+        ('nombre',), {'categoria': Categoria},
+    ),
+    EspecificacionModelo(
+        Combo,
+        ['nombre', 'descripcion', 'precio_combo', 'descuento_porcentaje', 'imagen', 'activo', 'promocion'],
+        ('nombre',), {'promocion': Promocion},
+    ),
+    EspecificacionModelo(
+        ComboServicio, ['combo', 'servicio', 'cantidad'],
+        ('combo', 'servicio'), {'combo': Combo, 'servicio': Servicio},
+    ),
+]
+
+POR_NOMBRE = {espec.nombre: espec for espec in ESPECIFICACIONES}
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from fiesta.models import DetalleReserva, ItemCarrito
+
+
+class Command(BaseCommand):
+    help = ('Copia nombre e imagen del producto a los ItemCarrito y DetalleReserva creados antes '
+            'de nombre_item / imagen_item (por lotes; se puede cortar y volver a correr)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por lote (un SELECT y un UPDATE)')
+
+    def handle(self, *args, **options):
+        for modelo in (ItemCarrito, DetalleReserva):
+            copiadas, sin_producto = self._rellenar(modelo, options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'✅ {modelo.__name__}: {copiadas} filas actualizadas'))
+            if sin_producto:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠️ {modelo.__name__}: {sin_producto} filas sin producto (borrado antes del snapshot), quedan vacías'
+                ))
+
+    def _rellenar(self, modelo, lote):
+        pendientes = (
+            modelo.objects.filter(nombre_item='')
+            .select_related('servicio', 'combo', 'promocion')
+            .order_by('pk')
+        )
+        copiadas = sin_producto = 0
+        ultimo_pk = 0
+        # Paginación por pk (no OFFSET): cada lote es una transacción corta
+        while bloque := list(pendientes.filter(pk__gt=ultimo_pk)[:lote]):
+            ultimo_pk = bloque[-1].pk
+            actualizar = []
+            for fila in bloque:
+                fila.copiar_producto()
+                if fila.nombre_item:
+                    actualizar.append(fila)
+                else:
+                    sin_producto += 1
+            with transaction.atomic():
+                modelo.objects.bulk_update(actualizar, ['nombre_item', 'imagen_item'])
+            copiadas += len(actualizar)
+        return copiadas, sin_producto
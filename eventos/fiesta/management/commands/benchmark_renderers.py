@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from fiesta.renderers import JSONRapidoRenderer, MessagePackRenderer
+from fiesta.serializers import ReservaSerializer, ComboDetailSerializer
+from fiesta.views import ReservaViewSet, ComboViewSet
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark de renderers (JSON estándar, JSON orjson, MessagePack) sobre /api/reservas/ y /api/combos/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=500, help='Filas por payload')
+        parser.add_argument('--repeticiones', type=int, default=50)
+
+    def _payloads(self, renderer, limite):
+        # Los DecimalField dependen del renderer elegido (Decimal nativo en MessagePack)
+        request = Request(APIRequestFactory().get('/'))
+        request.accepted_renderer = renderer
+        contexto = {'request': request}
+        return {
+            '/api/reservas/': ReservaSerializer(
+                ReservaViewSet.reservas_para_listado().order_by('-id')[:limite], many=True, context=contexto,
+            ).data,
+            '/api/combos/': ComboDetailSerializer(
+                ComboViewSet().get_queryset()[:limite], many=True, context=contexto,
+            ).data,
+        }
+
+    def handle(self, *args, **options):
+        renderers = [
+            ('json (stdlib)', JSONRenderer()),
+            ('json (orjson)', JSONRapidoRenderer()),
+            ('msgpack', MessagePackRenderer()),
+        ]
+        payloads = {nombre: self._payloads(renderer, options['limite']) for nombre, renderer in renderers}
+
+        for endpoint in payloads['json (stdlib)']:
+            filas = len(payloads['json (stdlib)'][endpoint])
+            self.stdout.write(self.style.WARNING(f'\n📊 {endpoint} ({filas} filas)'))
+            if not filas:
+                self.stdout.write(self.style.NOTICE('  ⚠️  Sin datos: carga registros para medir algo útil'))
+                continue
+            referencia = None
+            for nombre, renderer in renderers:
+                data = payloads[nombre][endpoint]
+                cuerpo = renderer.render(data)
+                inicio = time.perf_counter()
+                for _ in range(options['repeticiones']):
+                    renderer.render(data)
+                ms = (time.perf_counter() - inicio) * 1000 / options['repeticiones']
+                referencia = referencia or (ms, len(cuerpo))
+                self.stdout.write(
+                    f'  {nombre:<15} {ms:8.3f} ms  {len(cuerpo):>10} bytes  '
+                    f'(x{referencia[0] / ms if ms else 0:.1f} velocidad, '
+                    f'{len(cuerpo) / referencia[1] * 100:.0f}% tamaño)'
+                )
+
+        # Sanidad: el JSON rápido debe ser idéntico al estándar
+        for endpoint, data in payloads['json (stdlib)'].items():
+            if JSONRenderer().render(data) != JSONRapidoRenderer().render(data):
+                self.stdout.write(self.style.ERROR(f'❌ {endpoint}: orjson y stdlib producen JSON distinto'))
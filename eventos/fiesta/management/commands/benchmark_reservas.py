@@ -0,0 +1,103 @@
+import contextlib
+import io
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from fiesta.models import Categoria, Combo, DetalleReserva, HorarioDisponible, RegistroUsuario, Reserva, Servicio
+from fiesta.renderers import JSONRapidoRenderer
+from fiesta.serializers import ReservaSerializer
+from fiesta.views import ReservaViewSet
+
+PREFIJO = 'BENCH-'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark del listado de /api/reservas/ (consultas, tiempo y stdout) con datos sintéticos que se descartan al final'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservas', type=int, default=10000)
+        parser.add_argument('--detalles', type=int, default=2, help='Detalles por reserva')
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._cargar(options['reservas'], options['detalles'])
+            self._medir(options['reservas'], options['repeticiones'])
+            # Nada de lo sembrado queda en la base
+            transaction.set_rollback(True)
+
+    def _cargar(self, cantidad, detalles_por_reserva):
+        inicio = time.perf_counter()
+        categoria = Categoria.objects.create(nombre=f'{PREFIJO}categoria')
+        servicio = Servicio.objects.create(
+            categoria=categoria, nombre=f'{PREFIJO}servicio', descripcion='-',
+            precio_base=Decimal('25.00'), duracion_horas=Decimal('2.00'), capacidad_persona=10,
+        )
+        combo = Combo.objects.create(nombre=f'{PREFIJO}combo', descripcion='-', precio_combo=Decimal('80.00'))
+        clientes = RegistroUsuario.objects.bulk_create([
+            RegistroUsuario(nombre=f'Cliente {i}', apellido='-', telefono=f'{PREFIJO}{i}',
+                            email=f'{PREFIJO.lower()}{i}@example.com', contrasena='-')
+            for i in range(100)
+        ])
+        horario = HorarioDisponible.objects.create(
+            fecha=timezone.localdate() + timedelta(days=365), hora_inicio='10:00', hora_fin='14:00',
+            capacidad_reserva=cantidad,
+        )
+        # bulk_create: sin señales ni contador de ocupación (todo se descarta al terminar)
+        reservas = Reserva.objects.bulk_create([
+            Reserva(cliente=clientes[i % len(clientes)], horario=horario, codigo_reserva=f'{PREFIJO}{i}',
+                    fecha_evento=horario.fecha, fecha_inicio=horario.hora_inicio, direccion_evento='Calle 1',
+                    subtotal=Decimal('105.00'), total=Decimal('117.60'))
+            for i in range(cantidad)
+        ], batch_size=1000)
+        DetalleReserva.objects.bulk_create([
+            DetalleReserva(reserva=reserva, cantidad=1, **(
+                {'tipo': 'C', 'combo': combo, 'nombre_item': combo.nombre, 'precio_unitario': Decimal('80.00'), 'subtotal': Decimal('80.00')}
+                if d % 2 else
+                {'tipo': 'S', 'servicio': servicio, 'nombre_item': servicio.nombre, 'precio_unitario': Decimal('25.00'), 'subtotal': Decimal('25.00')}
+            ))
+            for reserva in reservas for d in range(detalles_por_reserva)
+        ], batch_size=1000)
+        self.stdout.write(f'📦 {cantidad} reservas x {detalles_por_reserva} detalles sembradas en '
+                          f'{time.perf_counter() - inicio:.1f}s')
+
+    def _medir(self, cantidad, repeticiones):
+        queryset = ReservaViewSet.reservas_para_listado().order_by('-id').filter(codigo_reserva__startswith=PREFIJO)
+        renderer = JSONRapidoRenderer()
+        tiempos, salida = [], io.StringIO()
+        # Contador propio: CaptureQueriesContext guarda como máximo 9000 consultas
+        consultas = {'total': 0, 'segundos': 0.0}
+
+        def contar(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                consultas['total'] += 1
+                consultas['segundos'] += time.perf_counter() - inicio
+
+        for _ in range(repeticiones):
+            consultas.update(total=0, segundos=0.0)
+            with connection.execute_wrapper(contar), contextlib.redirect_stdout(salida):
+                inicio = time.perf_counter()
+                data = ReservaSerializer(queryset.all(), many=True).data
+                serializado = time.perf_counter()
+                cuerpo = renderer.render(data)
+                fin = time.perf_counter()
+            tiempos.append((serializado - inicio, fin - serializado))
+
+        mejor_serializar, mejor_render = min(tiempos)
+        stdout = len(salida.getvalue()) // repeticiones
+        self.stdout.write(self.style.WARNING(f'\n📊 /api/reservas/ ({len(data)} filas)'))
+        self.stdout.write(f'  consultas       {consultas["total"]:>10}   ({consultas["segundos"] * 1000:.0f} ms en la base)')
+        self.stdout.write(f'  serializar      {mejor_serializar * 1000:>10.0f} ms   '
+                          f'({mejor_serializar * 1e6 / max(cantidad, 1):.1f} µs por reserva)')
+        self.stdout.write(f'  render JSON     {mejor_render * 1000:>10.0f} ms   {len(cuerpo):>10} bytes')
+        self.stdout.write(f'  stdout          {stdout:>10} bytes')
+        if stdout:
+            self.stdout.write(self.style.ERROR('❌ El listado escribió en stdout'))
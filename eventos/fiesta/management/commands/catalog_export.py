@@ -0,0 +1,76 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from ._catalogo_formato import ESPECIFICACIONES, POR_NOMBRE
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo (categorías, promociones, servicios, combos) como NDJSON o CSV en streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument(
+            '--modelo', choices=sorted(POR_NOMBRE),
+            help='Exportar solo un modelo (obligatorio para CSV: un archivo por modelo)',
+        )
+        parser.add_argument('--salida', help='Archivo de destino (por defecto stdout)')
+        parser.add_argument('--chunk', type=int, default=2000, help='Filas leídas por viaje a la base')
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        if formato == 'csv' and not options['modelo']:
+            raise CommandError('El formato CSV necesita --modelo (un archivo por modelo).')
+
+        especificaciones = [POR_NOMBRE[options['modelo']]] if options['modelo'] else ESPECIFICACIONES
+        if options['salida']:
+            salida = open(options['salida'], 'w', newline='', encoding='utf-8')
+        else:
+            # Escritura cruda: las filas ya traen su propio salto de línea
+            salida = self.stdout
+            salida.ending = ''
+
+        inicio = time.monotonic()
+        total = 0
+        try:
+            for espec in especificaciones:
+                filas = self._filas(espec, options['chunk'])
+                if formato == 'csv':
+                    total += self._escribir_csv(salida, espec, filas)
+                else:
+                    total += self._escribir_ndjson(salida, espec, filas)
+        finally:
+            if options['salida']:
+                salida.close()
+
+        duracion = time.monotonic() - inicio
+        self.stderr.write(self.style.SUCCESS(
+            f'✅ {total} registros exportados en {duracion:.2f}s'
+        ))
+
+    def _filas(self, espec, chunk):
+        """Generador: lee en bloques con un cursor de servidor, memoria constante."""
+        columnas = espec.valores_exportacion()
+        queryset = espec.modelo.objects.order_by('pk').values_list(*columnas)
+        for valores in queryset.iterator(chunk_size=chunk):
+            yield dict(zip(espec.campos, valores))
+
+    def _escribir_ndjson(self, salida, espec, filas):
+        total = 0
+        for fila in filas:
+            salida.write(json.dumps({'modelo': espec.nombre, **fila}, cls=DjangoJSONEncoder, ensure_ascii=False))
+            salida.write('\n')
+            total += 1
+        return total
+
+    def _escribir_csv(self, salida, espec, filas):
+        writer = csv.DictWriter(salida, fieldnames=espec.campos)
+        writer.writeheader()
+        total = 0
+        for fila in filas:
+            writer.writerow(fila)
+            total += 1
+        return total
@@ -0,0 +1,169 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from fiesta.catalogo import incrementar_version_catalogo
+from fiesta.precios import repreciar_carritos
+from ._catalogo_formato import POR_NOMBRE
+
+
+class Command(BaseCommand):
+    help = 'Importa el catálogo desde NDJSON o CSV haciendo upsert por lotes (claves naturales = nombres)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Archivo de entrada ('-' para stdin)")
+        parser.add_argument('--formato', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--modelo', choices=sorted(POR_NOMBRE), help='Modelo del archivo (obligatorio para CSV)')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por lote (una sentencia de upsert por lote)')
+
+    def handle(self, *args, **options):
+        if options['formato'] == 'csv' and not options['modelo']:
+            raise CommandError('El formato CSV necesita --modelo.')
+
+        entrada = sys.stdin if options['archivo'] == '-' else open(options['archivo'], newline='', encoding='utf-8')
+        self.total = 0
+        self.omitidas = 0
+        self.numero_lote = 0
+        inicio = time.monotonic()
+
+        try:
+            lote = []
+            espec_actual = None
+            for espec, fila in self._leer(entrada, options['formato'], options['modelo']):
+                if lote and (espec is not espec_actual or len(lote) >= options['lote']):
+                    self._procesar_lote(espec_actual, lote)
+                    lote = []
+                espec_actual = espec
+                lote.append(fila)
+            if lote:
+                self._procesar_lote(espec_actual, lote)
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+
+        # bulk_create no dispara señales: invalidamos los snapshots y repreciamos los carritos a mano
+        incrementar_version_catalogo()
+        repreciados = repreciar_carritos()
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {self.total} registros importados en {duracion:.2f}s '
+            f'({self.total / duracion * 60 if duracion else 0:.0f} filas/min)'
+        ))
+        if repreciados:
+            self.stdout.write(self.style.WARNING(f'💲 {repreciados} líneas de carrito repreciadas'))
+        if self.omitidas:
+            self.stdout.write(self.style.WARNING(f'⚠️  {self.omitidas} filas omitidas por datos inválidos'))
+
+    # ------------------------------------------------------------------
+    # Lectura en streaming
+    # ------------------------------------------------------------------
+
+    def _leer(self, entrada, formato, modelo):
+        """Generador de (especificación, fila) sin cargar el archivo en memoria."""
+        if formato == 'csv':
+            espec = POR_NOMBRE[modelo]
+            for fila in csv.DictReader(entrada):
+                yield espec, fila
+            return
+
+        for numero, linea in enumerate(entrada, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except json.JSONDecodeError as e:
+                raise CommandError(f'Línea {numero}: JSON inválido ({e.msg}, columna {e.colno})') from e
+            if not isinstance(fila, dict):
+                raise CommandError(f'Línea {numero}: se esperaba un objeto JSON')
+            nombre_modelo = fila.pop('modelo', modelo)
+            if nombre_modelo not in POR_NOMBRE:
+                raise CommandError(f'Línea {numero}: modelo desconocido "{nombre_modelo}"')
+            yield POR_NOMBRE[nombre_modelo], fila
+
+    # ------------------------------------------------------------------
+    # Upsert por lote
+    # ------------------------------------------------------------------
+
+    def _procesar_lote(self, espec, filas):
+        inicio = time.monotonic()
+        modelo = espec.modelo
+
+        # 1. Un mapa nombre -> pk por cada FK, con una sola consulta por lote
+        mapas_fk = {}
+        for fk, referenciado in espec.fks.items():
+            nombres = {fila.get(fk) for fila in filas if fila.get(fk)}
+            mapas_fk[fk] = self._mapa_nombres(referenciado, nombres)
+
+        # 2. Construir instancias (deduplicadas por clave natural: gana la última)
+        objetos = {}
+        for fila in filas:
+            try:
+                valores = self._convertir(espec, fila, mapas_fk)
+            except (ValidationError, KeyError) as e:
+                self.omitidas += 1
+                self.stderr.write(self.style.WARNING(f'  ⚠️  {espec.nombre}: fila omitida ({e})'))
+                continue
+            clave = tuple(valores[f"{c}_id"] if c in espec.fks else valores[c] for c in espec.claves)
+            objetos[clave] = modelo(**valores)
+
+        if not objetos:
+            return
+
+        # 3. Una sentencia INSERT ... ON CONFLICT DO UPDATE por lote
+        columnas = [c for c in espec.campos if c not in espec.claves]
+        with transaction.atomic():
+            if espec.claves == ('nombre',):
+                existentes = self._mapa_nombres(modelo, {clave[0] for clave in objetos})
+                for (nombre,), objeto in objetos.items():
+                    objeto.pk = existentes.get(nombre)
+                modelo.objects.bulk_create(
+                    objetos.values(), update_conflicts=True,
+                    unique_fields=['id'], update_fields=columnas,
+                )
+            else:
+                modelo.objects.bulk_create(
+                    objetos.values(), update_conflicts=True,
+                    unique_fields=list(espec.claves), update_fields=columnas,
+                )
+
+        self.total += len(objetos)
+        self.numero_lote += 1
+        duracion = time.monotonic() - inicio
+        self.stdout.write(
+            f'  📦 Lote {self.numero_lote} ({espec.nombre}): {len(objetos)} filas en {duracion:.3f}s '
+            f'(~{len(objetos) / duracion * 60 if duracion else 0:.0f} filas/min)'
+        )
+
+    def _mapa_nombres(self, modelo, nombres):
+        # Si hay nombres repetidos en la base gana el registro más antiguo
+        if not nombres:
+            return {}
+        return dict(modelo.objects.filter(nombre__in=nombres).order_by('-pk').values_list('nombre', 'pk'))
+
+    def _convertir(self, espec, fila, mapas_fk):
+        valores = {}
+        for campo in espec.campos:
+            valor = fila.get(campo)
+            if campo in espec.fks:
+                if valor and valor not in mapas_fk[campo]:
+                    if campo in espec.claves:
+                        raise KeyError(f'{campo} "{valor}" no existe')
+                    self.stderr.write(self.style.WARNING(f'  ⚠️  {campo} "{valor}" no existe, se deja vacío'))
+                valores[f"{campo}_id"] = mapas_fk[campo].get(valor) if valor else None
+                continue
+
+            field = espec.modelo._meta.get_field(campo)
+            if valor == '' and field.null:
+                valor = None
+            if valor is None and not field.null:
+                if not field.has_default():
+                    raise ValidationError(f'{campo} es obligatorio')
+                valor = field.get_default()
+            valores[campo] = field.to_python(valor)
+        return valores
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from fiesta.disponibilidad import expirar_bloqueos, invalidar_calendario
+
+
+class Command(BaseCommand):
+    help = 'Borra los bloqueos de horario vencidos (pensado para cron, ej: cada minuto)'
+
+    def handle(self, *args, **options):
+        borrados, fechas = expirar_bloqueos()
+        if borrados:
+            invalidar_calendario(*fechas)
+        self.stdout.write(self.style.SUCCESS(f'✅ {borrados} bloqueos vencidos eliminados'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from fiesta.idempotencia import expirar_respuestas
+
+
+class Command(BaseCommand):
+    help = 'Borra las respuestas de Idempotency-Key vencidas (pensado para cron, ej: cada hora)'
+
+    def handle(self, *args, **options):
+        borrados = expirar_respuestas()
+        self.stdout.write(self.style.SUCCESS(f'✅ {borrados} respuestas idempotentes vencidas eliminadas'))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from fiesta.disponibilidad import generar_horarios
+from fiesta.models import HorarioDisponible, PlantillaHorario
+
+
+class Command(BaseCommand):
+    help = 'Genera HorarioDisponible a partir de las plantillas activas (idempotente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plantilla', type=int, action='append', help='ID de plantilla (repetible); por defecto todas las activas')
+        parser.add_argument('--desde', help='AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--hasta', help='AAAA-MM-DD (por defecto el fin de cada plantilla)')
+        parser.add_argument('--lote', type=int, default=2000, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], '--desde') or timezone.localdate()
+        hasta = self._fecha(options['hasta'], '--hasta')
+        if hasta and hasta < desde:
+            raise CommandError('--hasta no puede ser anterior a --desde')
+
+        plantillas = PlantillaHorario.objects.filter(activo=True).prefetch_related('ventanas')
+        if options['plantilla']:
+            plantillas = plantillas.filter(id__in=options['plantilla'])
+        if not plantillas:
+            self.stdout.write(self.style.NOTICE('⚠️  No hay plantillas activas para generar'))
+            return
+
+        antes = HorarioDisponible.objects.filter(fecha__gte=desde).count()
+        inicio = time.monotonic()
+        candidatos, fechas = generar_horarios(plantillas, desde, hasta, lote=options['lote'])
+        duracion = time.monotonic() - inicio
+        creados = HorarioDisponible.objects.filter(fecha__gte=desde).count() - antes
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {creados} horarios creados ({candidatos - creados} ya existían) '
+            f'en {len(fechas)} días, {duracion:.2f}s'
+        ))
+
+    def _fecha(self, texto, opcion):
+        if not texto:
+            return None
+        try:
+            fecha = parse_date(texto)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            raise CommandError(f'{opcion} inválida (use AAAA-MM-DD)')
+        return fecha
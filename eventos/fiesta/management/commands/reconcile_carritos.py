@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+
+from fiesta.models import Carrito, ItemCarrito
+
+
+class Command(BaseCommand):
+    help = 'Verifica Carrito.total_items / subtotal contra sus items y corrige los desvíos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo reporta los desvíos, sin corregirlos',
+        )
+
+    def handle(self, *args, **options):
+        reales = self._totales_reales()
+        guardados = {
+            pk: (items, subtotal)
+            for pk, items, subtotal in Carrito.objects.values_list('pk', 'total_items', 'subtotal')
+        }
+        desvios = sorted(pk for pk, total in guardados.items() if total != reales.get(pk, (0, 0)))
+
+        self.stdout.write(f'📊 {len(guardados)} carritos revisados')
+        if not desvios:
+            self.stdout.write(self.style.SUCCESS('✅ Totales al día, sin desvíos'))
+            return
+
+        for pk in desvios:
+            items, subtotal = guardados[pk]
+            items_real, subtotal_real = reales.get(pk, (0, 0))
+            self.stdout.write(self.style.WARNING(
+                f'  ⚠️  Carrito {pk}: guardado {items} items / {subtotal}, real {items_real} items / {subtotal_real}'
+            ))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.NOTICE(f'⚠️  MODO DRY-RUN: {len(desvios)} desvíos sin corregir'))
+            return
+
+        with transaction.atomic():
+            # Bloquear los carritos antes de recontar: un cambio concurrente espera y suma sobre el valor corregido
+            carritos = list(Carrito.objects.select_for_update().filter(pk__in=desvios))
+            reales = self._totales_reales(desvios)
+            for carrito in carritos:
+                carrito.total_items, carrito.subtotal = reales.get(carrito.pk, (0, 0))
+            Carrito.objects.bulk_update(carritos, ['total_items', 'subtotal'], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(desvios)} carritos corregidos'))
+
+    def _totales_reales(self, carritos=None):
+        items = ItemCarrito.objects.all()
+        if carritos is not None:
+            items = items.filter(carrito_id__in=carritos)
+        totales = items.values('carrito_id').annotate(
+            items=Sum('cantidad'),
+            subtotal=Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ).order_by()
+        return {t['carrito_id']: (t['items'], t['subtotal']) for t in totales}
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from fiesta.disponibilidad import invalidar_calendario
+from fiesta.models import HorarioDisponible, OcupacionHorario, Reserva
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los contadores de OcupacionHorario desde las reservas y reporta las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo reporta las diferencias, sin corregirlas',
+        )
+
+    def handle(self, *args, **options):
+        reales = self._conteo_real()
+        guardados = dict(OcupacionHorario.objects.values_list('horario_id', 'ocupados'))
+        desvios = sorted(
+            horario_id for horario_id in reales.keys() | guardados.keys()
+            if reales.get(horario_id, 0) != guardados.get(horario_id, 0)
+        )
+
+        self.stdout.write(f'📊 {len(reales)} horarios con reservas activas, {len(guardados)} contadores')
+        if not desvios:
+            self.stdout.write(self.style.SUCCESS('✅ Contadores al día, sin desvíos'))
+            return
+
+        for horario_id in desvios:
+            self.stdout.write(self.style.WARNING(
+                f'  ⚠️  Horario {horario_id}: contador {guardados.get(horario_id, 0)}, '
+                f'real {reales.get(horario_id, 0)}'
+            ))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.NOTICE(f'⚠️  MODO DRY-RUN: {len(desvios)} desvíos sin corregir'))
+            return
+
+        self._corregir(desvios)
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(desvios)} contadores corregidos'))
+
+    def _conteo_real(self, horarios=None):
+        reservas = Reserva.objects.filter(estado__in=Reserva.ESTADOS_QUE_OCUPAN)
+        if horarios is not None:
+            reservas = reservas.filter(horario_id__in=horarios)
+        return dict(reservas.values_list('horario_id').annotate(total=Count('id')).order_by())
+
+    def _corregir(self, horarios):
+        with transaction.atomic():
+            # Crear las filas que falten y bloquearlas antes de recontar:
+            # una reserva en curso espera al lock y suma sobre el valor corregido
+            existentes = set(OcupacionHorario.objects.filter(horario_id__in=horarios).values_list('horario_id', flat=True))
+            OcupacionHorario.objects.bulk_create(
+                [OcupacionHorario(horario_id=h) for h in horarios if h not in existentes],
+                ignore_conflicts=True,
+            )
+            contadores = list(OcupacionHorario.objects.select_for_update().filter(horario_id__in=horarios))
+            reales = self._conteo_real(horarios)
+            for contador in contadores:
+                contador.ocupados = reales.get(contador.horario_id, 0)
+            OcupacionHorario.objects.bulk_update(contadores, ['ocupados'], batch_size=1000)
+
+            fechas = list(HorarioDisponible.objects.filter(id__in=horarios).values_list('fecha', flat=True).distinct())
+            transaction.on_commit(lambda: invalidar_calendario(*fechas))
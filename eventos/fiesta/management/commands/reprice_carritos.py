@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fiesta.precios import repreciar_carritos
+
+
+class Command(BaseCommand):
+    help = 'Reprecia los carritos abiertos con el catálogo actual (precios y promociones vencidas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Items leídos y guardados por lote')
+
+    def handle(self, *args, **options):
+        cambios = repreciar_carritos(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {cambios} líneas de carrito repreciadas'))
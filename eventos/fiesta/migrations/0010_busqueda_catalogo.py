@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:19
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+TABLAS_BUSQUEDA = ('servicio', 'combo', 'promocion')
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    """
+    Solo PostgreSQL: trigger que mantiene la columna tsvector, índice GIN de
+    texto completo e índice de trigramas sobre el nombre (tolerancia a errores).
+    En otros motores la búsqueda usa el índice en memoria de fiesta.busqueda.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for tabla in TABLAS_BUSQUEDA:
+        schema_editor.execute(
+            f"CREATE TRIGGER {tabla}_busqueda_trigger "
+            f"BEFORE INSERT OR UPDATE OF nombre, descripcion ON {tabla} "
+            f"FOR EACH ROW EXECUTE FUNCTION "
+            f"tsvector_update_trigger(busqueda, 'pg_catalog.spanish', nombre, descripcion)"
+        )
+        schema_editor.execute(
+            f"UPDATE {tabla} SET busqueda = to_tsvector('pg_catalog.spanish', "
+            f"coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))"
+        )
+        schema_editor.execute(f"CREATE INDEX {tabla}_busqueda_gin ON {tabla} USING gin (busqueda)")
+        schema_editor.execute(f"CREATE INDEX {tabla}_nombre_trgm ON {tabla} USING gin (nombre gin_trgm_ops)")
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for tabla in TABLAS_BUSQUEDA:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {tabla}_busqueda_trigger ON {tabla}")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {tabla}_busqueda_gin")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {tabla}_nombre_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0009_promocion_cantidad_promocion_precio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='combo',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='promocion',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='reserva',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('APROBADA', 'Aprobada'), ('ANULADA', 'Anulada'), ('ELIMINADA', 'Eliminada')], default='PENDIENTE', max_length=20),
+        ),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
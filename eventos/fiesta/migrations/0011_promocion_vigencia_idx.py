@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0010_busqueda_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promocion',
+            index=models.Index(fields=['activo', 'fecha_inicio', 'fecha_fin'], name='promocion_vigencia_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_ocupacion(apps, schema_editor):
+    """Carga inicial de los contadores con las reservas activas existentes."""
+    Reserva = apps.get_model('fiesta', 'Reserva')
+    OcupacionHorario = apps.get_model('fiesta', 'OcupacionHorario')
+    db = schema_editor.connection.alias
+
+    conteos = (
+        Reserva.objects.using(db)
+        .filter(estado__in=['PENDIENTE', 'APROBADA'])
+        .values('horario_id')
+        .annotate(total=models.Count('id'))
+    )
+    OcupacionHorario.objects.using(db).bulk_create(
+        [OcupacionHorario(horario_id=c['horario_id'], ocupados=c['total']) for c in conteos],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0011_promocion_vigencia_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionHorario',
+            fields=[
+                ('horario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ocupacion', serialize=False, to='fiesta.horariodisponible')),
+                ('ocupados', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ocupación de Horario',
+                'verbose_name_plural': 'Ocupación de Horarios',
+                'db_table': 'ocupacion_horario',
+            },
+        ),
+        migrations.RunPython(poblar_ocupacion, migrations.RunPython.noop),
+    ]
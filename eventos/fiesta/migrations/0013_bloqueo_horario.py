@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0012_ocupacion_horario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueoHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('expira_en', models.DateTimeField()),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloqueos', to='fiesta.registrousuario')),
+                ('horario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloqueos', to='fiesta.horariodisponible')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo de Horario',
+                'verbose_name_plural': 'Bloqueos de Horario',
+                'db_table': 'bloqueo_horario',
+                'indexes': [models.Index(fields=['expira_en'], name='bloqueo_expira_idx')],
+                'constraints': [models.UniqueConstraint(fields=('horario', 'cliente'), name='bloqueo_horario_cliente_unico')],
+            },
+        ),
+    ]
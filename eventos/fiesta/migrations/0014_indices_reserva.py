@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+def normalizar_transacciones(apps, schema_editor):
+    """
+    '' pasa a NULL (el índice único ignora solo NULL). Si quedan IDs repetidos
+    la migración se detiene: hay que resolverlos a mano antes del índice único.
+    """
+    Reserva = apps.get_model('fiesta', 'Reserva')
+    db = schema_editor.connection.alias
+    Reserva.objects.using(db).filter(transaccion_id='').update(transaccion_id=None)
+
+    repetidos = list(
+        Reserva.objects.using(db)
+        .filter(transaccion_id__isnull=False)
+        .values('transaccion_id')
+        .annotate(total=models.Count('id'))
+        .filter(total__gt=1)
+        .values_list('transaccion_id', flat=True)[:20]
+    )
+    if repetidos:
+        raise RuntimeError(
+            'Hay transaccion_id repetidos en reserva (posible fraude), revisarlos antes de migrar: '
+            + ', '.join(repetidos)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0013_bloqueo_horario'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_transacciones, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado__in', ['PENDIENTE', 'APROBADA'])), fields=['fecha_evento'], name='reserva_activa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['horario', 'estado'], name='reserva_horario_estado_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(condition=models.Q(('transaccion_id__isnull', False)), fields=('transaccion_id',), name='reserva_transaccion_unica'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:40
+
+import django.core.validators
+import django.db.models.deletion
+import re
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0014_indices_reserva'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantillaHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('dias_semana', models.CharField(help_text='Días separados por coma: 0=lunes ... 6=domingo (ej: 4,5,6)', max_length=20, validators=[django.core.validators.RegexValidator(re.compile('^\\d+(?:,\\d+)*\\Z'), code='invalid', message='Enter only digits separated by commas.')])),
+                ('capacidad_reserva', models.IntegerField(default=1)),
+                ('fecha_desde', models.DateField()),
+                ('fecha_hasta', models.DateField()),
+                ('fechas_excluidas', models.TextField(blank=True, default='', help_text='Feriados o cierres: AAAA-MM-DD separados por coma o salto de línea')),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Plantilla de Horario',
+                'verbose_name_plural': 'Plantillas de Horario',
+                'db_table': 'plantilla_horario',
+            },
+        ),
+        migrations.CreateModel(
+            name='VentanaPlantilla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventanas', to='fiesta.plantillahorario')),
+            ],
+            options={
+                'verbose_name': 'Ventana de Plantilla',
+                'verbose_name_plural': 'Ventanas de Plantilla',
+                'db_table': 'ventana_plantilla',
+                'ordering': ['hora_inicio'],
+            },
+        ),
+    ]
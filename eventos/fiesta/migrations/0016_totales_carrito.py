@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+def calcular_totales(apps, schema_editor):
+    """Carga inicial de total_items / subtotal desde los items existentes."""
+    Carrito = apps.get_model('fiesta', 'Carrito')
+    ItemCarrito = apps.get_model('fiesta', 'ItemCarrito')
+    db = schema_editor.connection.alias
+
+    totales = (
+        ItemCarrito.objects.using(db)
+        .values('carrito_id')
+        .annotate(
+            items=models.Sum('cantidad'),
+            subtotal=models.Sum(models.F('cantidad') * models.F('precio_unitario'), output_field=models.DecimalField()),
+        )
+    )
+    carritos = []
+    for total in totales:
+        carritos.append(Carrito(pk=total['carrito_id'], total_items=total['items'], subtotal=total['subtotal']))
+    Carrito.objects.using(db).bulk_update(carritos, ['total_items', 'subtotal'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0015_plantilla_horario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='carrito',
+            name='total_items',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
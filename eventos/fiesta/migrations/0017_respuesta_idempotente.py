@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:49
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0016_totales_carrito'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespuestaIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255)),
+                ('endpoint', models.CharField(max_length=255)),
+                ('huella', models.CharField(max_length=64)),
+                ('estado', models.PositiveSmallIntegerField(null=True)),
+                ('cuerpo', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('expira_en', models.DateTimeField()),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='respuestas_idempotentes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Respuesta Idempotente',
+                'verbose_name_plural': 'Respuestas Idempotentes',
+                'db_table': 'respuesta_idempotente',
+                'indexes': [models.Index(fields=['expira_en'], name='idempotencia_expira_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'clave'), name='idempotencia_usuario_clave_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0017_respuesta_idempotente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallereserva',
+            name='imagen_item',
+            field=models.URLField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='detallereserva',
+            name='nombre_item',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='itemcarrito',
+            name='imagen_item',
+            field=models.URLField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='itemcarrito',
+            name='nombre_item',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0018_snapshot_items'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['cliente', '-fecha_evento', '-id'], name='reserva_cliente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+# índice -> (tabla, columna); mismos nombres que fiesta.filtros.INDICES_TRIGRAMA
+INDICES_TRIGRAMA = {
+    'reserva_codigo_trgm': ('reserva', 'codigo_reserva'),
+    'registro_usuario_nombre_trgm': ('registro_usuario', 'nombre'),
+    'registro_usuario_apellido_trgm': ('registro_usuario', 'apellido'),
+}
+
+
+def crear_indices_trigrama(apps, schema_editor):
+    """
+    Solo PostgreSQL: GIN de trigramas sobre UPPER(columna::text), la misma
+    expresión que genera `icontains`, para que ?q= no recorra las tablas.
+    pg_trgm ya lo instala la migración 0010.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for indice, (tabla, columna) in INDICES_TRIGRAMA.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla} USING gin (UPPER({columna}::text) gin_trgm_ops)"
+        )
+
+
+def eliminar_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for indice in INDICES_TRIGRAMA:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {indice}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0019_reserva_cliente_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['fecha_evento', 'id'], name='reserva_fecha_evento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['estado', 'fecha_evento', 'id'], name='reserva_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['metodo_pago', 'fecha_evento', 'id'], name='reserva_metodo_pago_fecha_idx'),
+        ),
+        migrations.RunPython(crear_indices_trigrama, eliminar_indices_trigrama),
+    ]
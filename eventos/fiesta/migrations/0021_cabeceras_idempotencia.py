@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiesta', '0020_filtros_reserva'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='respuestaidempotente',
+            name='cabeceras',
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -1,11 +1,20 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import validate_comma_separated_integer_list
+from django.contrib.postgres.search import SearchVectorField
+from django.db import router, transaction
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
 import uuid
 import threading
+from collections import defaultdict
+from decimal import Decimal
 
 
 # ==========================================
@@ -21,6 +30,82 @@ class ModeloBaseSincronizado(models.Model):
     class Meta:
         abstract = True
 
+
+class PrecioDeCarrito(models.Model):
+    """
+    Producto que se vende en el carrito. Guarda los campos de CAMPOS_PRECIO tal
+    como se leyeron, para que las señales repricen los carritos solo si cambian.
+    """
+    CAMPOS_PRECIO = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._precio_cargado = instancia._precio_actual()
+        return instancia
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._precio_cargado = self._precio_actual()
+
+    def _precio_actual(self):
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_PRECIO)
+
+    def cambio_de_precio(self):
+        """True si cambió algún campo de precio / vigencia (o si no se leyó de la base)."""
+        cargado = getattr(self, '_precio_cargado', None)
+        return cargado is None or cargado != self._precio_actual()
+
+
+class SnapshotProducto(models.Model):
+    """
+    Nombre e imagen del producto (combo / servicio / promoción) copiados al crear
+    la línea, y de nuevo si la línea pasa a otro producto. Se muestran sin JOIN y
+    sobreviven al borrado del producto (las FK quedan en NULL).
+    Las filas anteriores se rellenan con `manage.py backfill_nombres_items`.
+    """
+    CAMPOS_PRODUCTO = ('combo_id', 'servicio_id', 'promocion_id')
+
+    nombre_item = models.CharField(max_length=100, blank=True, default='', editable=False)
+    imagen_item = models.URLField(blank=True, null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._producto_cargado = instancia._producto_actual()
+        return instancia
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._producto_cargado = self._producto_actual()
+
+    def _producto_actual(self):
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_PRODUCTO)
+
+    def _cambio_de_producto(self):
+        cargado = getattr(self, '_producto_cargado', None)
+        return cargado is not None and cargado != self._producto_actual()
+
+    def copiar_producto(self):
+        producto = self.combo or self.servicio or self.promocion
+        if producto is not None:
+            self.nombre_item = producto.nombre
+            self.imagen_item = getattr(producto, 'imagen', None)  # Las promociones no tienen imagen
+
+    def save(self, *args, **kwargs):
+        if not self.nombre_item or self._cambio_de_producto():
+            self.copiar_producto()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'nombre_item', 'imagen_item'}
+        super().save(*args, **kwargs)
+        self._producto_cargado = self._producto_actual()
+
 # ==========================================
 # 1. GESTIÓN DE USUARIOS Y CLIENTES
 # ==========================================
@@ -118,7 +203,9 @@ class Categoria(ModeloBaseSincronizado):
         return self.nombre
 
 
-class Promocion(ModeloBaseSincronizado):
+class Promocion(PrecioDeCarrito, ModeloBaseSincronizado):
+    CAMPOS_PRECIO = ('precio', 'descuento_monto', 'activo', 'fecha_inicio', 'fecha_fin')
+
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
     descuento_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
@@ -128,17 +215,25 @@ class Promocion(ModeloBaseSincronizado):
     fecha_inicio = models.DateTimeField()
     fecha_fin = models.DateTimeField()
     activo = models.BooleanField(default=True)
+    # Índice de búsqueda (nombre + descripción). En PostgreSQL lo mantiene un trigger
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Promoción"
         verbose_name_plural = "Promociones"
         db_table = 'promocion'
+        indexes = [
+            # Promociones vigentes: activo AND fecha_inicio <= now AND fecha_fin >= now
+            models.Index(fields=['activo', 'fecha_inicio', 'fecha_fin'], name='promocion_vigencia_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} (${self.precio} - x{self.cantidad})"
 
 
-class Servicio(ModeloBaseSincronizado):
+class Servicio(PrecioDeCarrito, ModeloBaseSincronizado):
+    CAMPOS_PRECIO = ('precio_base',)
+
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, related_name='servicios')
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
@@ -147,6 +242,8 @@ class Servicio(ModeloBaseSincronizado):
     capacidad_persona = models.IntegerField()
     imagen = models.URLField(blank=True, null=True)
     disponible = models.BooleanField(default=True)
+    # Índice de búsqueda (nombre + descripción). En PostgreSQL lo mantiene un trigger
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Servicio"
@@ -157,7 +254,9 @@ class Servicio(ModeloBaseSincronizado):
         return f"{self.nombre} - ${self.precio_base}"
 
 
-class Combo(ModeloBaseSincronizado):
+class Combo(PrecioDeCarrito, ModeloBaseSincronizado):
+    CAMPOS_PRECIO = ('precio_combo',)
+
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
     precio_combo = models.DecimalField(max_digits=10, decimal_places=2)
@@ -167,6 +266,8 @@ class Combo(ModeloBaseSincronizado):
     
     servicios = models.ManyToManyField('Servicio', through='ComboServicio', related_name='combos')
     promocion = models.ForeignKey(Promocion, on_delete=models.SET_NULL, null=True, blank=True, related_name='combos')
+    # Índice de búsqueda (nombre + descripción). En PostgreSQL lo mantiene un trigger
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Combo"
@@ -199,6 +300,11 @@ class Carrito(ModeloBaseSincronizado):
     """
     cliente = models.OneToOneField(RegistroUsuario, on_delete=models.CASCADE, related_name='carrito')
 
+    # Totales desnormalizados: los mantiene ItemCarrito.save() / post_delete con F()
+    # (`manage.py reconcile_carritos` los verifica y corrige)
+    total_items = models.IntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
     class Meta:
         verbose_name = "Carrito de Compras"
         verbose_name_plural = "Carritos de Compras"
@@ -207,7 +313,55 @@ class Carrito(ModeloBaseSincronizado):
     def __str__(self):
         return f"Carrito de {self.cliente.nombre}"
 
-class ItemCarrito(ModeloBaseSincronizado):
+    @classmethod
+    def ajustar_totales(cls, carrito_id, items, subtotal, using=None):
+        """UPDATE carrito SET total_items = total_items + items, subtotal = subtotal + ..."""
+        if carrito_id and (items or subtotal):
+            cls.objects.db_manager(using).filter(pk=carrito_id).update(
+                total_items=models.F('total_items') + items,
+                subtotal=models.F('subtotal') + subtotal,
+            )
+
+    @classmethod
+    def recalcular_totales(cls, carrito_id, using=None):
+        """UPDATE carrito SET total_items / subtotal = suma de sus items (un solo UPDATE con subconsultas)."""
+        items = ItemCarrito.objects.using(using).filter(carrito=models.OuterRef('pk')).values('carrito')
+        cls.objects.db_manager(using).filter(pk=carrito_id).update(
+            total_items=Coalesce(
+                models.Subquery(items.annotate(total=models.Sum('cantidad')).values('total')), 0,
+            ),
+            subtotal=Coalesce(
+                models.Subquery(items.annotate(total=models.Sum(
+                    models.F('cantidad') * models.F('precio_unitario'),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                )).values('total')),
+                models.Value(Decimal('0')), output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    @classmethod
+    def ajustar_totales_en_lote(cls, deltas, using=None):
+        """Igual que ajustar_totales para {carrito_id: (items, subtotal)}, en un solo UPDATE con CASE."""
+        deltas = {carrito_id: delta for carrito_id, delta in deltas.items() if carrito_id and any(delta)}
+        if not deltas:
+            return
+        cls.objects.db_manager(using).filter(pk__in=deltas).update(
+            total_items=models.F('total_items') + models.Case(
+                *[models.When(pk=carrito_id, then=models.Value(items)) for carrito_id, (items, _) in deltas.items()],
+                default=models.Value(0), output_field=models.IntegerField(),
+            ),
+            subtotal=models.F('subtotal') + models.Case(
+                *[models.When(pk=carrito_id, then=models.Value(subtotal)) for carrito_id, (_, subtotal) in deltas.items()],
+                default=models.Value(Decimal('0')), output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+# Descuentos acumulados por ItemCarrito.borrar_en_bloque: mientras está activo,
+# descontar_item_carrito suma acá en vez de hacer un UPDATE por item
+_descuentos_en_bloque = threading.local()
+
+
+class ItemCarrito(SnapshotProducto, ModeloBaseSincronizado):
     """
     Items individuales dentro del carrito. 
     Puede ser un Servicio O un Combo.
@@ -229,19 +383,59 @@ class ItemCarrito(ModeloBaseSincronizado):
         db_table = 'item_carrito'
 
     def __str__(self):
-        nombre = "Item desconocido"
-        if self.combo:
-            nombre = self.combo.nombre
-        elif self.servicio:
-            nombre = self.servicio.nombre
-        elif self.promocion:
-            nombre = self.promocion.nombre
-        return f"{nombre} (x{self.cantidad})"
+        return f"{self.nombre_item or 'Item desconocido'} (x{self.cantidad})"
         
     @property
     def subtotal(self):
         return self.precio_unitario * self.cantidad
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._aporte_guardado = instancia.aporte()
+        return instancia
+
+    def aporte(self):
+        """(carrito_id, cantidad, subtotal) con que este item suma a los totales del carrito."""
+        cantidad = self.cantidad or 0
+        return self.carrito_id, cantidad, Decimal(str(self.precio_unitario or 0)) * cantidad
+
+    def save(self, *args, **kwargs):
+        """Guarda y aplica la diferencia en Carrito.total_items / subtotal en la misma transacción."""
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            antes = getattr(self, '_aporte_guardado', (None, 0, 0))
+            ahora = self.aporte()
+            if antes[0] == ahora[0]:
+                Carrito.ajustar_totales(ahora[0], ahora[1] - antes[1], ahora[2] - antes[2], using=using)
+            else:
+                # Cambió de carrito: se descuenta del anterior y se suma al nuevo
+                Carrito.ajustar_totales(antes[0], -antes[1], -antes[2], using=using)
+                Carrito.ajustar_totales(ahora[0], ahora[1], ahora[2], using=using)
+            self._aporte_guardado = ahora
+
+    @classmethod
+    def borrar_en_bloque(cls, queryset, ajustar=True):
+        """
+        queryset.delete() con un solo ajuste de totales: lo que descuenta cada
+        fila realmente borrada se acumula y se aplica con ajustar_totales_en_lote
+        (con ajustar=False no se aplica: el que llama recalcula los totales).
+        Devuelve {carrito_id: [items, subtotal]} (negativos) de lo borrado.
+        """
+        using = queryset.db
+        deltas = defaultdict(lambda: [0, Decimal('0')])
+        with transaction.atomic(using=using):
+            anteriores = getattr(_descuentos_en_bloque, 'deltas', None)
+            _descuentos_en_bloque.deltas = deltas
+            try:
+                queryset.delete()
+            finally:
+                _descuentos_en_bloque.deltas = anteriores
+            if ajustar:
+                Carrito.ajustar_totales_en_lote(deltas, using=using)
+        return deltas
+
 
 # ==========================================
 # 3. GESTIÓN DE EVENTOS (Reservas, Pagos)
@@ -263,6 +457,145 @@ class HorarioDisponible(ModeloBaseSincronizado):
     def __str__(self):
         return f"{self.fecha} | {self.hora_inicio} - {self.hora_fin}"
 
+    def reservas_activas(self):
+        """Lee el contador de OcupacionHorario (usar select_related('ocupacion'))."""
+        try:
+            return self.ocupacion.ocupados
+        except OcupacionHorario.DoesNotExist:
+            return 0
+
+
+class OcupacionHorario(models.Model):
+    """
+    Contador desnormalizado de reservas activas (PENDIENTE / APROBADA) por horario.
+    Lo mantiene Reserva.save() / post_delete dentro de la misma transacción;
+    `manage.py reconcile_ocupacion` lo reconstruye desde cero.
+    """
+    horario = models.OneToOneField(
+        HorarioDisponible, on_delete=models.CASCADE, primary_key=True, related_name='ocupacion'
+    )
+    ocupados = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Ocupación de Horario"
+        verbose_name_plural = "Ocupación de Horarios"
+        db_table = 'ocupacion_horario'
+
+    def __str__(self):
+        return f"{self.horario} | {self.ocupados} ocupados"
+
+    @classmethod
+    def ajustar(cls, horario_id, delta, using=None):
+        """Suma `delta` al contador con un UPDATE ... SET ocupados = ocupados + delta."""
+        manager = cls.objects.db_manager(using)
+        if not manager.filter(horario_id=horario_id).update(ocupados=models.F('ocupados') + delta):
+            # Primer movimiento del horario: se crea la fila y se reintenta
+            manager.get_or_create(horario_id=horario_id)
+            manager.filter(horario_id=horario_id).update(ocupados=models.F('ocupados') + delta)
+
+
+class PlantillaHorario(ModeloBaseSincronizado):
+    """
+    Horario recurrente: días de la semana + ventanas horarias + capacidad,
+    vigente entre dos fechas. `manage.py generate_horarios` (o la acción del
+    admin) la materializa en filas de HorarioDisponible.
+    """
+    nombre = models.CharField(max_length=100)
+    dias_semana = models.CharField(
+        max_length=20, validators=[validate_comma_separated_integer_list],
+        help_text="Días separados por coma: 0=lunes ... 6=domingo (ej: 4,5,6)",
+    )
+    capacidad_reserva = models.IntegerField(default=1)
+    fecha_desde = models.DateField()
+    fecha_hasta = models.DateField()
+    fechas_excluidas = models.TextField(
+        blank=True, default='', help_text="Feriados o cierres: AAAA-MM-DD separados por coma o salto de línea",
+    )
+    activo = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = "Plantilla de Horario"
+        verbose_name_plural = "Plantillas de Horario"
+        db_table = 'plantilla_horario'
+
+    def __str__(self):
+        return f"{self.nombre} ({self.fecha_desde} a {self.fecha_hasta})"
+
+    def clean(self):
+        if self.fecha_desde and self.fecha_hasta and self.fecha_hasta < self.fecha_desde:
+            raise ValidationError({'fecha_hasta': 'No puede ser anterior a fecha_desde'})
+        # clean() corre aunque el validador del campo ya haya fallado: "4,x" llega hasta acá
+        try:
+            dias = self.dias()
+        except ValueError:
+            raise ValidationError({'dias_semana': 'Use números separados por coma (ej: 4,5,6)'})
+        if any(not 0 <= dia <= 6 for dia in dias):
+            raise ValidationError({'dias_semana': 'Los días van de 0 (lunes) a 6 (domingo)'})
+        try:
+            self.excluidas()
+        except ValueError:
+            raise ValidationError({'fechas_excluidas': 'Use fechas AAAA-MM-DD'})
+
+    def dias(self):
+        return {int(dia) for dia in self.dias_semana.split(',') if dia.strip()}
+
+    def excluidas(self):
+        fechas = set()
+        for texto in self.fechas_excluidas.replace(',', '\n').split():
+            fecha = parse_date(texto)
+            if fecha is None:
+                raise ValueError(texto)
+            fechas.add(fecha)
+        return fechas
+
+
+class VentanaPlantilla(models.Model):
+    """Bloque horario de una plantilla (una fila de HorarioDisponible por día)."""
+    plantilla = models.ForeignKey(PlantillaHorario, on_delete=models.CASCADE, related_name='ventanas')
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+
+    class Meta:
+        verbose_name = "Ventana de Plantilla"
+        verbose_name_plural = "Ventanas de Plantilla"
+        db_table = 'ventana_plantilla'
+        ordering = ['hora_inicio']
+
+    def __str__(self):
+        return f"{self.hora_inicio} - {self.hora_fin}"
+
+    def clean(self):
+        if self.hora_inicio and self.hora_fin and self.hora_fin <= self.hora_inicio:
+            raise ValidationError({'hora_fin': 'Debe ser posterior a hora_inicio'})
+
+
+class BloqueoHorario(models.Model):
+    """
+    Retención temporal de un cupo mientras el cliente completa el checkout.
+    Cuenta contra la capacidad hasta `expira_en`; confirmar la reserva la consume.
+    `manage.py expirar_bloqueos` borra las vencidas en un solo DELETE.
+    """
+    horario = models.ForeignKey(HorarioDisponible, on_delete=models.CASCADE, related_name='bloqueos')
+    cliente = models.ForeignKey(RegistroUsuario, on_delete=models.CASCADE, related_name='bloqueos')
+    creado_en = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Bloqueo de Horario"
+        verbose_name_plural = "Bloqueos de Horario"
+        db_table = 'bloqueo_horario'
+        constraints = [
+            # Un bloqueo por cliente y horario: retener de nuevo lo extiende
+            models.UniqueConstraint(fields=['horario', 'cliente'], name='bloqueo_horario_cliente_unico'),
+        ]
+        indexes = [
+            # El barrido de vencidos (expira_en < now) recorre solo este índice
+            models.Index(fields=['expira_en'], name='bloqueo_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.horario} | {self.cliente} hasta {self.expira_en:%H:%M}"
+
 
 class ConfiguracionPago(ModeloBaseSincronizado):
     """
@@ -298,6 +631,9 @@ class Reserva(ModeloBaseSincronizado):
         ('ELIMINADA', 'Eliminada'),
     ]
 
+    # Estados que ocupan un cupo del horario (ANULADA / ELIMINADA lo liberan)
+    ESTADOS_QUE_OCUPAN = ('PENDIENTE', 'APROBADA')
+
     cliente = models.ForeignKey(RegistroUsuario, on_delete=models.PROTECT, related_name='reservas')
     horario = models.ForeignKey(HorarioDisponible, on_delete=models.PROTECT, related_name='reservas')
     
@@ -329,12 +665,67 @@ class Reserva(ModeloBaseSincronizado):
         verbose_name = "Reserva"
         verbose_name_plural = "Reservas"
         db_table = 'reserva'
+        indexes = [
+            # Reservas activas de un día: regla de un evento por día del checkout (disponibilidad.tomar_dia).
+            # Parcial: ANULADA / ELIMINADA no entran al índice
+            models.Index(
+                fields=['fecha_evento'], name='reserva_activa_fecha_idx',
+                condition=models.Q(estado__in=['PENDIENTE', 'APROBADA']),
+            ),
+            # Ocupación por horario (disponibilidad, reconcile_ocupacion)
+            models.Index(fields=['horario', 'estado'], name='reserva_horario_estado_idx'),
+            # Historial de un cliente (/api/reservas/mias/): WHERE cliente_id ORDER BY fecha_evento DESC, id DESC
+            models.Index(fields=['cliente', '-fecha_evento', '-id'], name='reserva_cliente_fecha_idx'),
+            # Filtros del backoffice (fiesta.filtros): rango de fechas, estado y método de pago,
+            # todos con fecha_evento, id al final para paginar por cursor en el mismo índice.
+            # codigo_reserva y el nombre del cliente usan GIN de trigramas (migración 0020)
+            models.Index(fields=['fecha_evento', 'id'], name='reserva_fecha_evento_idx'),
+            models.Index(fields=['estado', 'fecha_evento', 'id'], name='reserva_estado_fecha_idx'),
+            models.Index(fields=['metodo_pago', 'fecha_evento', 'id'], name='reserva_metodo_pago_fecha_idx'),
+        ]
+        constraints = [
+            # Antifraude: un ID de transacción de la pasarela no se repite entre reservas
+            models.UniqueConstraint(
+                fields=['transaccion_id'], name='reserva_transaccion_unica',
+                condition=models.Q(transaccion_id__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f"#{self.codigo_reserva} - {self.fecha_evento} ({self.estado})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._horario_ocupado = instancia._horario_que_ocupa()
+        return instancia
+
+    def _horario_que_ocupa(self):
+        return self.horario_id if self.estado in self.ESTADOS_QUE_OCUPAN else None
 
-class DetalleReserva(ModeloBaseSincronizado):
+    def save(self, *args, **kwargs):
+        """
+        Guarda y mueve el contador de OcupacionHorario en la misma transacción
+        cuando la reserva entra o sale de PENDIENTE / APROBADA (o cambia de horario).
+        """
+        # '' y None significan "sin transacción": solo None queda fuera del índice único
+        if not self.transaccion_id:
+            self.transaccion_id = None
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            antes = getattr(self, '_horario_ocupado', None)
+            ahora = self._horario_que_ocupa()
+            if antes != ahora:
+                if antes:
+                    OcupacionHorario.ajustar(antes, -1, using=using)
+                if ahora:
+                    OcupacionHorario.ajustar(ahora, 1, using=using)
+                self._horario_ocupado = ahora
+
+
+class DetalleReserva(SnapshotProducto, ModeloBaseSincronizado):
     TIPO_CHOICES = [
         ('C', 'Combo'),
         ('S', 'Servicio'),
@@ -359,14 +750,7 @@ class DetalleReserva(ModeloBaseSincronizado):
         db_table = 'detalle_reserva'
 
     def __str__(self):
-        item_nombre = "Item eliminado"
-        if self.combo:
-            item_nombre = self.combo.nombre
-        elif self.servicio:
-            item_nombre = self.servicio.nombre
-        elif self.promocion:
-            item_nombre = self.promocion.nombre
-        return f"{self.reserva.codigo_reserva}: {item_nombre} x{self.cantidad}"
+        return f"{self.reserva.codigo_reserva}: {self.nombre_item or 'Item eliminado'} x{self.cantidad}"
 
 
 class Pago(ModeloBaseSincronizado):
@@ -401,6 +785,40 @@ class Cancelacion(ModeloBaseSincronizado):
     def __str__(self):
         return f"Cancelación #{self.reserva.codigo_reserva}"
 
+
+class RespuestaIdempotente(models.Model):
+    """
+    Respuesta guardada de un POST con cabecera Idempotency-Key (ver fiesta/idempotencia.py).
+    Un reintento con la misma clave y el mismo cuerpo la repite sin ejecutar de nuevo.
+    `manage.py expirar_idempotencia` borra las vencidas en un solo DELETE.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='respuestas_idempotentes')
+    clave = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    # sha256 del método, la ruta y el cuerpo: la misma clave con otro cuerpo es un error del cliente
+    huella = models.CharField(max_length=64)
+    # Vacíos mientras la primera ejecución está en curso (nadie más ve esa fila sin confirmar)
+    estado = models.PositiveSmallIntegerField(null=True)
+    cuerpo = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    cabeceras = models.JSONField(null=True)  # Location, etc.: se repiten junto al cuerpo
+    creado_en = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Respuesta Idempotente"
+        verbose_name_plural = "Respuestas Idempotentes"
+        db_table = 'respuesta_idempotente'
+        constraints = [
+            # Además de evitar duplicados, hace esperar al INSERT concurrente de la misma clave
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='idempotencia_usuario_clave_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['expira_en'], name='idempotencia_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} {self.endpoint} [{self.clave}] -> {self.estado}"
+
 # ==========================================
 # 5. SEÑALES (AUTOMATIZACIÓN DE PERFILES)
 # ==========================================
@@ -451,3 +869,95 @@ def auto_confirmacion_pago(sender, instance, created, **kwargs):
 # 2. CASO: ANULADA
     if instance.estado == 'ANULADA':
         enviar_correo_anulacion(instance.id)
+
+
+# ==========================================
+# 6. SIGNALS (Versión del catálogo)
+# ==========================================
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+@receiver(post_save, sender=Combo)
+@receiver(post_delete, sender=Combo)
+@receiver(post_save, sender=ComboServicio)
+@receiver(post_delete, sender=ComboServicio)
+@receiver(post_save, sender=Promocion)
+@receiver(post_delete, sender=Promocion)
+def invalidar_snapshot_catalogo(sender, using=None, **kwargs):
+    """
+    Cualquier escritura en el catálogo sube la versión de los snapshots.
+    Se hace en on_commit para que ningún lector cachee datos sin confirmar
+    bajo la versión nueva.
+    """
+    from .catalogo import incrementar_version_catalogo
+    transaction.on_commit(incrementar_version_catalogo, using=using)
+
+
+# ==========================================
+# 7. SIGNALS (Calendario de disponibilidad)
+# ==========================================
+
+@receiver(post_save, sender=Reserva)
+@receiver(post_delete, sender=Reserva)
+@receiver(post_save, sender=HorarioDisponible)
+@receiver(post_delete, sender=HorarioDisponible)
+def invalidar_calendario_mes(sender, instance, using=None, **kwargs):
+    """
+    Borra de la cache el mes afectado. Si un horario se mueve de mes, el mes
+    anterior se corrige al vencer CALENDARIO_CACHE_TIMEOUT.
+    """
+    from .disponibilidad import invalidar_calendario
+    fecha = instance.fecha_evento if sender is Reserva else instance.fecha
+    transaction.on_commit(lambda: invalidar_calendario(fecha), using=using)
+
+
+# ==========================================
+# 8. SIGNALS (Ocupación de horarios)
+# ==========================================
+
+@receiver(post_delete, sender=Reserva)
+def liberar_ocupacion_reserva(sender, instance, using=None, **kwargs):
+    # Corre dentro de la transacción del Collector, igual que el DELETE
+    horario_id = getattr(instance, '_horario_ocupado', None)
+    if horario_id:
+        OcupacionHorario.ajustar(horario_id, -1, using=using)
+
+
+# ==========================================
+# 9. SIGNALS (Totales del carrito)
+# ==========================================
+
+@receiver(post_delete, sender=ItemCarrito)
+def descontar_item_carrito(sender, instance, using=None, **kwargs):
+    # Corre dentro de la transacción del DELETE (también en carrito.items.all().delete())
+    carrito_id, cantidad, subtotal = getattr(instance, '_aporte_guardado', instance.aporte())
+    deltas = getattr(_descuentos_en_bloque, 'deltas', None)
+    if deltas is not None:
+        # Dentro de ItemCarrito.borrar_en_bloque: se aplica un solo UPDATE al final
+        deltas[carrito_id][0] -= cantidad
+        deltas[carrito_id][1] -= subtotal
+        return
+    Carrito.ajustar_totales(carrito_id, -cantidad, -subtotal, using=using)
+
+
+# ==========================================
+# 10. SIGNALS (Precios de los carritos)
+# ==========================================
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_save, sender=Combo)
+@receiver(post_save, sender=Promocion)
+def repreciar_carritos_del_producto(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    # Un producto recién creado no está en ningún carrito; editar el nombre o
+    # la descripción no cambia ningún precio
+    cambio = not created and instance.cambio_de_precio()
+    instance._precio_cargado = instance._precio_actual()
+    if not cambio:
+        return
+    from .precios import repreciar_en_segundo_plano
+    tipo = {Servicio: 'servicio', Combo: 'combo', Promocion: 'promocion'}[sender]
+    repreciar_en_segundo_plano({tipo: [instance.pk]}, using=using)
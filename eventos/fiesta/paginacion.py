@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacionKeyset(CursorPagination):
+    """
+    Paginación por keyset (cursor) sobre columnas indexadas.
+    - Opt-in: solo pagina si el cliente envía ?cursor= o ?page_size=,
+      sin esos parámetros la respuesta sigue siendo la lista completa.
+    - Sin COUNT(*): cada página es un WHERE id < :cursor ORDER BY -id LIMIT n.
+    - Cursores estables aunque se inserten filas nuevas entre páginas.
+    """
+    ordering = '-id'
+    page_size = getattr(settings, 'PAGINACION_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PAGINACION_MAX_PAGE_SIZE', 200)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.cursor_query_param not in request.query_params
+                and self.page_size_query_param not in request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class PaginacionHistorialReservas(PaginacionKeyset):
+    """
+    Historial del cliente (/api/reservas/mias/): siempre paginado, del evento más
+    reciente al más antiguo, sobre el índice reserva_cliente_fecha_idx
+    (cliente, -fecha_evento, -id) y sin COUNT(*).
+    El cursor de DRF guarda solo la fecha_evento: entre reservas de la misma
+    fecha avanza con un OFFSET, acotado a las reservas de ese día del cliente.
+    """
+    ordering = ('-fecha_evento', '-id')
+    page_size = getattr(settings, 'PAGINACION_HISTORIAL_PAGE_SIZE', 20)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return CursorPagination.paginate_queryset(self, queryset, request, view)
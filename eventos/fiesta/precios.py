@@ -0,0 +1,162 @@
+import logging
+import threading
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Carrito, Combo, ItemCarrito, Promocion, Servicio
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# PRECIOS DEL CATÁLOGO
+# ==========================================
+
+# Tipo de producto del carrito -> (modelo, campo FK en ItemCarrito)
+PRODUCTOS_CARRITO = {
+    'servicio': (Servicio, 'servicio'),
+    'combo': (Combo, 'combo'),
+    'promocion': (Promocion, 'promocion'),
+}
+
+
+def precio_de_producto(tipo, producto):
+    if tipo == 'servicio':
+        return producto.precio_base
+    if tipo == 'combo':
+        # Intentar precio_combo primero, luego precio_total si existe (fallback)
+        return producto.precio_combo or getattr(producto, 'precio_total', 0)
+    # Promoción: priorizar precio > 0, si es 0 usar descuento_monto
+    return producto.precio if producto.precio > 0 else (producto.descuento_monto or 0)
+
+
+def promocion_vigente(promocion, ahora=None):
+    """Mismo criterio que obtener_promociones_activas: activo y fecha_inicio <= ahora <= fecha_fin."""
+    ahora = ahora or timezone.now()
+    return promocion.activo and promocion.fecha_inicio <= ahora <= promocion.fecha_fin
+
+
+def producto_de_item(item):
+    """(tipo, producto) del item; (None, None) si el producto se borró del catálogo (FK en NULL)."""
+    for tipo, (_, campo) in PRODUCTOS_CARRITO.items():
+        if getattr(item, f'{campo}_id'):
+            return tipo, getattr(item, campo)
+    return None, None
+
+
+# ==========================================
+# REVISIÓN DE PRECIOS DEL CARRITO
+# ==========================================
+
+def _revisar(item, ahora):
+    """(motivo, precio actual) si el item ya no coincide con el catálogo; None si sigue igual."""
+    tipo, producto = producto_de_item(item)
+    if producto is None:
+        return 'producto_eliminado', None
+    if tipo == 'promocion' and not promocion_vigente(producto, ahora):
+        return 'promocion_vencida', None
+    precio = Decimal(str(precio_de_producto(tipo, producto)))
+    if precio != Decimal(str(item.precio_unitario or 0)):
+        return 'precio', precio
+    return None
+
+
+def repreciar_items(items, ahora=None, using=None):
+    """
+    Compara los items (con servicio/combo/promocion ya cargados) contra el
+    catálogo actual. Los que cambiaron se vuelven a leer con select_for_update
+    (el cliente pudo cambiar la cantidad o quitarlos desde la primera lectura)
+    y se guardan en bloque con lo leído bajo el lock:
+    - precio distinto: se actualiza (un bulk_update) y se ajustan los totales
+    - promoción vencida o producto borrado: la línea se quita (borrar_en_bloque)
+    Devuelve (items que siguen en el carrito, cambios). Sin cambios no escribe nada.
+    """
+    ahora = ahora or timezone.now()
+    using = using or router.db_for_write(ItemCarrito)
+    candidatos = [item.pk for item in items if _revisar(item, ahora)]
+    if not candidatos:
+        return list(items), []
+
+    cambios, actualizar, eliminar = [], [], []
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    with transaction.atomic(using=using):
+        bloqueados = ItemCarrito.objects.using(using).select_for_update(of=('self',)).select_related(
+            'servicio', 'combo', 'promocion',
+        ).in_bulk(candidatos)
+        # Un candidato que ya no está lo quitó el cliente: su post_delete ya descontó los totales
+        for item in bloqueados.values():
+            revision = _revisar(item, ahora)
+            if revision is None:
+                continue
+            motivo, precio = revision
+            tipo, producto = producto_de_item(item)
+            carrito_id, cantidad, subtotal = item.aporte()
+            cambios.append({
+                'item': item.pk, 'tipo': tipo, 'producto': producto.pk if producto else None,
+                'nombre': producto.nombre if producto else None, 'cantidad': cantidad,
+                'precio_anterior': Decimal(str(item.precio_unitario or 0)), 'precio_actual': precio,
+                'motivo': motivo,
+            })
+            if motivo == 'precio':
+                item.precio_unitario = precio
+                actualizar.append(item)
+                deltas[carrito_id][1] += item.aporte()[2] - subtotal
+            else:
+                eliminar.append(item.pk)
+
+        if actualizar:
+            ItemCarrito.objects.using(using).bulk_update(actualizar, ['precio_unitario'], batch_size=500)
+            Carrito.ajustar_totales_en_lote(deltas, using=using)
+        if eliminar:
+            # Los totales se descuentan de las filas que realmente se borran
+            ItemCarrito.borrar_en_bloque(ItemCarrito.objects.using(using).filter(pk__in=eliminar))
+
+    vigentes = [
+        bloqueados.get(item.pk, item) for item in items
+        if item.pk not in eliminar and (item.pk in bloqueados or item.pk not in candidatos)
+    ]
+    return vigentes, cambios
+
+
+def repreciar_carritos(productos=None, lote=500):
+    """
+    Job de fondo: reprecia los carritos abiertos que tienen alguno de los
+    productos ({tipo: [ids]}) o todos si productos es None. Lee los items por
+    lotes (un SELECT con los tres productos) y guarda cada lote en bloque.
+    Devuelve la cantidad de líneas modificadas.
+    """
+    items = ItemCarrito.objects.select_related('servicio', 'combo', 'promocion').order_by('pk')
+    if productos is not None:
+        filtro = Q()
+        for tipo, ids in productos.items():
+            filtro |= Q(**{f'{PRODUCTOS_CARRITO[tipo][1]}__in': ids})
+        if not filtro:
+            return 0
+        items = items.filter(filtro)
+
+    total = 0
+    iterador = items.iterator(chunk_size=lote)
+    while bloque := list(islice(iterador, lote)):
+        total += len(repreciar_items(bloque)[1])
+    return total
+
+
+def repreciar_en_segundo_plano(productos, using=None):
+    """Corre repreciar_carritos en un hilo después del commit (lo usan las señales del catálogo)."""
+    def tarea():
+        try:
+            cambios = repreciar_carritos(productos)
+            if cambios:
+                logger.info('%s líneas de carrito repreciadas (%s)', cambios, productos)
+        except Exception:
+            logger.exception('Error repreciando carritos (%s)', productos)
+        finally:
+            connection.close()
+
+    hilo = threading.Thread(target=tarea, daemon=True)
+    transaction.on_commit(hilo.start, using=using)
@@ -0,0 +1,110 @@
+import decimal
+
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # Fallback a la librería estándar
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# ==========================================
+# JSON
+# ==========================================
+
+# Los DecimalField ya llegan como texto (COERCE_DECIMAL_TO_STRING, por defecto);
+# un Decimal suelto en la respuesta sale como número, igual que en DRF.
+_encoder_drf = encoders.JSONEncoder()
+
+
+class JSONRapidoRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer respaldado por orjson (si está instalado).
+    Produce el mismo JSON que el renderer estándar: lo que orjson no conoce
+    (Decimal, fechas, lazy strings) se delega al encoder de DRF.
+    orjson solo sabe indentar con 2 espacios: la salida indentada (`; indent=N`,
+    la API navegable) la arma el renderer estándar, con la indentación pedida.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(data, default=_encoder_drf.default, option=opciones)
+
+
+# ==========================================
+# MESSAGEPACK
+# ==========================================
+
+# Con este renderer los DecimalField entregan Decimal (serializers.DecimalSegunRenderer)
+# y viajan con la extensión 1, exactos y más cortos que el texto:
+# Extensión 1: Decimal = [exponente: int8][mantisa: entero con signo big-endian]
+# Ej: Decimal('1234.56') -> exponente -2, mantisa 123456 -> 4 bytes (en texto son 7)
+EXT_DECIMAL = 1
+
+
+def _empaquetar_decimal(valor):
+    signo, digitos, exponente = valor.as_tuple()
+    mantisa = int(''.join(map(str, digitos)) or 0) * (-1 if signo else 1)
+    largo = max(1, (mantisa.bit_length() + 8) // 8)
+    return exponente.to_bytes(1, 'big', signed=True) + mantisa.to_bytes(largo, 'big', signed=True)
+
+
+def _desempaquetar_decimal(datos):
+    exponente = int.from_bytes(datos[:1], 'big', signed=True)
+    mantisa = int.from_bytes(datos[1:], 'big', signed=True)
+    return decimal.Decimal(mantisa).scaleb(exponente)
+
+
+def _default_msgpack(obj):
+    if isinstance(obj, decimal.Decimal) and obj.is_finite() and -128 <= obj.as_tuple().exponent <= 127:
+        return msgpack.ExtType(EXT_DECIMAL, _empaquetar_decimal(obj))
+    return _encoder_drf.default(obj)
+
+
+def _ext_hook(codigo, datos):
+    if codigo == EXT_DECIMAL:
+        return _desempaquetar_decimal(datos)
+    return msgpack.ExtType(codigo, datos)
+
+
+def _requiere_msgpack():
+    if msgpack is None:
+        raise ImportError("Instala 'msgpack' para usar application/msgpack")
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Se elige con `Accept: application/msgpack`."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    decimales_nativos = True
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        _requiere_msgpack()
+        return msgpack.packb(data, default=_default_msgpack, use_bin_type=True)
+
+
+class MessagePackParser(parsers.BaseParser):
+    """Acepta cuerpos `Content-Type: application/msgpack`."""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        _requiere_msgpack()
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=_ext_hook, raw=False)
+        except Exception as e:
+            raise ParseError(f'MessagePack inválido: {e}')
@@ -1,112 +1,145 @@
+import decimal
+
 from rest_framework import serializers
-from django.db import transaction, IntegrityError
+from django.db import models, transaction, IntegrityError
 from .models import (
     RegistroUsuario, Promocion, Categoria, Servicio, Combo, ComboServicio,
     HorarioDisponible, Reserva, DetalleReserva, Pago, Cancelacion,
     Carrito, ItemCarrito, ConfiguracionPago  # <--- Agregamos los nuevos modelos aquí
 )
+from .campos_dinamicos import CamposDinamicosMixin
+
+_campo_importe = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+
+
+def importe(valor):
+    """Importe de una respuesta armada a mano, con el mismo formato que un DecimalField ("10.00")."""
+    return None if valor is None else _campo_importe.to_representation(valor)
+
+
+class DecimalSegunRenderer(serializers.DecimalField):
+    """
+    DecimalField que entrega Decimal (no texto) cuando el renderer elegido lo
+    codifica de forma nativa (`decimales_nativos`, MessagePack). Para JSON sigue
+    siendo el texto de siempre ("10.00").
+    """
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        if value is None or not getattr(getattr(request, 'accepted_renderer', None), 'decimales_nativos', False):
+            return super().to_representation(value)
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return self.quantize(value)
+
+
+class ModeloSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Base de los serializers de modelos: ?fields= / ?omit= y Decimal nativo en MessagePack."""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.DecimalField: DecimalSegunRenderer,
+    }
 
 # ----------------- SERIALIZERS BÁSICOS -----------------
 
-class RegistroUsuarioSerializer(serializers.ModelSerializer):
+class RegistroUsuarioSerializer(ModeloSerializer):
     class Meta:
         model = RegistroUsuario
         fields = ['id', 'nombre', 'apellido', 'telefono', 'email', 'activo']
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(ModeloSerializer):
     class Meta:
         model = Categoria
         fields = '__all__'
 
-class PromocionSerializer(serializers.ModelSerializer):
+class PromocionSerializer(ModeloSerializer):
     class Meta:
         model = Promocion
-        fields = '__all__'
+        exclude = ['busqueda']  # columna interna de búsqueda
+
+class HorarioDisponibleSerializer(ModeloSerializer):
+    # Solo viene cuando el queryset lo anota (endpoint de disponibles)
+    cupos_libres = serializers.IntegerField(read_only=True)
 
-class HorarioDisponibleSerializer(serializers.ModelSerializer):
     class Meta:
         model = HorarioDisponible
         fields = '__all__'
 
-class ConfiguracionPagoSerializer(serializers.ModelSerializer):
+class ConfiguracionPagoSerializer(ModeloSerializer):
     class Meta:
         model = ConfiguracionPago
         fields = '__all__'
 
-class PagoSerializer(serializers.ModelSerializer):
+class PagoSerializer(ModeloSerializer):
     class Meta:
         model = Pago
         fields = '__all__'
 
-class CancelacionSerializer(serializers.ModelSerializer):
+class CancelacionSerializer(ModeloSerializer):
     class Meta:
         model = Cancelacion
         fields = '__all__'
 
 # ----------------- SERIALIZERS RELACIONADOS -----------------
 
-class ServicioSerializer(serializers.ModelSerializer):
+class ServicioSerializer(ModeloSerializer):
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
 
     class Meta:
         model = Servicio
-        fields = '__all__'
+        exclude = ['busqueda']  # columna interna de búsqueda
 
-class ComboServicioSerializer(serializers.ModelSerializer):
+class ComboServicioSerializer(ModeloSerializer):
     servicio_nombre = serializers.CharField(source='servicio.nombre', read_only=True)
 
     class Meta:
         model = ComboServicio
         fields = ['combo', 'servicio', 'servicio_nombre', 'cantidad']
 
-class ComboDetailSerializer(serializers.ModelSerializer):
+class ComboDetailSerializer(ModeloSerializer):
     # Muestra los servicios dentro del combo al consultarlo
     servicios_incluidos = ComboServicioSerializer(source='comboservicio_set', many=True, read_only=True)
     promocion_nombre = serializers.CharField(source='promocion.nombre', read_only=True)
 
     class Meta:
         model = Combo
-        fields = '__all__'
+        exclude = ['busqueda']  # columna interna de búsqueda
 
 # ----------------- SERIALIZERS CARRITO (NUEVO) -----------------
 
-class ItemCarritoSerializer(serializers.ModelSerializer):
+class ItemCarritoSerializer(ModeloSerializer):
     # Campos calculados para facilitar el trabajo al Frontend
     nombre_producto = serializers.SerializerMethodField()
     imagen_producto = serializers.SerializerMethodField()
-    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    subtotal = DecimalSegunRenderer(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = ItemCarrito
         fields = ['id', 'servicio', 'combo', 'promocion', 'cantidad', 'precio_unitario', 'subtotal', 'nombre_producto', 'imagen_producto']
 
+    # Copias guardadas en la línea (SnapshotProducto): sin JOIN al producto
     def get_nombre_producto(self, obj):
-        if obj.servicio: return obj.servicio.nombre
-        if obj.combo: return obj.combo.nombre
-        if obj.promocion: return obj.promocion.nombre
-        return "Producto Desconocido"
+        return obj.nombre_item or "Producto Desconocido"
 
     def get_imagen_producto(self, obj):
-        if obj.servicio and obj.servicio.imagen: return obj.servicio.imagen
-        if obj.combo and obj.combo.imagen: return obj.combo.imagen
-        # Las promociones podrían no tener imagen propia, se puede asignar una por defecto o None
-        return None
+        # Las promociones no tienen imagen propia
+        return obj.imagen_item or None
 
-class CarritoSerializer(serializers.ModelSerializer):
+class CarritoSerializer(ModeloSerializer):
     items = ItemCarritoSerializer(many=True, read_only=True)
     total_carrito = serializers.SerializerMethodField()
 
     class Meta:
         model = Carrito
-        fields = ['id', 'cliente', 'items', 'total_carrito']
+        fields = ['id', 'cliente', 'items', 'total_items', 'total_carrito']
 
     def get_total_carrito(self, obj):
-        # Suma todos los subtotales de los items en el carrito
-        return sum(item.subtotal for item in obj.items.all())
+        # Subtotal desnormalizado del carrito (ya no se suman los items en Python)
+        return obj.subtotal
 
 # ----------------- SERIALIZER COMPLEJO (RESERVA) -----------------
 
-class DetalleReservaSerializer(serializers.ModelSerializer):
+class DetalleReservaSerializer(ModeloSerializer):
     nombre_item = serializers.SerializerMethodField()
 
     class Meta:
@@ -118,12 +151,9 @@ class DetalleReservaSerializer(serializers.ModelSerializer):
         read_only_fields = ['reserva', 'nombre_item'] # La reserva se asigna automáticamente
 
     def get_nombre_item(self, obj):
-        if obj.combo: return obj.combo.nombre
-        if obj.servicio: return obj.servicio.nombre
-        if obj.promocion: return obj.promocion.nombre
-        return "Ítem Desconocido"
+        return obj.nombre_item or "Ítem Desconocido"
 
-class ReservaSerializer(serializers.ModelSerializer):
+class ReservaSerializer(ModeloSerializer):
     # Permite enviar detalles anidados al crear
     detalles = DetalleReservaSerializer(many=True, required=False)
     cliente_nombre = serializers.CharField(source='cliente.nombre', read_only=True)
@@ -148,26 +178,20 @@ class ReservaSerializer(serializers.ModelSerializer):
         return None
 
     def get_nombre_evento(self, obj):
-        # Intentar obtener el nombre del primer detalle, priorizando COMBOS
-        print(f"DEBUG SERIALIZER: Evaluando reserva {obj.id}")
-        queryset = obj.detalles.all()
-        print(f"DEBUG SERIALIZER: Detalles encontrados: {len(queryset)}")
-        
-        # 1. Buscar si hay algún Combo en los detalles
-        for detalle in queryset:
-            print(f"DEBUG SERIALIZER: Revisando detalle {detalle.id} - Tipo {detalle.tipo} - Combo: {detalle.combo}")
-            if detalle.combo:
-                return detalle.combo.nombre
-        
-        # 2. Si no hay combo, buscar el primer Servicio o Promoción
-        primer_detalle = queryset.first()
-        if primer_detalle:
-            if primer_detalle.servicio: return primer_detalle.servicio.nombre
-            if primer_detalle.promocion: return primer_detalle.promocion.nombre
-            
-        print("DEBUG SERIALIZER: No se encontró nombre, retornando None")
+        # Solo datos precargados (prefetch de detalles con su nombre copiado): ninguna consulta por fila
+        detalles = sorted(obj.detalles.all(), key=lambda detalle: detalle.pk)
+
+        # 1. Priorizar el primer Combo de los detalles
+        for detalle in detalles:
+            if detalle.combo_id and detalle.nombre_item:
+                return detalle.nombre_item
+
+        # 2. Si no hay combo, el primer Servicio o Promoción
+        if detalles:
+            return detalles[0].nombre_item or None
+
         return None  # Retornar null si no se encuentra nada
-        
+
     def validate_codigo_reserva(self, value):
         if not value:
             raise serializers.ValidationError("El código de reserva no puede estar vacío.")
@@ -178,11 +202,9 @@ class ReservaSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Extraemos los detalles para guardarlos aparte
         detalles_data = validated_data.pop('detalles', [])
-        print(f"DEBUG SERIALIZER CREATE: Datos de detalles recibidos: {detalles_data}")
 
         # Validación estricta: No crear reserva sin detalles
         if not detalles_data:
-            print("DEBUG SERIALIZER CREATE: Error - Lista de detalles vacía")
             raise serializers.ValidationError({"detalles": "No se puede crear una reserva sin productos/detalles."})
         
         # Usamos una transacción para asegurar integridad de datos
@@ -193,7 +215,6 @@ class ReservaSerializer(serializers.ModelSerializer):
             reserva = Reserva.objects.using(active_db).create(**validated_data)
             
             for detalle in detalles_data:
-                print(f"DEBUG SERIALIZER CREATE: Creando detalle: {detalle}")
                 DetalleReserva.objects.using(active_db).create(reserva=reserva, **detalle)
                 
         return reserva
\ No newline at end of file
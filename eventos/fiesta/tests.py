@@ -1,3 +1,1690 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import runpy
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from itertools import combinations
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from .catalogo import incrementar_version_catalogo, obtener_version_catalogo
+from .filtros import FILTROS_RESERVA, INDICES_TRIGRAMA, ORDENAMIENTOS_RESERVA, FiltrosIndexadosBackend
+from .idempotencia import idempotente
+from .paginacion import PaginacionKeyset
+from .precios import repreciar_carritos
+from .renderers import JSONRapidoRenderer, MessagePackParser, MessagePackRenderer
+from .serializers import ServicioSerializer
+from .views import ReservaViewSet
+from .models import (
+    BloqueoHorario, Carrito, Categoria, Combo, ComboServicio, DetalleReserva, HorarioDisponible, ItemCarrito, OcupacionHorario, PlantillaHorario,
+    Promocion, RegistroUsuario, Reserva, RespuestaIdempotente, Servicio, VentanaPlantilla,
+)
+
+
+# ==========================================
+# CATÁLOGO
+# ==========================================
+
+class ComboQueryCountTests(TestCase):
+    """
+    /api/combos/ debe resolverse con un número fijo de consultas,
+    sin importar cuántos combos ni cuántos servicios tenga cada uno.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.categoria = Categoria.objects.create(nombre='Inflables')
+        self.promocion = Promocion.objects.create(
+            nombre='Promo Verano',
+            fecha_inicio=timezone.now(),
+            fecha_fin=timezone.now() + timezone.timedelta(days=30),
+        )
+
+    def _crear_combos(self, cantidad):
+        for i in range(cantidad):
+            combo = Combo.objects.create(
+                nombre=f'Combo {i}', descripcion='Combo de prueba',
+                precio_combo=Decimal('100.00'), promocion=self.promocion,
+            )
+            for j in range(3):
+                servicio = Servicio.objects.create(
+                    categoria=self.categoria, nombre=f'Servicio {i}-{j}', descripcion='-',
+                    precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+                )
+                ComboServicio.objects.create(combo=combo, servicio=servicio)
+
+    def _contar_consultas(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/combos/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()
+
+    def test_consultas_constantes(self):
+        self._crear_combos(1)
+        consultas_uno, _ = self._contar_consultas()
+
+        self._crear_combos(10)
+        consultas_muchos, data = self._contar_consultas()
+
+        self.assertEqual(len(data), 11)
+        self.assertEqual(len(data[0]['servicios_incluidos']), 3)
+        self.assertEqual(data[0]['promocion_nombre'], 'Promo Verano')
+        self.assertEqual(consultas_uno, consultas_muchos)
+
+
+class BusquedaCatalogoTests(TestCase):
+    """/api/catalogo/buscar/ en PostgreSQL (GIN) o con el índice en memoria."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Servicio.objects.create(
+            nombre='Castillo Inflable', descripcion='Inflable gigante para niños',
+            precio_base=Decimal('80.00'), duracion_horas=Decimal('4.00'), capacidad_persona=15,
+        )
+        Servicio.objects.create(
+            nombre='Show de Magia', descripcion='Mago con animación de globos',
+            precio_base=Decimal('60.00'), duracion_horas=Decimal('1.00'), capacidad_persona=40,
+        )
+        Combo.objects.create(nombre='Combo Inflable', descripcion='Castillo y piñata', precio_combo=Decimal('120.00'))
+
+    def _buscar(self, texto):
+        response = self.client.get('/api/catalogo/buscar/', {'q': texto}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['resultados']
+
+    def test_ranking_por_nombre(self):
+        resultados = self._buscar('inflable')
+        self.assertEqual({(r['tipo'], r['nombre']) for r in resultados},
+                         {('servicio', 'Castillo Inflable'), ('combo', 'Combo Inflable')})
+
+    def test_tolerancia_a_errores(self):
+        resultados = self._buscar('magai')
+        self.assertEqual(resultados[0]['nombre'], 'Show de Magia')
+
+    def test_texto_muy_corto(self):
+        response = self.client.get('/api/catalogo/buscar/', {'q': 'a'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class CamposDinamicosTests(TestCase):
+    """?fields= / ?omit= recortan el payload y las columnas leídas."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Shows')
+        Servicio.objects.create(
+            categoria=categoria, nombre='Payaso', descripcion='Show de 1 hora',
+            precio_base=Decimal('50.00'), duracion_horas=Decimal('1.00'), capacidad_persona=30,
+        )
+
+    def _get(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [q['sql'] for q in ctx]
+
+    def test_fields(self):
+        data, consultas = self._get('/api/servicios/?fields=id,nombre,precio_base,imagen')
+        self.assertEqual(set(data[0]), {'id', 'nombre', 'precio_base', 'imagen'})
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('descripcion', consultas[0])
+        self.assertNotIn('JOIN', consultas[0])
+
+    def test_omit(self):
+        data, consultas = self._get('/api/servicios/?omit=descripcion')
+        self.assertNotIn('descripcion', data[0])
+        self.assertEqual(data[0]['categoria_nombre'], 'Shows')
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('JOIN', consultas[0])
+
+
+class PromocionesActivasTests(TestCase):
+    """La cache de /api/promociones/activas/ vence en el próximo inicio/fin."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.ahora = timezone.now()
+        Promocion.objects.create(nombre='Vigente', fecha_inicio=self.ahora - timedelta(days=1),
+                                 fecha_fin=self.ahora + timedelta(hours=2))
+        Promocion.objects.create(nombre='Futura', fecha_inicio=self.ahora + timedelta(hours=1),
+                                 fecha_fin=self.ahora + timedelta(days=3))
+        Promocion.objects.create(nombre='Inactiva', activo=False, fecha_inicio=self.ahora - timedelta(days=1),
+                                 fecha_fin=self.ahora + timedelta(days=1))
+
+    def _activas(self, momento):
+        with mock.patch('fiesta.catalogo.timezone.now', return_value=momento), \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/promociones/activas/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [p['nombre'] for p in response.json()], len(ctx)
+
+    def test_expira_en_el_proximo_borde(self):
+        self.assertEqual(self._activas(self.ahora), (['Vigente'], 2))
+        # Antes del borde se responde desde memoria
+        self.assertEqual(self._activas(self.ahora + timedelta(minutes=59)), (['Vigente'], 0))
+        # Empieza la promoción futura
+        self.assertEqual(self._activas(self.ahora + timedelta(hours=1)), (['Vigente', 'Futura'], 2))
+        # Termina la vigente
+        self.assertEqual(self._activas(self.ahora + timedelta(hours=3)), (['Futura'], 2))
+
+
+class CatalogoSnapshotTests(TestCase):
+    """Snapshots del catálogo: ETag por versión y host, 304 e invalidación al guardar."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.servicio = Servicio.objects.create(
+            nombre='Payaso', descripcion='Show de 1 hora',
+            precio_base=Decimal('50.00'), duracion_horas=Decimal('1.00'), capacidad_persona=30,
+        )
+
+    def _get(self, **extra):
+        response = self.client.get('/api/servicios/', secure=True, **extra)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def test_etag_y_304(self):
+        primera = self._get()
+        self.assertEqual(primera.status_code, 200)
+        etag = primera['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            segunda = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(segunda['ETag'], etag)
+        self.assertEqual(len(ctx), 0)
+
+    def test_guardar_catalogo_invalida_el_snapshot(self):
+        etag = self._get()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servicio.precio_base = Decimal('55.00')
+            self.servicio.save()
+
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['precio_base'], '55.00')
+
+    def test_host_distinto_no_comparte_snapshot(self):
+        etag = self._get(HTTP_HOST='localhost')['ETag']
+        otro = self._get(HTTP_HOST='proyectoweb-backend-1.onrender.com', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(otro.status_code, 200)
+        self.assertNotEqual(otro['ETag'], etag)
+
+    def test_cache_en_disco_sin_consultas(self):
+        # El default de producción (filecache): la lectura con cache caliente no va a la base
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CACHES={
+            **settings.CACHES,
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio},
+        }):
+            etag = self._get()['ETag']
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self._get().status_code, 200)
+                self.assertEqual(self._get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(len(ctx), 0)
+
+            version = obtener_version_catalogo()
+            self.assertEqual(incrementar_version_catalogo(), version + 1)
+            self.assertNotEqual(self._get()['ETag'], etag)
+
+    def test_incrementar_version(self):
+        version = obtener_version_catalogo()
+        self.assertEqual(incrementar_version_catalogo(), version + 1)
+        self.assertEqual(obtener_version_catalogo(), version + 1)
+
+        # Con la cache vacía la versión se reinicia con la hora, nunca hacia atrás
+        cache.clear()
+        self.assertGreater(incrementar_version_catalogo(), version)
+
+
+class PaginacionKeysetTests(TestCase):
+    """?page_size= / ?cursor= paginan por keyset; sin ellos la lista sale completa."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Categoria.objects.bulk_create(Categoria(nombre=f'Categoría {i}') for i in range(7))
+        self.ids = list(Categoria.objects.order_by('-id').values_list('id', flat=True))
+
+    def _recorrer(self, pagina, al_pasar_pagina=None):
+        ids = []
+        while True:
+            ids += [c['id'] for c in pagina['results']]
+            if not pagina['next']:
+                return ids
+            if al_pasar_pagina:
+                al_pasar_pagina()
+            pagina = self.client.get(pagina['next'], secure=True).json()
+
+    def test_sin_parametros_lista_completa(self):
+        data = self.client.get('/api/categorias/', secure=True).json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), 7)
+
+    def test_max_page_size(self):
+        with mock.patch.object(PaginacionKeyset, 'max_page_size', 3):
+            pagina = self.client.get('/api/categorias/', {'page_size': 1000}, secure=True).json()
+        self.assertEqual([c['id'] for c in pagina['results']], self.ids[:3])
+
+    def test_cursor_estable_con_inserciones(self):
+        pagina = self.client.get('/api/categorias/', {'page_size': 3}, secure=True).json()
+        # Las filas nuevas (id mayor) no corren las páginas siguientes
+        ids = self._recorrer(pagina, lambda: Categoria.objects.create(nombre='Nueva'))
+        self.assertEqual(ids, self.ids)
+
+    def test_sin_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            pagina = self.client.get('/api/categorias/', {'page_size': 3}, secure=True).json()
+        self.assertEqual(len(pagina['results']), 3)
+        self.assertNotIn('count', pagina)
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('COUNT(', ctx[0]['sql'].upper())
+
+
+class RenderersTests(TestCase):
+    """JSON con orjson idéntico al de DRF y MessagePack con los mismos valores."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Servicio.objects.create(
+            nombre='Payaso', descripcion='Show de 1 hora',
+            precio_base=Decimal('50.00'), duracion_horas=Decimal('1.50'), capacidad_persona=30,
+        )
+
+    def test_json_rapido_igual_al_estandar(self):
+        data = {
+            'precio': ServicioSerializer(Servicio.objects.get()).data['precio_base'],
+            'total': Decimal('1234.50'), 'momento': timezone.now(), 'dia': timezone.localdate(),
+        }
+        self.assertEqual(JSONRapidoRenderer().render(data), JSONRenderer().render(data))
+        # DecimalField como texto, un Decimal suelto como número (lo de siempre en DRF)
+        self.assertEqual(json.loads(JSONRapidoRenderer().render(data))['precio'], '50.00')
+        self.assertEqual(json.loads(JSONRapidoRenderer().render(data))['total'], 1234.5)
+
+    def test_json_indentado(self):
+        data = {'precio': '50.00', 'items': [1, 2]}
+        for media in ('application/json; indent=4', 'application/json; indent=2'):
+            with self.subTest(media=media):
+                self.assertEqual(JSONRapidoRenderer().render(data, media), JSONRenderer().render(data, media))
+
+    def test_msgpack_decimales_nativos(self):
+        como_json = self.client.get('/api/servicios/', secure=True)
+        como_msgpack = self.client.get('/api/servicios/', secure=True, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(como_msgpack['Content-Type'], 'application/msgpack')
+        datos = MessagePackParser().parse(BytesIO(como_msgpack.content))
+        # Los DecimalField llegan como Decimal exacto; en JSON siguen siendo texto
+        self.assertEqual((datos[0]['precio_base'], datos[0]['duracion_horas']), (Decimal('50.00'), Decimal('1.50')))
+        self.assertEqual((como_json.json()[0]['precio_base'], como_json.json()[0]['duracion_horas']), ('50.00', '1.50'))
+        self.assertEqual(
+            [{k: str(v) if isinstance(v, Decimal) else v for k, v in fila.items()} for fila in datos],
+            como_json.json(),
+        )
+        self.assertEqual(como_json.content, JSONRenderer().render(como_json.json()))
+
+    def test_msgpack_decimal_exacto(self):
+        data = {'valores': [Decimal('1234.56'), Decimal('-0.01'), Decimal('0'), Decimal('99999999.99')]}
+        cuerpo = MessagePackRenderer().render(data)
+        self.assertEqual(MessagePackParser().parse(BytesIO(cuerpo)), data)
+
+    def test_msgpack_invalido(self):
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(BytesIO(b'\xc1'))
+
+    def test_post_msgpack(self):
+        admin = User.objects.create_user('admin', 'admin@example.com', 'x', is_staff=True)
+        self.client.force_authenticate(admin)
+        cuerpo = MessagePackRenderer().render({'nombre': 'Inflables', 'descripcion': 'Juegos'})
+        response = self.client.post('/api/categorias/', cuerpo, content_type='application/msgpack', secure=True)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Categoria.objects.filter(nombre='Inflables').exists())
+
+
+class CatalogoExportImportTests(TestCase):
+    """catalog_export -> catalog_import: upsert por nombre, versión nueva y carritos repreciados."""
+
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Inflables')
+        self.servicio = Servicio.objects.create(
+            categoria=categoria, nombre='Castillo', descripcion='-',
+            precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+        )
+        self.combo = Combo.objects.create(nombre='Combo', descripcion='-', precio_combo=Decimal('99.00'))
+        ComboServicio.objects.create(combo=self.combo, servicio=self.servicio, cantidad=1)
+        self.carrito = Carrito.objects.create(
+            cliente=RegistroUsuario.objects.get(email=User.objects.create_user('ana', 'ana@example.com', 'x').email),
+        )
+        self.item = ItemCarrito.objects.create(
+            carrito=self.carrito, servicio=self.servicio, cantidad=2, precio_unitario=Decimal('10.00'),
+        )
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+
+    def _exportar(self):
+        archivo = os.path.join(self.directorio, 'catalogo.ndjson')
+        call_command('catalog_export', salida=archivo, stderr=StringIO())
+        with open(archivo, encoding='utf-8') as f:
+            return [json.loads(linea) for linea in f]
+
+    def _importar(self, filas):
+        archivo = os.path.join(self.directorio, 'importar.ndjson')
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(fila, ensure_ascii=False) + '\n' for fila in filas)
+        call_command('catalog_import', archivo, stdout=StringIO(), stderr=StringIO())
+
+    def test_ida_y_vuelta(self):
+        filas = self._exportar()
+        self.assertEqual({f['modelo'] for f in filas}, {'categoria', 'servicio', 'combo', 'combo_servicio'})
+        servicio = next(f for f in filas if f['modelo'] == 'servicio')
+        servicio['precio_base'] = '12.50'
+        nuevo = {**servicio, 'nombre': 'Tobogán', 'precio_base': '40.00'}
+        filas.insert(filas.index(servicio) + 1, nuevo)
+        pks = {modelo: set(modelo.objects.values_list('pk', flat=True)) for modelo in (Categoria, Servicio, Combo)}
+        version = obtener_version_catalogo()
+
+        with mock.patch('fiesta.management.commands.catalog_import.repreciar_carritos',
+                        wraps=repreciar_carritos) as repreciar:
+            self._importar(filas)
+
+        # Upsert: las filas existentes conservan su pk y se actualizan; la nueva se inserta
+        self.assertEqual(set(Categoria.objects.values_list('pk', flat=True)), pks[Categoria])
+        self.assertEqual(set(Combo.objects.values_list('pk', flat=True)), pks[Combo])
+        self.assertEqual(
+            dict(Servicio.objects.values_list('nombre', 'precio_base')),
+            {'Castillo': Decimal('12.50'), 'Tobogán': Decimal('40.00')},
+        )
+        self.assertEqual(Servicio.objects.get(nombre='Castillo').pk, self.servicio.pk)
+        self.assertEqual(Servicio.objects.get(nombre='Tobogán').categoria.nombre, 'Inflables')
+        self.assertEqual(ComboServicio.objects.count(), 1)
+
+        # Snapshots invalidados y carritos repreciados con el precio importado
+        self.assertGreater(obtener_version_catalogo(), version)
+        repreciar.assert_called_once_with()
+        self.item.refresh_from_db()
+        self.carrito.refresh_from_db()
+        self.assertEqual(self.item.precio_unitario, Decimal('12.50'))
+        self.assertEqual(self.carrito.subtotal, Decimal('25.00'))
+
+        # Reimportar lo mismo no duplica nada
+        self._importar(filas)
+        self.assertEqual(Servicio.objects.count(), 2)
+
+    def test_linea_invalida(self):
+        archivo = os.path.join(self.directorio, 'importar.ndjson')
+        for linea, mensaje in (('{"modelo": "categoria", "nombre": ', 'Línea 2: JSON inválido'),
+                               ('[1, 2]', 'Línea 2: se esperaba un objeto JSON')):
+            with self.subTest(linea=linea):
+                with open(archivo, 'w', encoding='utf-8') as f:
+                    f.write('{"modelo": "categoria", "nombre": "Inflables"}\n' + linea + '\n')
+                with self.assertRaisesMessage(CommandError, mensaje):
+                    call_command('catalog_import', archivo, stdout=StringIO(), stderr=StringIO())
+
+
+# ==========================================
+# DISPONIBILIDAD / RESERVAS
+# ==========================================
+
+class DisponibilidadTests(TestCase):
+    """/api/horarios/disponibles/ calcula los cupos de todo el rango en una consulta."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cliente = RegistroUsuario.objects.create(
+            nombre='Ana', apellido='Pérez', telefono='0999999999', email='ana@example.com', contrasena='x',
+        )
+        self.dia = timezone.localdate() + timedelta(days=10)
+
+    def _horario(self, dias=0, hora=10, capacidad=1, disponible=True):
+        return HorarioDisponible.objects.create(
+            fecha=self.dia + timedelta(days=dias), hora_inicio=f'{hora}:00', hora_fin=f'{hora + 2}:00',
+            capacidad_reserva=capacidad, disponible=disponible,
+        )
+
+    def _reservar(self, horario, estado):
+        # Sin los correos de aprobación / anulación que disparan las señales
+        with mock.patch('fiesta.views.enviar_correo_confirmacion'), \
+                mock.patch('fiesta.views.enviar_correo_anulacion'):
+            return Reserva.objects.create(
+                cliente=self.cliente, horario=horario, codigo_reserva=f'R-{Reserva.objects.count()}',
+                fecha_evento=horario.fecha, fecha_inicio=horario.hora_inicio, direccion_evento='-',
+                subtotal=Decimal('10.00'), total=Decimal('10.00'), estado=estado,
+            )
+
+    def _ocupados(self, horario):
+        return HorarioDisponible.objects.select_related('ocupacion').get(pk=horario.pk).reservas_activas()
+
+    def _disponibles(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/horarios/disponibles/', params, secure=True)
+        return response, len(ctx)
+
+    def test_estados_que_ocupan_cupo(self):
+        pendiente = self._horario(hora=8)
+        aprobada = self._horario(hora=11)
+        anulada = self._horario(hora=14)
+        doble = self._horario(hora=17, capacidad=2)
+        self._horario(hora=20, disponible=False)
+        self._reservar(pendiente, 'PENDIENTE')
+        self._reservar(aprobada, 'APROBADA')
+        self._reservar(anulada, 'ANULADA')
+        self._reservar(doble, 'APROBADA')
+
+        response, consultas = self._disponibles(fecha=self.dia.isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(consultas, 1)
+        self.assertEqual(
+            [(h['id'], h['cupos_libres']) for h in response.json()],
+            [(anulada.id, 1), (doble.id, 1)],
+        )
+
+    def test_rango_en_una_consulta(self):
+        for dias in range(30):
+            horario = self._horario(dias=dias)
+            if dias % 2:
+                self._reservar(horario, 'PENDIENTE')
+
+        response, consultas = self._disponibles(
+            desde=self.dia.isoformat(), hasta=(self.dia + timedelta(days=29)).isoformat(),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(consultas, 1)
+        self.assertEqual(len(response.json()), 15)
+
+    def test_calendario_mes(self):
+        cache.clear()
+        lleno = self._horario(hora=8)
+        self._reservar(lleno, 'APROBADA')
+        libre = self._horario(dias=1, hora=8)
+        mes = self.dia.strftime('%Y-%m')
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/horarios/calendario/', {'mes': mes}, secure=True).json()
+            self.client.get('/api/horarios/calendario/', {'mes': mes}, secure=True)
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(data['dias'][self.dia.isoformat()][0]['cupos_libres'], 0)
+        self.assertEqual(data['dias'][libre.fecha.isoformat()][0]['cupos_libres'], 1)
+
+        # Una reserva nueva invalida el mes
+        with self.captureOnCommitCallbacks(execute=True):
+            self._reservar(libre, 'PENDIENTE')
+        data = self.client.get('/api/horarios/calendario/', {'mes': mes}, secure=True).json()
+        self.assertEqual(data['dias'][libre.fecha.isoformat()][0]['cupos_libres'], 0)
+
+    def test_calendario_compacto(self):
+        cache.clear()
+        primero = self.dia.replace(day=1)
+        self._reservar(HorarioDisponible.objects.create(
+            fecha=primero, hora_inicio='08:00', hora_fin='10:00', capacidad_reserva=1), 'PENDIENTE')
+        HorarioDisponible.objects.create(fecha=primero, hora_inicio='12:00', hora_fin='14:00', capacidad_reserva=1)
+        HorarioDisponible.objects.create(
+            fecha=primero + timedelta(days=2), hora_inicio='08:00', hora_fin='10:00', capacidad_reserva=1)
+
+        data = self.client.get(
+            '/api/horarios/calendario/', {'mes': primero.strftime('%Y-%m'), 'formato': 'compacto'}, secure=True,
+        ).json()
+        self.assertEqual(base64.b64decode(data['dias_con_cupo'])[0], 0b101)
+        self.assertEqual(data['horarios_por_dia'][:3], [2, 0, 1])
+        self.assertEqual(base64.b64decode(data['horarios_libres']), bytes([0b110]))
+        self.assertEqual(self.client.get('/api/horarios/calendario/', {'mes': '2025-13'}, secure=True).status_code, 400)
+
+    def test_contador_de_ocupacion(self):
+        horario = self._horario(capacidad=3)
+        otro = self._horario(hora=14)
+        reserva = self._reservar(horario, 'PENDIENTE')
+        self._reservar(horario, 'ANULADA')
+        self.assertEqual(self._ocupados(horario), 1)
+
+        # Se recarga: el estado original sale de la base (from_db)
+        reserva = Reserva.objects.get(pk=reserva.pk)
+        reserva.estado = 'APROBADA'
+        reserva.fecha_confirmacion = timezone.now()
+        reserva.save()
+        self.assertEqual(self._ocupados(horario), 1)
+
+        reserva.horario = otro
+        reserva.save()
+        self.assertEqual((self._ocupados(horario), self._ocupados(otro)), (0, 1))
+
+        with mock.patch('fiesta.views.enviar_correo_anulacion'):
+            reserva.estado = 'ANULADA'
+            reserva.save()
+        self.assertEqual(self._ocupados(otro), 0)
+
+        activa = self._reservar(otro, 'PENDIENTE')
+        Reserva.objects.get(pk=activa.pk).delete()
+        self.assertEqual(self._ocupados(otro), 0)
+
+    def test_reconcile_ocupacion(self):
+        horario = self._horario(capacidad=3)
+        self._reservar(horario, 'PENDIENTE')
+        self._reservar(horario, 'APROBADA')
+        OcupacionHorario.objects.filter(horario=horario).update(ocupados=7)
+
+        salida = StringIO()
+        call_command('reconcile_ocupacion', '--dry-run', stdout=salida)
+        self.assertIn('contador 7, real 2', salida.getvalue())
+        self.assertEqual(self._ocupados(horario), 7)
+
+        call_command('reconcile_ocupacion', stdout=StringIO())
+        self.assertEqual(self._ocupados(horario), 2)
+
+    def test_bloqueo_cuenta_contra_la_capacidad(self):
+        horario = self._horario(capacidad=1)
+        usuario = User.objects.create_user('beto', 'beto@example.com', 'x')
+        otro = User.objects.create_user('caro', 'caro@example.com', 'x')
+        url = f'/api/horarios/{horario.pk}/retener/'
+
+        self.client.force_authenticate(usuario)
+        response = self.client.post(url, {'minutos': 5}, format='json', secure=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._disponibles(fecha=self.dia.isoformat())[0].json(), [])
+
+        # Otro cliente no puede retenerlo; el mismo cliente lo extiende
+        self.client.force_authenticate(otro)
+        self.assertEqual(self.client.post(url, {}, format='json', secure=True).status_code, 409)
+        self.client.force_authenticate(usuario)
+        self.assertEqual(self.client.post(url, {'minutos': 15}, format='json', secure=True).status_code, 201)
+        self.assertEqual(BloqueoHorario.objects.count(), 1)
+        self.assertEqual(self.client.post(url, {'minutos': 999}, format='json', secure=True).status_code, 400)
+
+        self.assertEqual(self.client.delete(url, secure=True).status_code, 204)
+        self.assertEqual(len(self._disponibles(fecha=self.dia.isoformat())[0].json()), 1)
+
+    def test_retener_horario_inexistente(self):
+        self.client.force_authenticate(User.objects.create_user('beto', 'beto@example.com', 'x'))
+        for pk in (999999, 'abc'):
+            with self.subTest(pk=pk):
+                url = f'/api/horarios/{pk}/retener/'
+                self.assertEqual(self.client.post(url, {}, format='json', secure=True).status_code, 404)
+                self.assertEqual(self.client.delete(url, secure=True).status_code, 404)
+        self.assertFalse(BloqueoHorario.objects.exists())
+
+    def test_expirar_bloqueos(self):
+        horario = self._horario(capacidad=1)
+        ahora = timezone.now()
+        BloqueoHorario.objects.create(horario=horario, cliente=self.cliente, expira_en=ahora - timedelta(minutes=1))
+        self.assertEqual(len(self._disponibles(fecha=self.dia.isoformat())[0].json()), 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('expirar_bloqueos', stdout=StringIO())
+        borrados = [q['sql'] for q in ctx if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(borrados), 1)
+        self.assertIn('expira_en', borrados[0])
+        self.assertFalse(BloqueoHorario.objects.exists())
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self._disponibles()[0].status_code, 400)
+        self.assertEqual(self._disponibles(fecha='2025-02-30')[0].status_code, 400)
+        self.assertEqual(self._disponibles(desde='2025-03-10', hasta='2025-03-01')[0].status_code, 400)
+        self.assertEqual(self._disponibles(desde='2025-01-01', hasta='2025-12-31')[0].status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Necesita locks de fila reales (PostgreSQL)')
+class CheckoutConcurrenteTests(TransactionTestCase):
+    """50 checkouts simultáneos sobre el mismo horario: nunca más reservas que cupos."""
+
+    CHECKOUTS = 50
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Inflables')
+        servicio = Servicio.objects.create(
+            categoria=categoria, nombre='Castillo', descripcion='-',
+            precio_base=Decimal('50.00'), duracion_horas=Decimal('2.00'), capacidad_persona=10,
+        )
+        self.dia = timezone.localdate() + timedelta(days=30)
+        self.usuarios = []
+        for i in range(self.CHECKOUTS):
+            usuario = User.objects.create_user(f'cliente{i}', f'cliente{i}@example.com', 'x')
+            carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email=usuario.email))
+            ItemCarrito.objects.create(carrito=carrito, servicio=servicio, precio_unitario=servicio.precio_base)
+            self.usuarios.append(usuario)
+
+    def _checkouts_simultaneos(self):
+        barrera = threading.Barrier(self.CHECKOUTS)
+        codigos = []
+
+        def checkout(usuario):
+            client = APIClient()
+            client.force_authenticate(usuario)
+            try:
+                barrera.wait()
+                response = client.post('/api/carrito/confirmar/', {
+                    'fecha_evento': self.dia.isoformat(), 'direccion_evento': 'Calle 1',
+                }, format='json', secure=True)
+                codigos.append(response.status_code)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=checkout, args=(u,)) for u in self.usuarios]
+        with mock.patch('fiesta.views.enviar_correo_reserva'):
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        return codigos
+
+    def _verificar(self, capacidad):
+        horario = HorarioDisponible.objects.create(
+            fecha=self.dia, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=capacidad,
+        )
+        codigos = self._checkouts_simultaneos()
+
+        self.assertEqual(len(codigos), self.CHECKOUTS)
+        self.assertEqual(set(codigos) - {201, 409}, set())
+        self.assertLessEqual(codigos.count(201), capacidad)
+        self.assertGreaterEqual(codigos.count(201), 1)
+        reservas = Reserva.objects.filter(horario=horario, estado__in=Reserva.ESTADOS_QUE_OCUPAN).count()
+        self.assertEqual(reservas, codigos.count(201))
+        self.assertEqual(OcupacionHorario.objects.get(horario=horario).ocupados, reservas)
+
+    def test_sin_doble_reserva(self):
+        self._verificar(capacidad=1)
+
+    def test_capacidad_multiple(self):
+        self._verificar(capacidad=5)
+
+    def test_reintentos_concurrentes_esperan_a_la_primera(self):
+        HorarioDisponible.objects.create(fecha=self.dia, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=5)
+        usuario = self.usuarios[0]
+        barrera = threading.Barrier(5)
+        respuestas = []
+
+        def reintento():
+            client = APIClient()
+            client.force_authenticate(usuario)
+            try:
+                barrera.wait()
+                response = client.post('/api/carrito/confirmar/', {
+                    'fecha_evento': self.dia.isoformat(), 'direccion_evento': 'Calle 1',
+                }, format='json', secure=True, HTTP_IDEMPOTENCY_KEY='mismo-pedido')
+                respuestas.append((response.status_code, response.json()))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reintento) for _ in range(5)]
+        with mock.patch('fiesta.views.enviar_correo_reserva'):
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        self.assertEqual(len(respuestas), 5)
+        self.assertEqual({codigo for codigo, _ in respuestas}, {201})
+        self.assertEqual(len({cuerpo['codigo'] for _, cuerpo in respuestas}), 1)
+        self.assertEqual(Reserva.objects.count(), 1)
+
+    def test_confirmar_dos_veces_el_mismo_carrito(self):
+        HorarioDisponible.objects.create(fecha=self.dia, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=5)
+        usuario = self.usuarios[0]
+        barrera = threading.Barrier(5)
+        codigos = []
+
+        def confirmar():
+            client = APIClient()
+            client.force_authenticate(usuario)
+            try:
+                barrera.wait()
+                codigos.append(client.post('/api/carrito/confirmar/', {
+                    'fecha_evento': self.dia.isoformat(), 'direccion_evento': 'Calle 1',
+                }, format='json', secure=True).status_code)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=confirmar) for _ in range(5)]
+        with mock.patch('fiesta.views.enviar_correo_reserva'):
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        # El lock del carrito serializa los confirmar: uno reserva, el resto lo encuentra vacío
+        self.assertEqual(sorted(codigos), [201, 400, 400, 400, 400])
+        self.assertEqual(Reserva.objects.count(), 1)
+        carrito = Carrito.objects.get(cliente__email=usuario.email)
+        self.assertEqual((carrito.total_items, carrito.subtotal), (0, Decimal('0')))
+
+
+class IndicesReservaTests(TestCase):
+    """Las consultas calientes sobre reserva deben ir por índice (EXPLAIN en Postgres)."""
+
+    def setUp(self):
+        self.cliente = RegistroUsuario.objects.create(
+            nombre='Ana', apellido='Pérez', telefono='0999999999', email='ana@example.com', contrasena='x',
+        )
+        self.horario = HorarioDisponible.objects.create(
+            fecha=timezone.localdate(), hora_inicio='10:00', hora_fin='12:00', capacidad_reserva=5,
+        )
+
+    def _reserva(self, codigo, transaccion_id=None):
+        return Reserva.objects.create(
+            cliente=self.cliente, horario=self.horario, codigo_reserva=codigo,
+            fecha_evento=self.horario.fecha, fecha_inicio=self.horario.hora_inicio, direccion_evento='-',
+            subtotal=Decimal('10.00'), total=Decimal('10.00'), transaccion_id=transaccion_id,
+        )
+
+    def test_transaccion_id_unico(self):
+        self._reserva('R-1', '')
+        self._reserva('R-2', '')
+        self._reserva('R-3', 'TX-1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._reserva('R-4', 'TX-1')
+        self.assertEqual(Reserva.objects.filter(transaccion_id__isnull=True).count(), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN con nombres de índice de Postgres')
+    def test_consultas_usan_indices(self):
+        reserva = self._reserva('R-1', 'TX-1')
+        consultas = {
+            # confirmar_carrito (tomar_dia): reservas activas del día
+            'reserva_activa_fecha_idx': Reserva.objects.filter(
+                fecha_evento=self.horario.fecha, estado__in=Reserva.ESTADOS_QUE_OCUPAN,
+            ),
+            # disponibilidad / reconcile_ocupacion
+            'reserva_horario_estado_idx': Reserva.objects.filter(
+                horario=self.horario, estado__in=Reserva.ESTADOS_QUE_OCUPAN,
+            ),
+            # aprobar (antifraude)
+            'reserva_transaccion_unica': Reserva.objects.filter(transaccion_id='TX-1').exclude(id=reserva.id),
+        }
+        with connection.cursor() as cursor:
+            # Con tablas diminutas el planner prefiere Seq Scan: se lo desaconsejamos
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for indice, queryset in consultas.items():
+                with self.subTest(indice=indice):
+                    self.assertIn(indice, queryset.explain())
+
+            # checkout_pago: reserva por id + email del cliente (PK + unique de email)
+            plan = Reserva.objects.filter(id=reserva.id, cliente__email='ana@example.com').explain()
+            self.assertIn('reserva_pkey', plan)
+            self.assertNotIn('Seq Scan', plan)
+
+
+class ListadoReservasTests(TestCase):
+    """/api/reservas/ se resuelve con datos precargados: consultas fijas y nada por stdout."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', 'admin@example.com', 'x'))
+        self.cliente = RegistroUsuario.objects.get(email='admin@example.com')
+        self.horario = HorarioDisponible.objects.create(
+            fecha=timezone.localdate() + timedelta(days=3), hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=100,
+        )
+        self.servicio = Servicio.objects.create(
+            categoria=Categoria.objects.create(nombre='Inflables'), nombre='Castillo', descripcion='-',
+            precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+        )
+        self.combo = Combo.objects.create(nombre='Combo Fiesta', descripcion='-', precio_combo=Decimal('99.00'))
+
+    def _reservas(self, cantidad):
+        inicio = Reserva.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            reserva = Reserva.objects.create(
+                cliente=self.cliente, horario=self.horario, codigo_reserva=f'RES-{i}', fecha_evento=self.horario.fecha,
+                fecha_inicio=self.horario.hora_inicio, direccion_evento='Calle 1', subtotal=Decimal('109.00'), total=Decimal('122.08'),
+            )
+            DetalleReserva.objects.create(reserva=reserva, tipo='S', servicio=self.servicio, precio_unitario=Decimal('10.00'), subtotal=Decimal('10.00'))
+            if i % 2:
+                DetalleReserva.objects.create(reserva=reserva, tipo='C', combo=self.combo, precio_unitario=Decimal('99.00'), subtotal=Decimal('99.00'))
+
+    def _listar(self):
+        with CaptureQueriesContext(connection) as ctx, mock.patch('builtins.print') as imprimir:
+            data = self.client.get('/api/reservas/', secure=True).json()
+        imprimir.assert_not_called()
+        return data, len(ctx)
+
+    def test_consultas_constantes_sin_stdout(self):
+        self._reservas(2)
+        _, consultas_pocas = self._listar()
+        self._reservas(20)
+        data, consultas_muchas = self._listar()
+
+        self.assertEqual(consultas_muchas, consultas_pocas)
+        self.assertEqual(len(data), 22)
+        nombres = {r['codigo_reserva']: r['nombre_evento'] for r in data}
+        self.assertEqual((nombres['RES-0'], nombres['RES-1']), ('Castillo', 'Combo Fiesta'))
+        self.assertEqual(data[0]['cliente_nombre'], self.cliente.nombre)
+
+    def test_nombres_sin_join_a_productos(self):
+        self._reservas(2)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/reservas/', secure=True).json()
+        tablas = {Servicio._meta.db_table, Combo._meta.db_table, Promocion._meta.db_table}
+        self.assertFalse([q['sql'] for q in ctx if any(f'"{tabla}"' in q['sql'] for tabla in tablas)])
+        detalle = DetalleReserva.objects.get(reserva__codigo_reserva='RES-1', tipo='C')
+        self.assertEqual(str(detalle), 'RES-1: Combo Fiesta x1')
+        self.assertEqual(data[0]['detalles'][-1]['nombre_item'], 'Combo Fiesta')
+
+        # La copia sobrevive al borrado del producto (la FK queda en NULL)
+        self.combo.delete()
+        nombres = {r['codigo_reserva']: r['nombre_evento'] for r in self.client.get('/api/reservas/', secure=True).json()}
+        self.assertEqual(nombres['RES-1'], 'Castillo')
+        detalle.refresh_from_db()
+        self.assertEqual((detalle.combo_id, detalle.nombre_item), (None, 'Combo Fiesta'))
+
+    def test_cambiar_el_producto_copia_el_nombre(self):
+        carrito = Carrito.objects.create(cliente=self.cliente)
+        item = ItemCarrito.objects.create(carrito=carrito, combo=self.combo, cantidad=1, precio_unitario=Decimal('99.00'))
+        self.servicio.imagen = 'https://cdn.example.com/castillo.png'
+        self.servicio.save()
+
+        response = self.client.patch(f'/api/items-carrito/{item.id}/', {'combo': None, 'servicio': self.servicio.id},
+                                     format='json', secure=True)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.json()['nombre_producto'], response.json()['imagen_producto']),
+                         ('Castillo', 'https://cdn.example.com/castillo.png'))
+        item.refresh_from_db()
+        self.assertEqual((item.servicio_id, item.nombre_item), (self.servicio.id, 'Castillo'))
+
+        # Otros cambios no vuelven a leer el producto
+        with CaptureQueriesContext(connection) as ctx:
+            item.cantidad = 2
+            item.save()
+        self.assertFalse([q for q in ctx if '"servicio"' in q['sql']])
+
+    def test_backfill_nombres_items(self):
+        self._reservas(3)
+        self.servicio.imagen = 'https://cdn.example.com/castillo.png'
+        self.servicio.save()
+        carrito = Carrito.objects.create(cliente=self.cliente)
+        ItemCarrito.objects.create(carrito=carrito, servicio=self.servicio, cantidad=1, precio_unitario=Decimal('10.00'))
+        # Filas anteriores a la migración: sin copia
+        DetalleReserva.objects.update(nombre_item='', imagen_item=None)
+        ItemCarrito.objects.update(nombre_item='', imagen_item=None)
+
+        salida = StringIO()
+        call_command('backfill_nombres_items', '--lote', '2', stdout=salida)
+        self.assertIn('DetalleReserva: 4 filas', salida.getvalue())
+        self.assertFalse(DetalleReserva.objects.filter(nombre_item='').exists())
+        item = ItemCarrito.objects.get()
+        self.assertEqual((item.nombre_item, item.imagen_item), ('Castillo', 'https://cdn.example.com/castillo.png'))
+
+        # Segunda corrida: no queda nada pendiente
+        salida = StringIO()
+        call_command('backfill_nombres_items', stdout=salida)
+        self.assertIn('DetalleReserva: 0 filas', salida.getvalue())
+
+
+class BenchmarkComandosTests(TestCase):
+    """Los benchmarks arman el queryset del listado sin request (smoke test)."""
+
+    def test_benchmark_reservas(self):
+        salida = StringIO()
+        call_command('benchmark_reservas', '--reservas', '5', '--repeticiones', '1', stdout=salida)
+        self.assertIn('/api/reservas/ (5 filas)', salida.getvalue())
+        self.assertFalse(Reserva.objects.exists())  # Todo lo sembrado se descarta
+
+    def test_benchmark_renderers(self):
+        cliente = RegistroUsuario.objects.create(
+            nombre='Ana', apellido='Pérez', telefono='0999999999', email='ana@example.com', contrasena='x',
+        )
+        horario = HorarioDisponible.objects.create(fecha=timezone.localdate(), hora_inicio='10:00', hora_fin='12:00', capacidad_reserva=5)
+        Reserva.objects.create(
+            cliente=cliente, horario=horario, codigo_reserva='R-1', fecha_evento=horario.fecha,
+            fecha_inicio=horario.hora_inicio, direccion_evento='-', subtotal=Decimal('10.00'), total=Decimal('11.20'),
+        )
+        salida = StringIO()
+        call_command('benchmark_renderers', '--limite', '5', '--repeticiones', '1', stdout=salida)
+        self.assertIn('/api/reservas/ (1 filas)', salida.getvalue())
+        self.assertNotIn('❌', salida.getvalue())
+        self.assertIn('msgpack', salida.getvalue())
+
+
+class HistorialReservasTests(TestCase):
+    """Cada cliente ve solo sus reservas; /api/reservas/mias/ pagina por cursor y resume en un aggregate."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        self.cliente = RegistroUsuario.objects.get(email='ana@example.com')
+        self.otro = RegistroUsuario.objects.get(email=User.objects.create_user('beto', 'beto@example.com', 'x').email)
+        self.horario = HorarioDisponible.objects.create(
+            fecha=timezone.localdate() + timedelta(days=3), hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=100,
+        )
+        estados = ['APROBADA', 'APROBADA', 'PENDIENTE', 'ANULADA', 'PENDIENTE']
+        for i, estado in enumerate(estados):
+            self._reserva(self.cliente, f'ANA-{i}', self.horario.fecha + timedelta(days=i), estado)
+        self._reserva(self.otro, 'BETO-0', self.horario.fecha, 'APROBADA')
+
+    def _reserva(self, cliente, codigo, fecha, estado):
+        return Reserva.objects.create(
+            cliente=cliente, horario=self.horario, codigo_reserva=codigo, fecha_evento=fecha,
+            fecha_inicio=self.horario.hora_inicio, direccion_evento='Calle 1', subtotal=Decimal('100.00'),
+            total=Decimal('112.00'), estado=estado,
+        )
+
+    def test_cliente_solo_ve_sus_reservas(self):
+        self.client.force_authenticate(self.usuario)
+        codigos = {r['codigo_reserva'] for r in self.client.get('/api/reservas/', secure=True).json()}
+        self.assertEqual(codigos, {f'ANA-{i}' for i in range(5)})
+
+        ajena = Reserva.objects.get(codigo_reserva='BETO-0')
+        self.assertEqual(self.client.get(f'/api/reservas/{ajena.pk}/', secure=True).status_code, 404)
+        self.assertEqual(self.client.post(f'/api/reservas/{ajena.pk}/anular/', secure=True).status_code, 404)
+        ajena.refresh_from_db()
+        self.assertEqual(ajena.estado, 'APROBADA')
+
+        # El staff sigue viendo todas
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.assertEqual(len(self.client.get('/api/reservas/', secure=True).json()), 6)
+
+    def test_historial_paginado_con_resumen(self):
+        self.client.force_authenticate(self.usuario)
+        with CaptureQueriesContext(connection) as ctx:
+            pagina = self.client.get('/api/reservas/mias/', {'page_size': 2}, secure=True).json()
+        # Reservas + detalles + resumen (y la autenticación del test no consulta)
+        self.assertEqual(len(ctx), 3)
+        self.assertEqual(pagina['resumen'], {
+            'total_reservas': 5, 'total_historico': '224.00',
+            'por_estado': {'pendiente': 2, 'aprobada': 2, 'anulada': 1, 'eliminada': 0},
+        })
+
+        codigos = []
+        while True:
+            codigos += [r['codigo_reserva'] for r in pagina['results']]
+            if not pagina['next']:
+                break
+            pagina = self.client.get(pagina['next'], secure=True).json()
+        self.assertEqual(codigos, [f'ANA-{i}' for i in reversed(range(5))])
+
+    def test_historial_con_muchas_reservas_el_mismo_dia(self):
+        # El cursor desempata por id dentro de una misma fecha_evento: ni repetidas ni salteadas
+        for i in range(25):
+            self._reserva(self.cliente, f'MISMO-DIA-{i}', self.horario.fecha + timedelta(days=2), 'PENDIENTE')
+        esperado = list(
+            Reserva.objects.filter(cliente=self.cliente).order_by('-fecha_evento', '-id').values_list('codigo_reserva', flat=True)
+        )
+        self.client.force_authenticate(self.usuario)
+        pagina = self.client.get('/api/reservas/mias/', {'page_size': 4}, secure=True).json()
+        codigos, paginas = [], 1
+        while True:
+            codigos += [r['codigo_reserva'] for r in pagina['results']]
+            if not pagina['next']:
+                break
+            pagina = self.client.get(pagina['next'], secure=True).json()
+            paginas += 1
+        self.assertEqual(codigos, esperado)
+        self.assertEqual(paginas, 8)
+
+        # Y hacia atrás desde la última página
+        atras = []
+        while pagina['previous']:
+            pagina = self.client.get(pagina['previous'], secure=True).json()
+            atras = [r['codigo_reserva'] for r in pagina['results']] + atras
+        self.assertEqual(atras, esperado[:len(atras)])
+        self.assertEqual(len(atras), 28)
+
+
+class FiltrosReservaTests(TestCase):
+    """Filtros del backoffice en el servidor: solo combinaciones respaldadas por índices."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', 'admin@example.com', 'x', is_staff=True))
+        self.ana = RegistroUsuario.objects.create(
+            nombre='Ana', apellido='Pérez', telefono='0999999991', email='ana@example.com', contrasena='x',
+        )
+        self.beto = RegistroUsuario.objects.create(
+            nombre='Beto', apellido='Gómez', telefono='0999999992', email='beto@example.com', contrasena='x',
+        )
+        self.hoy = timezone.localdate()
+        self.horario = HorarioDisponible.objects.create(fecha=self.hoy, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=100)
+        filas = [
+            # codigo, cliente, días, estado, método de pago
+            ('RES-1001-AAAA', self.ana, 1, 'APROBADA', 'transferencia'),
+            ('RES-1002-BBBB', self.ana, 5, 'PENDIENTE', 'tarjeta'),
+            ('RES-2001-CCCC', self.beto, 3, 'APROBADA', 'tarjeta'),
+            ('RES-2002-DDDD', self.beto, 9, 'ANULADA', 'efectivo'),
+            ('RES-2003-EEEE', self.beto, 7, 'APROBADA', 'tarjeta'),
+        ]
+        for codigo, cliente, dias, estado, metodo in filas:
+            Reserva.objects.create(
+                cliente=cliente, horario=self.horario, codigo_reserva=codigo, fecha_evento=self.hoy + timedelta(days=dias),
+                fecha_inicio='10:00', direccion_evento='-', subtotal=Decimal('10.00'), total=Decimal('11.20'),
+                estado=estado, metodo_pago=metodo,
+            )
+
+    def _codigos(self, **params):
+        response = self.client.get('/api/reservas/', params, secure=True)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [r['codigo_reserva'] for r in response.json()]
+
+    def test_filtros_y_combinaciones(self):
+        self.assertEqual(self._codigos(estado='APROBADA', ordering='id'), ['RES-1001-AAAA', 'RES-2001-CCCC', 'RES-2003-EEEE'])
+        self.assertEqual(self._codigos(estado='PENDIENTE,ANULADA', ordering='id'), ['RES-1002-BBBB', 'RES-2002-DDDD'])
+        self.assertEqual(self._codigos(metodo_pago='tarjeta', estado='APROBADA', ordering='fecha_evento'),
+                         ['RES-2001-CCCC', 'RES-2003-EEEE'])
+        desde, hasta = (self.hoy + timedelta(days=3)).isoformat(), (self.hoy + timedelta(days=7)).isoformat()
+        self.assertEqual(self._codigos(desde=desde, hasta=hasta, ordering='-fecha_evento'),
+                         ['RES-2003-EEEE', 'RES-1002-BBBB', 'RES-2001-CCCC'])
+        # ?q= por código (parcial, sin mayúsculas) y por nombre y apellido del cliente
+        self.assertEqual(self._codigos(q='2001-c'), ['RES-2001-CCCC'])
+        self.assertEqual(self._codigos(q='ana pér', ordering='id'), ['RES-1001-AAAA', 'RES-1002-BBBB'])
+        self.assertEqual(self._codigos(q='gómez', estado='APROBADA', hasta=desde), ['RES-2001-CCCC'])
+        # Sin filtros: todas, las más nuevas primero
+        self.assertEqual(len(self._codigos()), 5)
+
+    def test_parametros_invalidos(self):
+        for params in ({'estado': 'BORRADA'}, {'desde': '18/10/2026'}, {'q': 'ab'}, {'ordering': 'total'},
+                       {'metodo_pago': 'cheque'}):
+            with self.subTest(**params):
+                response = self.client.get('/api/reservas/', params, secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+    def test_busqueda_con_demasiados_clientes(self):
+        # Ana y Beto coinciden con "e": pasado el tope no se recorta la lista en silencio
+        with mock.patch('fiesta.filtros.MAX_CLIENTES_BUSQUEDA', 1):
+            response = self.client.get('/api/reservas/', {'q': 'e e e'}, secure=True)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('q', response.json())
+            self.assertEqual(self._codigos(q='gómez'), ['RES-2003-EEEE', 'RES-2002-DDDD', 'RES-2001-CCCC'])
+
+    def test_filtros_con_paginacion_por_cursor(self):
+        params = {'estado': 'APROBADA,PENDIENTE', 'ordering': 'fecha_evento', 'page_size': 2}
+        pagina = self.client.get('/api/reservas/', params, secure=True).json()
+        codigos = []
+        while True:
+            codigos += [r['codigo_reserva'] for r in pagina['results']]
+            if not pagina['next']:
+                break
+            pagina = self.client.get(pagina['next'], secure=True).json()
+        self.assertEqual(codigos, ['RES-1001-AAAA', 'RES-2001-CCCC', 'RES-1002-BBBB', 'RES-2003-EEEE'])
+
+    def test_filtros_declarados_tienen_indice(self):
+        indices = {indice.name for indice in Reserva._meta.indexes} | set(INDICES_TRIGRAMA)
+        for parametro, filtro in FILTROS_RESERVA.items():
+            with self.subTest(parametro=parametro):
+                self.assertIn(filtro.indice, indices)
+
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN con nombres de índice de Postgres')
+    def test_combinaciones_usan_indices(self):
+        valores = {
+            'estado': 'APROBADA', 'desde': self.hoy.isoformat(), 'hasta': (self.hoy + timedelta(days=30)).isoformat(),
+            'metodo_pago': 'tarjeta', 'q': 'ana',
+        }
+        # Índice que resuelve cada ?ordering= (el id solo: la clave primaria)
+        indice_orden = {'-id': 'reserva_pkey', 'id': 'reserva_pkey',
+                        '-fecha_evento': 'reserva_fecha_evento_idx', 'fecha_evento': 'reserva_fecha_evento_idx'}
+        backend, vista, fabrica = FiltrosIndexadosBackend(), ReservaViewSet(), APIRequestFactory()
+        with connection.cursor() as cursor:
+            # Con tablas diminutas el planner prefiere Seq Scan: se lo desaconsejamos
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for cantidad in range(1, len(valores) + 1):
+                for parametros in combinations(valores, cantidad):
+                    for orden in ORDENAMIENTOS_RESERVA:
+                        request = Request(fabrica.get('/api/reservas/', {
+                            **{p: valores[p] for p in parametros}, 'ordering': orden,
+                        }))
+                        with self.subTest(filtros=parametros, ordering=orden):
+                            with CaptureQueriesContext(connection) as ctx:
+                                plan = backend.filter_queryset(request, Reserva.objects.all(), vista).explain()
+                            self.assertNotIn('Seq Scan', plan)
+                            # El plan usa el índice declarado por algún filtro o el del orden
+                            esperados = {FILTROS_RESERVA[p].indice for p in parametros} | {indice_orden[orden]}
+                            self.assertTrue(any(indice in plan for indice in esperados), plan)
+                            # ?q= consulta antes los clientes por nombre (GIN de trigramas)
+                            for consulta in ctx:
+                                if consulta['sql'].startswith('EXPLAIN'):
+                                    continue
+                                cursor.execute(f"EXPLAIN {consulta['sql']}")
+                                plan_clientes = ' '.join(fila[0] for fila in cursor.fetchall())
+                                self.assertNotIn('Seq Scan', plan_clientes)
+                                self.assertTrue(any(i in plan_clientes for i in INDICES_TRIGRAMA if i.startswith('registro_usuario')))
+            plan = Reserva.objects.filter(codigo_reserva__icontains='1001').explain()
+            self.assertIn('reserva_codigo_trgm', plan)
+            plan = RegistroUsuario.objects.filter(apellido__icontains='pérez').explain()
+            self.assertIn('registro_usuario_apellido_trgm', plan)
+
+
+class PlantillaHorarioTests(TestCase):
+    """generate_horarios materializa las plantillas por lotes y es idempotente."""
+
+    def setUp(self):
+        self.desde = timezone.localdate()
+        self.plantilla = PlantillaHorario.objects.create(
+            nombre='Fines de semana', dias_semana='5,6', capacidad_reserva=2,
+            fecha_desde=self.desde, fecha_hasta=self.desde + timedelta(days=364),
+            fechas_excluidas=(self.desde + timedelta(days=(5 - self.desde.weekday()) % 7)).isoformat(),
+        )
+        VentanaPlantilla.objects.create(plantilla=self.plantilla, hora_inicio='10:00', hora_fin='14:00')
+        VentanaPlantilla.objects.create(plantilla=self.plantilla, hora_inicio='16:00', hora_fin='20:00')
+
+    def test_genera_un_anio_por_lotes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('generate_horarios', '--lote', '100', stdout=StringIO())
+        inserts = [q for q in ctx if q['sql'].startswith('INSERT')]
+
+        dias = sum(
+            1 for i in range(365)
+            if (self.desde + timedelta(days=i)).weekday() in (5, 6)
+        ) - 1  # el primer sábado está excluido
+        self.assertEqual(HorarioDisponible.objects.count(), dias * 2)
+        self.assertEqual(len(inserts), -(-dias * 2 // 100))
+        self.assertFalse(HorarioDisponible.objects.exclude(fecha__week_day__in=[7, 1]).exists())
+
+        # Segunda corrida: no duplica ni pisa capacidades editadas
+        HorarioDisponible.objects.update(capacidad_reserva=9)
+        call_command('generate_horarios', stdout=StringIO())
+        self.assertEqual(HorarioDisponible.objects.count(), dias * 2)
+        self.assertFalse(HorarioDisponible.objects.exclude(capacidad_reserva=9).exists())
+
+    def test_ventana_invertida(self):
+        for hora_fin in ('10:00', '09:00'):
+            with self.subTest(hora_fin=hora_fin):
+                ventana = VentanaPlantilla(plantilla=self.plantilla, hora_inicio='10:00', hora_fin=hora_fin)
+                with self.assertRaises(ValidationError) as error:
+                    ventana.full_clean()
+                self.assertIn('hora_fin', error.exception.message_dict)
+
+    def test_dias_semana_invalidos(self):
+        for dias_semana in ('4,x', '5,,6a', '7', '-1'):
+            with self.subTest(dias_semana=dias_semana):
+                self.plantilla.dias_semana = dias_semana
+                with self.assertRaises(ValidationError) as error:
+                    self.plantilla.full_clean()
+                self.assertIn('dias_semana', error.exception.message_dict)
+        self.plantilla.dias_semana = '0,6'
+        self.plantilla.full_clean()
+
+
+# ==========================================
+# CARRITO
+# ==========================================
+
+class CarritoLoteTests(TestCase):
+    """/api/carrito/agregar-lote/ resuelve todo el paquete en un número fijo de consultas."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        self.client.force_authenticate(self.usuario)
+        categoria = Categoria.objects.create(nombre='Inflables')
+        self.servicios = [
+            Servicio.objects.create(
+                categoria=categoria, nombre=f'Servicio {i}', descripcion='-',
+                precio_base=Decimal('10.00') * (i + 1), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+            )
+            for i in range(8)
+        ]
+        self.combo = Combo.objects.create(nombre='Combo', descripcion='-', precio_combo=Decimal('99.00'))
+
+    def _agregar(self, items):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/carrito/agregar-lote/', {'items': items}, format='json', secure=True)
+        return response, len(ctx)
+
+    def test_consultas_constantes_y_suma_cantidades(self):
+        _, consultas_uno = self._agregar([{'tipo': 'servicio', 'item_id': self.servicios[0].id, 'cantidad': 1}])
+
+        items = [{'tipo': 'servicio', 'item_id': s.id, 'cantidad': 2} for s in self.servicios]
+        items.append({'tipo': 'combo', 'item_id': self.combo.id})
+        response, consultas_lote = self._agregar(items)
+
+        self.assertEqual(response.status_code, 200)
+        # Un in_bulk más (combos) y el prefetch de combos; el resto no depende del tamaño del lote
+        self.assertLessEqual(consultas_lote, consultas_uno + 3)
+        data = response.json()
+        self.assertEqual(len(data['items']), 9)
+        cantidades = {i['servicio']: i['cantidad'] for i in data['items'] if i['servicio']}
+        self.assertEqual(cantidades[self.servicios[0].id], 3)
+        self.assertEqual(data['total_carrito'], float(Decimal('10.00') * 3 + sum(
+            Decimal('10.00') * (i + 1) * 2 for i in range(1, 8)) + Decimal('99.00')))
+
+    def test_totales_desnormalizados(self):
+        servicio, otro = self.servicios[0], self.servicios[1]
+        self._agregar([{'tipo': 'servicio', 'item_id': servicio.id, 'cantidad': 2}, {'tipo': 'combo', 'item_id': self.combo.id}])
+        self.client.post('/api/carrito/agregar/', {'tipo': 'servicio', 'item_id': otro.id, 'cantidad': 1}, format='json', secure=True)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resumen = self.client.get('/api/carrito/resumen/', secure=True).json()
+        self.assertEqual(len(ctx), 1)  # una sola fila de carrito, sin items
+        self.assertEqual(resumen, {'total_items': 4, 'subtotal': '139.00'})
+
+        # Cambios por ItemCarritoViewSet
+        item = ItemCarrito.objects.get(servicio=servicio)
+        self.client.patch(f'/api/items-carrito/{item.id}/', {'cantidad': 5}, format='json', secure=True)
+        self.client.delete(f'/api/items-carrito/{ItemCarrito.objects.get(combo=self.combo).id}/', secure=True)
+        carrito = Carrito.objects.get()
+        self.assertEqual((carrito.total_items, carrito.subtotal), (6, Decimal('70.00')))
+
+        # Drift artificial: el reconcile lo detecta y lo corrige
+        Carrito.objects.update(total_items=0, subtotal=0)
+        salida = StringIO()
+        call_command('reconcile_carritos', stdout=salida)
+        self.assertIn('real 6 items', salida.getvalue())
+        carrito.refresh_from_db()
+        self.assertEqual((carrito.total_items, carrito.subtotal), (6, Decimal('70.00')))
+
+    def test_lote_invalido_no_toca_el_carrito(self):
+        response, _ = self._agregar([
+            {'tipo': 'servicio', 'item_id': self.servicios[0].id},
+            {'tipo': 'servicio', 'item_id': 99999},
+        ])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['faltantes'], ['servicio 99999'])
+        self.assertEqual(self._agregar([{'tipo': 'nave', 'item_id': 1}])[0].status_code, 400)
+        self.assertEqual(self._agregar([{'tipo': 'combo', 'item_id': self.combo.id, 'cantidad': 0}])[0].status_code, 400)
+        self.assertFalse(ItemCarrito.objects.exists())
+
+
+class CarritoInvitadoTests(TestCase):
+    """El carrito de invitado vive en la cache y se fusiona con el persistente al iniciar sesión."""
+
+    def setUp(self):
+        caches['carritos'].clear()
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Inflables')
+        self.servicio = Servicio.objects.create(
+            categoria=categoria, nombre='Castillo', descripcion='-',
+            precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+        )
+        self.combo = Combo.objects.create(nombre='Combo', descripcion='-', precio_combo=Decimal('99.00'))
+
+    def _invitado(self, metodo='get', **kwargs):
+        return getattr(self.client, metodo)('/api/carrito/invitado/', format='json', secure=True, **kwargs)
+
+    def test_navegar_no_escribe_en_la_base(self):
+        # Con el backend de producción (filecache), no con la locmem de los tests
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        cache_en_disco = override_settings(CACHES={
+            **settings.CACHES,
+            'carritos': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio.name},
+        })
+        cache_en_disco.enable()
+        self.addCleanup(cache_en_disco.disable)
+        with CaptureQueriesContext(connection) as ctx:
+            self._invitado('post', data={'items': [{'tipo': 'servicio', 'item_id': self.servicio.id, 'cantidad': 2}]})
+            self._invitado('post', data={'items': [{'tipo': 'servicio', 'item_id': self.servicio.id}, {'tipo': 'combo', 'item_id': self.combo.id}]})
+            data = self._invitado().json()
+        self.assertEqual([q['sql'] for q in ctx if not q['sql'].startswith('SELECT')], [])
+        self.assertEqual((data['total_items'], Decimal(data['subtotal'])), (4, Decimal('129.00')))
+
+        self._invitado('delete', QUERY_STRING=f'tipo=combo&item_id={self.combo.id}')
+        self.assertEqual(self._invitado().json()['total_items'], 3)
+
+        # Una cookie alterada no da acceso a ningún carrito
+        self.client.cookies['carrito_invitado'] = 'otra-clave:firma'
+        self.assertEqual(self._invitado().json()['items'], [])
+
+    def test_fusion_al_iniciar_sesion(self):
+        usuario = User.objects.create_user('ana', 'ana@example.com', 'clave-segura')
+        carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email='ana@example.com'))
+        ItemCarrito.objects.create(carrito=carrito, servicio=self.servicio, cantidad=1, precio_unitario=Decimal('10.00'))
+
+        self._invitado('post', data={'items': [
+            {'tipo': 'servicio', 'item_id': self.servicio.id, 'cantidad': 2},
+            {'tipo': 'combo', 'item_id': self.combo.id},
+        ]})
+        cookie = self.client.cookies['carrito_invitado'].value
+        response = self.client.post('/api/login/', {'usuario': usuario.username, 'clave': 'clave-segura'}, format='json', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['carrito_invitado'].value, '')
+        carrito.refresh_from_db()
+        self.assertEqual((carrito.total_items, carrito.subtotal), (4, Decimal('129.00')))
+        self.assertEqual(carrito.items.get(servicio=self.servicio).cantidad, 3)
+
+        # La entrada de la cache se borró: la cookie vieja ya no trae items
+        self.client.cookies['carrito_invitado'] = cookie
+        self.assertEqual(self._invitado().json()['items'], [])
+
+
+    def test_fuera_de_debug_exige_cache_compartida(self):
+        ruta = str(settings.BASE_DIR / 'eventos' / 'settings.py')
+        with mock.patch.object(sys, 'argv', ['gunicorn']), \
+                mock.patch.dict(os.environ, {'DEBUG': 'False', 'CARRITO_CACHE_URL': 'locmemcache://'}):
+            with self.assertRaises(ImproperlyConfigured):
+                runpy.run_path(ruta)
+            del os.environ['CARRITO_CACHE_URL']
+            config = runpy.run_path(ruta)
+        for alias in ('default', 'carritos'):
+            self.assertEqual(config['CACHES'][alias]['BACKEND'], 'django.core.cache.backends.filebased.FileBasedCache')
+
+class ConfirmarCarritoTests(TestCase):
+    """confirmar_carrito mueve el carrito a la reserva con un número fijo de consultas."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        self.client.force_authenticate(self.usuario)
+        self.carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email='ana@example.com'))
+        self.fecha = timezone.localdate() + timedelta(days=7)
+        horario = HorarioDisponible.objects.create(fecha=self.fecha, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=3)
+        # El contador ya existe: la primera reserva del horario no paga su creación
+        OcupacionHorario.objects.create(horario=horario)
+        categoria = Categoria.objects.create(nombre='Inflables')
+        self.servicios = [
+            Servicio.objects.create(
+                categoria=categoria, nombre=f'Servicio {i}', descripcion='-',
+                precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+            )
+            for i in range(100)
+        ]
+
+    def _llenar_carrito(self, cantidad):
+        ItemCarrito.objects.bulk_create([
+            ItemCarrito(carrito=self.carrito, servicio=s, cantidad=2, precio_unitario=s.precio_base)
+            for s in self.servicios[:cantidad]
+        ])
+        Carrito.ajustar_totales(self.carrito.id, 2 * cantidad, Decimal('20.00') * cantidad)
+
+    @mock.patch('fiesta.views.enviar_correo_reserva')
+    def test_consultas_constantes(self, enviar_correo):
+        campos = [f for f in DetalleReserva._meta.concrete_fields if not f.primary_key]
+        for cantidad in (1, 10, 100):
+            with self.subTest(items=cantidad):
+                self._llenar_carrito(cantidad)
+                # Un INSERT de detalles en PostgreSQL; SQLite lo parte por su límite de parámetros
+                inserts = -(-cantidad // connection.ops.bulk_batch_size(campos, [None] * cantidad))
+                # 22: incluye el lock de los horarios del día y la regla de un evento por día
+                with self.assertNumQueries(22 + inserts):
+                    response = self.client.post('/api/carrito/confirmar/', {
+                        'fecha_evento': self.fecha.isoformat(), 'direccion_evento': 'Calle 1',
+                    }, format='json', secure=True)
+
+                self.assertEqual(response.status_code, 201)
+                reserva = Reserva.objects.get(codigo_reserva=response.json()['codigo'])
+                self.assertEqual(reserva.subtotal, Decimal('20.00') * cantidad)
+                self.assertEqual(DetalleReserva.objects.filter(reserva=reserva, tipo='S').count(), cantidad)
+                self.assertFalse(ItemCarrito.objects.exists())
+                self.carrito.refresh_from_db()
+                self.assertEqual((self.carrito.total_items, self.carrito.subtotal), (0, Decimal('0')))
+                self.assertEqual(len(enviar_correo.call_args.kwargs['detalles_previa_carga']), cantidad)
+                # Libera el día para la siguiente vuelta
+                reserva.estado = 'ANULADA'
+                reserva.save()
+
+    @mock.patch('fiesta.views.enviar_correo_reserva')
+    def test_un_evento_por_dia(self, enviar_correo):
+        # Otra ventana del mismo día con cupo: igual el día ya está tomado
+        HorarioDisponible.objects.create(fecha=self.fecha, hora_inicio='16:00', hora_fin='20:00', capacidad_reserva=3)
+        datos = {'fecha_evento': self.fecha.isoformat(), 'direccion_evento': 'Calle 1'}
+        self._llenar_carrito(1)
+        primera = self.client.post('/api/carrito/confirmar/', datos, format='json', secure=True)
+        self.assertEqual(primera.status_code, 201)
+
+        otro = User.objects.create_user('beto', 'beto@example.com', 'x')
+        carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email='beto@example.com'))
+        ItemCarrito.objects.create(carrito=carrito, servicio=self.servicios[0], precio_unitario=Decimal('10.00'))
+        self.client.force_authenticate(otro)
+        self.assertEqual(self.client.post('/api/carrito/confirmar/', datos, format='json', secure=True).status_code, 409)
+        self.assertEqual(Reserva.objects.count(), 1)
+
+        # Anulada la primera, el día se libera
+        reserva = Reserva.objects.get()
+        reserva.estado = 'ANULADA'
+        reserva.save()
+        self.assertEqual(self.client.post('/api/carrito/confirmar/', datos, format='json', secure=True).status_code, 201)
+
+    @mock.patch('fiesta.views.enviar_correo_reserva')
+    def test_totales_salen_de_los_items(self, enviar_correo):
+        self._llenar_carrito(3)
+        # Contador desfasado (p. ej. un item agregado entre lecturas): la reserva cobra lo que lleva
+        Carrito.ajustar_totales(self.carrito.id, -1, Decimal('-15.00'))
+        response = self.client.post('/api/carrito/confirmar/', {
+            'fecha_evento': self.fecha.isoformat(), 'direccion_evento': 'Calle 1',
+        }, format='json', secure=True)
+
+        self.assertEqual(response.status_code, 201)
+        reserva = Reserva.objects.get(codigo_reserva=response.json()['codigo'])
+        self.assertEqual(reserva.subtotal, Decimal('60.00'))
+
+        # El carrito queda vacío: los contadores vuelven a 0 aunque estuvieran desfasados
+        self.carrito.refresh_from_db()
+        self.assertEqual((self.carrito.total_items, self.carrito.subtotal), (0, Decimal('0.00')))
+
+        # Segundo confirmar: carrito vacío, los contadores no cambian
+        response = self.client.post('/api/carrito/confirmar/', {
+            'fecha_evento': self.fecha.isoformat(), 'direccion_evento': 'Calle 1',
+        }, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.carrito.refresh_from_db()
+        self.assertEqual((self.carrito.total_items, self.carrito.subtotal), (0, Decimal('0.00')))
+
+
+class RevisionPreciosTests(TestCase):
+    """El checkout y el job de fondo reprecian el carrito con el catálogo actual."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        self.client.force_authenticate(self.usuario)
+        self.fecha = timezone.localdate() + timedelta(days=7)
+        HorarioDisponible.objects.create(fecha=self.fecha, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=5)
+        self.servicio = Servicio.objects.create(
+            categoria=Categoria.objects.create(nombre='Inflables'), nombre='Castillo', descripcion='-',
+            precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+        )
+        self.combo = Combo.objects.create(nombre='Combo', descripcion='-', precio_combo=Decimal('99.00'))
+        ahora = timezone.now()
+        self.promocion = Promocion.objects.create(
+            nombre='Promo', precio=Decimal('30.00'),
+            fecha_inicio=ahora - timedelta(days=2), fecha_fin=ahora + timedelta(days=2),
+        )
+        self.carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email='ana@example.com'))
+        for campo, producto, precio in [('servicio', self.servicio, '10.00'), ('combo', self.combo, '99.00'),
+                                        ('promocion', self.promocion, '30.00')]:
+            ItemCarrito.objects.create(carrito=self.carrito, cantidad=2, precio_unitario=Decimal(precio), **{campo: producto})
+
+    def _confirmar(self):
+        with mock.patch('fiesta.views.enviar_correo_reserva'):
+            return self.client.post('/api/carrito/confirmar/', {
+                'fecha_evento': self.fecha.isoformat(), 'direccion_evento': 'Calle 1',
+            }, format='json', secure=True)
+
+    def test_checkout_devuelve_las_diferencias(self):
+        # .update(): sin señales, el carrito queda con los precios viejos
+        Servicio.objects.filter(pk=self.servicio.pk).update(precio_base=Decimal('12.50'))
+        Promocion.objects.filter(pk=self.promocion.pk).update(fecha_fin=timezone.now() - timedelta(minutes=1))
+
+        response = self._confirmar()
+        self.assertEqual(response.status_code, 409)
+        cambios = {c['tipo']: c for c in response.json()['cambios']}
+        self.assertEqual(set(cambios), {'servicio', 'promocion'})
+        self.assertEqual((cambios['servicio']['precio_anterior'], cambios['servicio']['precio_actual']), ('10.00', '12.50'))
+        self.assertEqual(cambios['promocion']['motivo'], 'promocion_vencida')
+        self.assertFalse(Reserva.objects.exists())
+
+        self.carrito.refresh_from_db()
+        self.assertEqual((self.carrito.total_items, self.carrito.subtotal), (4, Decimal('223.00')))
+        self.assertFalse(self.carrito.items.filter(promocion__isnull=False).exists())
+
+        # Con el carrito ya corregido, la segunda confirmación pasa con el total nuevo
+        response = self._confirmar()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Reserva.objects.get().subtotal, Decimal('223.00'))
+
+    def test_job_reprecia_en_bloque(self):
+        otro = User.objects.create_user('beto', 'beto@example.com', 'x')
+        carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email=otro.email))
+        ItemCarrito.objects.create(carrito=carrito, servicio=self.servicio, cantidad=1, precio_unitario=Decimal('10.00'))
+        Servicio.objects.filter(pk=self.servicio.pk).update(precio_base=Decimal('15.00'))
+
+        # SELECT por lote + SELECT FOR UPDATE de los que cambiaron + bulk_update + UPDATE de totales
+        # (más SAVEPOINT/RELEASE), sin importar cuántos carritos
+        with self.assertNumQueries(6):
+            self.assertEqual(repreciar_carritos({'servicio': [self.servicio.pk]}), 2)
+
+        self.carrito.refresh_from_db()
+        carrito.refresh_from_db()
+        self.assertEqual(self.carrito.subtotal, Decimal('288.00'))
+        self.assertEqual(carrito.subtotal, Decimal('15.00'))
+        salida = StringIO()
+        call_command('reprice_carritos', stdout=salida)
+        self.assertIn('0 líneas', salida.getvalue())
+        call_command('reconcile_carritos', '--dry-run', stdout=salida)
+        self.assertIn('sin desvíos', salida.getvalue())
+
+    def test_lectura_vieja_no_desfasa_los_totales(self):
+        from .precios import repreciar_items
+        Servicio.objects.filter(pk=self.servicio.pk).update(precio_base=Decimal('15.00'))
+        Promocion.objects.filter(pk=self.promocion.pk).update(fecha_fin=timezone.now() - timedelta(minutes=1))
+        # Lectura del job (items con sus productos), sin lock
+        leidos = list(self.carrito.items.select_related('servicio', 'combo', 'promocion'))
+        # Mientras tanto el cliente cambia la cantidad del servicio y quita la promoción
+        servicio = self.carrito.items.get(servicio=self.servicio)
+        servicio.cantidad = 5
+        servicio.save()
+        self.carrito.items.get(promocion=self.promocion).delete()
+
+        vigentes, cambios = repreciar_items(leidos)
+
+        self.assertEqual([c['motivo'] for c in cambios], ['precio'])
+        self.assertEqual(cambios[0]['cantidad'], 5)
+        self.assertEqual({item.pk for item in vigentes}, set(self.carrito.items.values_list('pk', flat=True)))
+        self.carrito.refresh_from_db()
+        # 5 x 15.00 + 2 x 99.00, y la promoción descontada una sola vez
+        self.assertEqual((self.carrito.total_items, self.carrito.subtotal), (7, Decimal('273.00')))
+        salida = StringIO()
+        call_command('reconcile_carritos', '--dry-run', stdout=salida)
+        self.assertIn('sin desvíos', salida.getvalue())
+
+    def test_editar_precio_lanza_el_job(self):
+        with mock.patch('fiesta.precios.repreciar_en_segundo_plano') as repreciar:
+            self.servicio.precio_base = Decimal('11.00')
+            self.servicio.save()
+        repreciar.assert_called_once_with({'servicio': [self.servicio.pk]}, using='default')
+
+    def test_editar_sin_cambiar_precio_no_lanza_el_job(self):
+        servicio = self.servicio
+        with mock.patch('fiesta.precios.repreciar_en_segundo_plano') as repreciar:
+            servicio.nombre = 'Castillo grande'
+            servicio.save()
+            # El mismo precio escrito de nuevo tampoco cuenta como cambio
+            servicio.precio_base = Decimal(str(servicio.precio_base))
+            servicio.save()
+        repreciar.assert_not_called()
+
+        with mock.patch('fiesta.precios.repreciar_en_segundo_plano') as repreciar:
+            servicio.precio_base += 1
+            servicio.save()
+            servicio.save()
+        repreciar.assert_called_once_with({'servicio': [servicio.pk]}, using='default')
+
+
+# ==========================================
+# IDEMPOTENCIA
+# ==========================================
+
+@mock.patch('fiesta.views.enviar_correo_reserva')
+class IdempotenciaTests(TestCase):
+    """Un reintento con la misma Idempotency-Key repite la respuesta sin volver a ejecutar."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.usuario = User.objects.create_user('ana', 'ana@example.com', 'x')
+        self.client.force_authenticate(self.usuario)
+        self.fecha = timezone.localdate() + timedelta(days=7)
+        HorarioDisponible.objects.create(fecha=self.fecha, hora_inicio='10:00', hora_fin='14:00', capacidad_reserva=5)
+        servicio = Servicio.objects.create(
+            categoria=Categoria.objects.create(nombre='Inflables'), nombre='Castillo', descripcion='-',
+            precio_base=Decimal('10.00'), duracion_horas=Decimal('1.00'), capacidad_persona=10,
+        )
+        carrito = Carrito.objects.create(cliente=RegistroUsuario.objects.get(email='ana@example.com'))
+        ItemCarrito.objects.create(carrito=carrito, servicio=servicio, precio_unitario=servicio.precio_base)
+
+    def _confirmar(self, clave, direccion='Calle 1'):
+        return self.client.post('/api/carrito/confirmar/', {
+            'fecha_evento': self.fecha.isoformat(), 'direccion_evento': direccion,
+        }, format='json', secure=True, HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_repite_la_respuesta(self, enviar_correo):
+        primera = self._confirmar('clave-1')
+        reintento = self._confirmar('clave-1')
+
+        self.assertEqual(primera.status_code, 201)
+        # Re-ejecutar daría 400 (el carrito ya está vacío)
+        self.assertEqual((reintento.status_code, reintento.json()), (201, primera.json()))
+        self.assertEqual(reintento['Idempotent-Replayed'], 'true')
+        self.assertEqual(Reserva.objects.count(), 1)
+        self.assertEqual(enviar_correo.call_count, 1)
+
+        # Misma clave con otro cuerpo: error del cliente; otra clave: se ejecuta
+        self.assertEqual(self._confirmar('clave-1', direccion='Otra').status_code, 422)
+        self.assertEqual(self._confirmar('clave-2').status_code, 400)
+
+    def test_conflicto_no_se_guarda(self, enviar_correo):
+        # 409 por precios que cambiaron: el reintento con la misma clave vuelve a ejecutar
+        Servicio.objects.update(precio_base=Decimal('12.00'))
+        primera = self._confirmar('clave-1')
+        reintento = self._confirmar('clave-1')
+
+        self.assertEqual(primera.status_code, 409)
+        self.assertEqual(reintento.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', reintento)
+        self.assertEqual(Reserva.objects.get().total, Decimal('13.44'))
+        # Ahora sí queda guardada
+        self.assertEqual(self._confirmar('clave-1')['Idempotent-Replayed'], 'true')
+
+    def test_repite_las_cabeceras(self, enviar_correo):
+        ejecuciones = []
+
+        @api_view(['POST'])
+        @idempotente
+        def crear(request):
+            ejecuciones.append(request)
+            return Response({'id': 7}, status=201, headers={'Location': '/api/reservas/7/'})
+
+        fabrica = APIRequestFactory()
+        for _ in range(2):
+            request = fabrica.post('/api/crear/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='clave-1')
+            force_authenticate(request, self.usuario)
+            response = crear(request)
+        self.assertEqual(len(ejecuciones), 1)
+        self.assertEqual((response.status_code, response['Location']), (201, '/api/reservas/7/'))
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_clave_vencida_se_reutiliza(self, enviar_correo):
+        self._confirmar('clave-1')
+        RespuestaIdempotente.objects.update(expira_en=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self._confirmar('clave-1').status_code, 400)
+
+        RespuestaIdempotente.objects.update(expira_en=timezone.now() - timedelta(minutes=1))
+        call_command('expirar_idempotencia', stdout=StringIO())
+        self.assertFalse(RespuestaIdempotente.objects.exists())
+
+    @mock.patch('fiesta.views.enviar_notificacion_comprobante')
+    def test_checkout_pago_no_reenvia_el_comprobante(self, notificar, enviar_correo):
+        reserva = Reserva.objects.get(codigo_reserva=self._confirmar('clave-1').json()['codigo'])
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            for _ in range(2):
+                response = self.client.post(f'/api/checkout-pago/{reserva.id}/', {
+                    'metodo_pago': 'transferencia',
+                    'comprobante_pago': SimpleUploadedFile('pago.png', b'comprobante', content_type='image/png'),
+                }, format='multipart', secure=True, HTTP_IDEMPOTENCY_KEY='pago-1')
+                self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        notificar.assert_called_once_with(reserva.id)
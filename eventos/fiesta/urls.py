@@ -8,8 +8,8 @@ from .views import (
     HorarioDisponibleViewSet, ReservaViewSet, DetalleReservaViewSet, 
     PagoViewSet, CancelacionViewSet,
     # Nuevas importaciones del carrito (ACTUALIZADO)
-    CarritoViewSet, agregar_al_carrito, confirmar_carrito, ItemCarritoViewSet,
-    checkout_pago, ConfiguracionPagoViewSet,
+    CarritoViewSet, agregar_al_carrito, agregar_lote_al_carrito, resumen_carrito, carrito_invitado, confirmar_carrito, ItemCarritoViewSet,
+    checkout_pago, ConfiguracionPagoViewSet, buscar_en_catalogo,
     PasswordResetRequestView, PasswordResetConfirmView
 )
 
@@ -50,6 +50,15 @@ urlpatterns = [
     
     # 1. Agregar (POST): Recibe { tipo, item_id, cantidad }
     path('carrito/agregar/', agregar_al_carrito, name='agregar_al_carrito'),
+
+    # 1.b Agregar varios (POST): Recibe { items: [{ tipo, item_id, cantidad }, ...] }
+    path('carrito/agregar-lote/', agregar_lote_al_carrito, name='agregar_lote_al_carrito'),
+
+    # 1.c Resumen (GET): { total_items, subtotal } para el badge
+    path('carrito/resumen/', resumen_carrito, name='resumen_carrito'),
+
+    # 1.d Carrito de invitado (GET/POST/DELETE): sin login, se fusiona al iniciar sesión
+    path('carrito/invitado/', carrito_invitado, name='carrito_invitado'),
     
     # 2. Confirmar (POST): Convierte carrito en reserva
     path('carrito/confirmar/', confirmar_carrito, name='confirmar_carrito'),
@@ -57,7 +66,10 @@ urlpatterns = [
     # 3. Pago (POST): Seleccionar método y subir comprobante
     path('checkout-pago/<int:reserva_id>/', checkout_pago, name='checkout_pago'),
 
-    # 4. Recuperación de Contraseña
+    # 4. Búsqueda en el catálogo (GET): ?q=
+    path('catalogo/buscar/', buscar_en_catalogo, name='buscar_catalogo'),
+
+    # 5. Recuperación de Contraseña
     path('password-reset/request/', PasswordResetRequestView.as_view(), name='password_reset_request'),
     path('password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
 
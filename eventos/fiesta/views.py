@@ -5,16 +5,18 @@ import re  # Para normalizar HTML en emails
 import smtplib
 import traceback
 import uuid
+from decimal import Decimal
 import threading # Para correos asíncronos
 
 def run_in_background(target, *args, **kwargs):
     """
     Ejecuta una función en un hilo separado para no bloquear la respuesta.
-    Ideal para envío de correos.
+    Ideal para envío de correos. Dentro de una transacción el hilo arranca
+    después del commit: si no, podría leer una reserva que todavía no existe.
     """
     t = threading.Thread(target=target, args=args, kwargs=kwargs)
     t.daemon = True
-    t.start()
+    transaction.on_commit(t.start)
 
 # 2. Third-Party Library Imports (Django REST Framework)
 from rest_framework.views import APIView
@@ -23,6 +25,7 @@ from rest_framework import status, viewsets
 from rest_framework.permissions import BasePermission, SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.decorators import action, api_view, authentication_classes, permission_classes, parser_classes
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.settings import api_settings
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 from rest_framework.authtoken.models import Token
@@ -33,8 +36,9 @@ from django.contrib.auth.models import User
 from django.shortcuts import redirect, get_object_or_404, render # get_object_or_404 importado una vez
 from django.db import transaction # IMPORTANTE PARA CONFIRMAR RESERVA
 from django.http import HttpResponse
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q, Sum
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives # EmailMultiAlternatives añadido
 from django.template.loader import render_to_string
 from django.conf import settings
@@ -47,15 +51,27 @@ from django.db import IntegrityError
 from .models import (
     RegistroUsuario, EmailVerificationToken,
     Promocion, Categoria, Servicio, Combo, ComboServicio,
-    HorarioDisponible, Reserva, DetalleReserva, Pago, Cancelacion,
+    HorarioDisponible, BloqueoHorario, Reserva, DetalleReserva, Pago, Cancelacion,
     Carrito, ItemCarrito, ConfiguracionPago, PasswordResetToken
 )
 
+from . import carrito_invitado as carrito_invitado_store
+from .catalogo import CatalogoSnapshotMixin, obtener_promociones_activas
+from .filtros import FILTROS_RESERVA, ORDENAMIENTOS_RESERVA, FiltrosIndexadosBackend
+from .idempotencia import idempotente
+from .paginacion import PaginacionHistorialReservas
+from .precios import PRODUCTOS_CARRITO, precio_de_producto, repreciar_items
+from .busqueda import buscar_catalogo
+from .disponibilidad import (
+    HorarioBloqueado, HorarioSinCupo, calendario_compacto, calendario_mes, horarios_con_cupo, invalidar_calendario,
+    leer_mes, leer_rango_fechas, primer_horario_con_cupo, retener_horario, tomar_cupo, tomar_dia,
+)
+
 from .serializers import (
     RegistroUsuarioSerializer, PromocionSerializer, CategoriaSerializer, ServicioSerializer,
     ComboDetailSerializer, ComboServicioSerializer, HorarioDisponibleSerializer, ReservaSerializer,
     DetalleReservaSerializer, PagoSerializer, CancelacionSerializer,
-    CarritoSerializer, ItemCarritoSerializer, ConfiguracionPagoSerializer
+    CarritoSerializer, ItemCarritoSerializer, ConfiguracionPagoSerializer, importe,
 )
 
 
@@ -170,17 +186,9 @@ def enviar_correo_reserva(reserva_id, detalles_previa_carga=None):
             else:
                 detalles_procesados = []
                 # Fallback forzada si no hay datos en memoria
-                for d in reserva.detalles.select_related('servicio', 'combo', 'promocion').all():
-                    nombre_item = "Item no especificado"
-                    if d.combo:
-                        nombre_item = d.combo.nombre
-                    elif d.servicio:
-                        nombre_item = d.servicio.nombre
-                    elif d.promocion:
-                        nombre_item = d.promocion.nombre
-
+                for d in reserva.detalles.all():
                     detalles_procesados.append({
-                        'nombre': (nombre_item or "").strip(),
+                        'nombre': (d.nombre_item or "Item no especificado").strip(),
                         'cantidad': d.cantidad,
                         'subtotal': d.subtotal
                     })
@@ -290,17 +298,10 @@ def enviar_correo_confirmacion(reserva_id):
             queryset_detalles = reserva.detalles.select_related('servicio', 'combo', 'promocion').all()
             
             for d in queryset_detalles:
-                nombre = "Item no especificado"
-                descripcion = ""
-                if d.combo:
-                    nombre = d.combo.nombre
-                    descripcion = d.combo.descripcion
-                elif d.servicio:
-                    nombre = d.servicio.nombre
-                    descripcion = d.servicio.descripcion
-                elif d.promocion:
-                    nombre = d.promocion.nombre
-                    descripcion = d.promocion.descripcion
+                # El nombre sale de la copia del detalle; la descripción sigue viniendo del producto
+                nombre = d.nombre_item or "Item no especificado"
+                producto = d.combo or d.servicio or d.promocion
+                descripcion = producto.descripcion if producto else ""
 
                 detalles_items.append({
                     'nombre': " ".join(str(nombre or "").split()),
@@ -431,7 +432,7 @@ class LoginView(APIView):
         cliente = RegistroUsuario.objects.filter(email=user_obj.email).first()
         cliente_id = cliente.id if cliente else None
 
-        return Response({
+        response = Response({
             'id': user_obj.id,
             'cliente_id': cliente_id,
             'username': user_obj.username,
@@ -439,6 +440,10 @@ class LoginView(APIView):
             'token': token.key
         }, status=status.HTTP_200_OK)
 
+        # 5. Si armó un carrito como invitado, pasa a su carrito persistente
+        fusionar_carrito_invitado(request, response, cliente)
+        return response
+
 
 class RegistroUsuarioView(APIView):
     authentication_classes = []
@@ -743,30 +748,71 @@ class SoloUsuariosAutenticados(BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(CatalogoSnapshotMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [SoloLecturaOAdmin]
 
-class PromocionViewSet(viewsets.ModelViewSet):
+class PromocionViewSet(CatalogoSnapshotMixin, viewsets.ModelViewSet):
     queryset = Promocion.objects.all()
     serializer_class = PromocionSerializer
     permission_classes = [SoloLecturaOAdmin]
 
-class ServicioViewSet(viewsets.ModelViewSet):
-    queryset = Servicio.objects.all()
+    @action(detail=False, methods=['get'])
+    def activas(self, request):
+        # Promociones vigentes ahora mismo (cache en memoria hasta el próximo inicio/fin)
+        return Response(obtener_promociones_activas())
+
+class ServicioViewSet(CatalogoSnapshotMixin, viewsets.ModelViewSet):
+    # JOIN para categoria_nombre (se quita si el cliente omite el campo)
+    queryset = Servicio.objects.select_related('categoria')
     serializer_class = ServicioSerializer
     permission_classes = [SoloLecturaOAdmin]
 
-class ComboViewSet(viewsets.ModelViewSet):
+class ComboViewSet(CatalogoSnapshotMixin, viewsets.ModelViewSet):
     queryset = Combo.objects.all()
     serializer_class = ComboDetailSerializer
     permission_classes = [SoloLecturaOAdmin]
 
+    def get_queryset(self):
+        # Composición completa en un número fijo de consultas:
+        # combos + promoción (JOIN), servicios incluidos (prefetch con JOIN)
+        # y los ids del M2M `servicios` que expone fields='__all__'
+        return Combo.objects.select_related('promocion').prefetch_related(
+            Prefetch('comboservicio_set', queryset=ComboServicio.objects.select_related('servicio')),
+            Prefetch('servicios', queryset=Servicio.objects.only('id')),
+        ).order_by('id')
+
 class ComboServicioViewSet(viewsets.ModelViewSet):
-    queryset = ComboServicio.objects.all()
+    queryset = ComboServicio.objects.select_related('servicio')
     serializer_class = ComboServicioSerializer
 
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def buscar_en_catalogo(request):
+    """
+    Búsqueda en servicios, combos y promociones: /api/catalogo/buscar/?q=
+    Resultados ordenados por relevancia y paginados con ?page_size= y ?offset=
+    """
+    texto = request.query_params.get('q', '').strip()
+    if len(texto) < 2:
+        return Response({'error': 'El parámetro "q" debe tener al menos 2 caracteres'}, status=400)
+
+    try:
+        limite = int(request.query_params.get('page_size', settings.PAGINACION_PAGE_SIZE))
+        offset = int(request.query_params.get('offset', 0))
+    except ValueError:
+        return Response({'error': 'page_size y offset deben ser números'}, status=400)
+    limite = max(1, min(limite, settings.PAGINACION_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+
+    resultados = buscar_catalogo(texto, limite, offset)
+    return Response({
+        'resultados': resultados,
+        'siguiente_offset': offset + limite if len(resultados) == limite else None,
+    })
+
 # ==========================================
 # 3. GESTIÓN DE RESERVAS
 # ==========================================
@@ -777,29 +823,127 @@ class HorarioDisponibleViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def disponibles(self, request):
-        fecha = request.query_params.get('fecha')
-        if not fecha: return Response({'error': 'Falta fecha'}, status=400)
-        
-        horarios = HorarioDisponible.objects.filter(fecha=fecha, disponible=True)
-        libres = []
-        for h in horarios:
-            confirmadas = Reserva.objects.filter(horario=h, estado__in=['CONFIRMADA', 'PENDIENTE']).count()
-            if confirmadas < h.capacidad_reserva:
-                libres.append(h)
-        return Response(HorarioDisponibleSerializer(libres, many=True).data)
+        # ?fecha=AAAA-MM-DD o ?desde=&hasta= (una sola consulta para todo el rango)
+        desde, hasta, error = leer_rango_fechas(request.query_params)
+        if error: return Response({'error': error}, status=400)
+
+        libres = horarios_con_cupo(desde, hasta)
+        return Response(HorarioDisponibleSerializer(libres, many=True, context={'request': request}).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def calendario(self, request):
+        # ?mes=AAAA-MM (&formato=compacto): todo el mes en una respuesta
+        mes = leer_mes(request.query_params.get('mes'))
+        if not mes: return Response({'error': 'Falta mes o es inválido (use AAAA-MM)'}, status=400)
+
+        dias = calendario_mes(*mes)
+        respuesta = {'mes': f'{mes[0]:04d}-{mes[1]:02d}'}
+        if request.query_params.get('formato') == 'compacto':
+            respuesta.update(calendario_compacto(*mes, dias))
+        else:
+            respuesta['dias'] = dias
+        return Response(respuesta)
+
+    @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
+    def retener(self, request, pk=None):
+        """
+        POST: retiene un cupo del horario mientras el cliente completa el checkout
+        ({"minutos": N}, opcional). DELETE: lo libera antes de que venza.
+        """
+        cliente = RegistroUsuario.objects.filter(email=request.user.email).first()
+        if not cliente:
+            return Response({'error': 'No se encontró tu perfil de cliente'}, status=status.HTTP_404_NOT_FOUND)
+        # 404 si el horario no existe (el 409 queda para "sin cupo" / "bloqueado")
+        horario = self.get_object()
+
+        if request.method == 'DELETE':
+            borrados, _ = BloqueoHorario.objects.filter(horario=horario, cliente=cliente).delete()
+            if borrados:
+                transaction.on_commit(lambda: invalidar_calendario(horario.fecha))
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            minutos = int(request.data.get('minutos') or settings.BLOQUEO_HORARIO_MINUTOS)
+        except (TypeError, ValueError):
+            return Response({'error': 'minutos debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= minutos <= settings.BLOQUEO_HORARIO_MAX_MINUTOS:
+            return Response(
+                {'error': f'minutos debe estar entre 1 y {settings.BLOQUEO_HORARIO_MAX_MINUTOS}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            with transaction.atomic():
+                bloqueo = retener_horario(horario.pk, cliente, minutos)
+                transaction.on_commit(lambda: invalidar_calendario(horario.fecha))
+        except HorarioBloqueado:
+            return Response({'error': 'Otra persona está reservando este horario en este momento. Intenta de nuevo.'}, status=status.HTTP_409_CONFLICT)
+        except HorarioSinCupo:
+            return Response({'error': 'Este horario ya no tiene cupo.'}, status=status.HTTP_409_CONFLICT)
+
+        return Response({'horario': bloqueo.horario_id, 'expira_en': bloqueo.expira_en}, status=status.HTTP_201_CREATED)
 
 class ReservaViewSet(viewsets.ModelViewSet):
     queryset = Reserva.objects.all()
     serializer_class = ReservaSerializer
     permission_classes = [SoloUsuariosAutenticados]
+    # Filtros del backoffice en el servidor, solo los que resuelve un índice:
+    # ?estado= ?desde= ?hasta= ?metodo_pago= ?q= ?ordering= (combinables con ?cursor=)
+    filter_backends = [FiltrosIndexadosBackend, *api_settings.DEFAULT_FILTER_BACKENDS]
+    filtros_indexados = FILTROS_RESERVA
+    ordenamientos_indexados = ORDENAMIENTOS_RESERVA
+    orden_por_defecto = ('-id',)
+
+    @staticmethod
+    def reservas_para_listado():
+        """
+        cliente_nombre sale del JOIN y nombre_evento / nombre_item de la copia guardada
+        en cada detalle: 2 consultas para cualquier cantidad de filas, sin JOIN a productos.
+        También lo usan benchmark_reservas y benchmark_renderers (sin request).
+        """
+        return Reserva.objects.select_related('cliente').prefetch_related('detalles')
 
     def get_queryset(self):
-        # Optimizar carga de detalles y nombres de productos
-        return Reserva.objects.all().prefetch_related(
-            'detalles__combo',
-            'detalles__servicio',
-            'detalles__promocion'
-        ).order_by('-id')
+        reservas = self.reservas_para_listado()
+        # El staff ve todas; un cliente solo las suyas (listado, detalle y acciones)
+        if self.request.user.is_staff:
+            return reservas
+        return reservas.filter(cliente__email=self.request.user.email)
+
+    @staticmethod
+    def resumen_cliente(reservas):
+        """Cantidad por estado y total histórico (reservas aprobadas) en un solo aggregate."""
+        conteos = {
+            estado.lower(): Count('id', filter=Q(estado=estado))
+            for estado, _ in Reserva.ESTADO_RESERVA_CHOICES
+        }
+        resumen = reservas.order_by().aggregate(
+            total_reservas=Count('id'),
+            total_historico=Sum('total', filter=Q(estado='APROBADA'), default=Decimal('0')),
+            **conteos,
+        )
+        return {
+            'total_reservas': resumen.pop('total_reservas'),
+            'total_historico': importe(resumen.pop('total_historico')),
+            'por_estado': resumen,
+        }
+
+    @action(detail=False, methods=['get'])
+    def mias(self, request):
+        """
+        Historial del usuario autenticado (también para el staff), del evento más
+        reciente al más antiguo, paginado por cursor (?cursor= / ?page_size=).
+        """
+        reservas = Reserva.objects.filter(cliente__email=request.user.email)
+        self.orden_por_defecto = PaginacionHistorialReservas.ordering
+        paginador = PaginacionHistorialReservas()
+        pagina = paginador.paginate_queryset(
+            self.filter_queryset(self.reservas_para_listado().filter(cliente__email=request.user.email)),
+            request, view=self,
+        )
+        respuesta = paginador.get_paginated_response(self.get_serializer(pagina, many=True).data)
+        respuesta.data['resumen'] = self.resumen_cliente(reservas)
+        return respuesta
 
     @action(detail=True, methods=['post'])
     def aprobar(self, request, pk=None):
@@ -817,7 +961,11 @@ class ReservaViewSet(viewsets.ModelViewSet):
         reserva.transaccion_id = transaccion_id
         reserva.estado = 'APROBADA'
         reserva.fecha_confirmacion = timezone.now()
-        reserva.save()
+        try:
+            reserva.save()
+        except IntegrityError:
+            # Carrera con otra aprobación: lo frena el índice único reserva_transaccion_unica
+            return Response({'error': 'ANTIFRAUDE: Este ID de transacción ya fue utilizado en otra reserva.'}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'mensaje': 'Reserva aprobada exitosamente', 'estado': reserva.estado})
 
@@ -835,6 +983,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         reserva.save()
         return Response({'mensaje': 'Reserva marcada como eliminada', 'estado': reserva.estado})
 
+    @method_decorator(idempotente)
     def create(self, request, *args, **kwargs):
         """
         Crear reserva requiriendo un horario disponible definido por el admin.
@@ -865,16 +1014,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 horario = HorarioDisponible.objects.get(id=horario_id, disponible=True)
             except HorarioDisponible.DoesNotExist:
                 return Response({'error': 'El horario seleccionado no está disponible'}, status=status.HTTP_400_BAD_REQUEST)
-
-                # Blindaje: Un solo evento por día/horario
-                overlap = Reserva.objects.filter(
-                    fecha_evento=horario.fecha,
-                    horario=horario,
-                    estado__in=['APROBADA', 'PENDIENTE']
-                ).exists()
-                
-                if overlap:
-                    return Response({'error': 'Este horario ya está reservado. Por favor selecciona otro día u hora.'}, status=status.HTTP_400_BAD_REQUEST)
+            # El cupo (reservas + bloqueos de otros) se verifica con el lock, dentro de la transacción
 
             # Alinear fecha_evento y hora_inicio con horario
             data['fecha_evento'] = horario.fecha
@@ -909,6 +1049,8 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 if not serializer.is_valid():
                     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+                # Lock del horario + verificación del cupo antes de insertar (consume el bloqueo propio)
+                tomar_cupo(horario.id, using=active_db, cliente=cliente)
                 reserva = serializer.save()
 
                 # Detalle
@@ -960,6 +1102,10 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 headers=headers
             )
 
+        except HorarioBloqueado:
+            return Response({'error': 'Otra persona está reservando este horario en este momento. Intenta de nuevo.'}, status=status.HTTP_409_CONFLICT)
+        except HorarioSinCupo:
+            return Response({'error': 'Este horario ya está reservado. Por favor selecciona otro día u hora.'}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             traceback.print_exc()
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -983,6 +1129,95 @@ class CancelacionViewSet(viewsets.ModelViewSet):
 # 4. GESTIÓN DEL CARRITO COMPLETA
 # ==========================================
 
+MAX_ITEMS_LOTE = 50
+
+
+def leer_pedidos_lote(items):
+    """
+    Valida [{"tipo", "item_id", "cantidad"}, ...] y lo agrupa por (tipo, id):
+    repetidos en el mismo pedido suman. Devuelve (pedidos, error).
+    """
+    if not isinstance(items, list) or not items:
+        return None, 'Se espera "items": una lista de {tipo, item_id, cantidad}'
+    if len(items) > MAX_ITEMS_LOTE:
+        return None, f'Máximo {MAX_ITEMS_LOTE} items por pedido'
+
+    pedidos = {}
+    for posicion, item in enumerate(items):
+        try:
+            tipo = item['tipo']
+            item_id = int(item['item_id'])
+            cantidad = int(item.get('cantidad', 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None, f'Item {posicion}: se requieren tipo, item_id y cantidad numérica'
+        if tipo not in PRODUCTOS_CARRITO:
+            return None, f'Item {posicion}: tipo "{tipo}" no válido'
+        if cantidad < 1:
+            return None, f'Item {posicion}: la cantidad debe ser mayor a 0'
+        pedidos[(tipo, item_id)] = pedidos.get((tipo, item_id), 0) + cantidad
+    return pedidos, None
+
+
+def buscar_productos(pedidos):
+    """Un in_bulk por tipo. Devuelve ({tipo: {id: producto}}, faltantes)."""
+    productos = {}
+    for tipo, (modelo, _) in PRODUCTOS_CARRITO.items():
+        ids = [item_id for (t, item_id) in pedidos if t == tipo]
+        if ids:
+            productos[tipo] = modelo.objects.in_bulk(ids)
+    faltantes = [
+        f'{tipo} {item_id}' for (tipo, item_id) in pedidos
+        if item_id not in productos.get(tipo, {})
+    ]
+    return productos, faltantes
+
+
+def sumar_al_carrito(cliente, pedidos, productos):
+    """
+    Upsert de los pedidos en el carrito del cliente, en una transacción:
+    un bulk_update para los items que ya estaban (suma cantidades) y un
+    bulk_create para los nuevos. Devuelve el carrito.
+    """
+    with transaction.atomic():
+        carrito, _ = Carrito.objects.get_or_create(cliente=cliente)
+        existentes = {}
+        for item in carrito.items.select_for_update():
+            for tipo, (_, campo) in PRODUCTOS_CARRITO.items():
+                producto_id = getattr(item, f'{campo}_id')
+                if producto_id:
+                    existentes.setdefault((tipo, producto_id), item)
+                    break
+
+        actualizar, crear = [], []
+        delta_items, delta_subtotal = 0, 0
+        for (tipo, item_id), cantidad in pedidos.items():
+            producto = productos[tipo][item_id]
+            precio = precio_de_producto(tipo, producto)
+            item = existentes.get((tipo, item_id))
+            if item:
+                _, cantidad_antes, subtotal_antes = item.aporte()
+                item.cantidad += cantidad
+                item.precio_unitario = precio
+                actualizar.append(item)
+            else:
+                campo = PRODUCTOS_CARRITO[tipo][1]
+                item = ItemCarrito(carrito=carrito, cantidad=cantidad, precio_unitario=precio, **{campo: producto})
+                item.copiar_producto()  # bulk_create no pasa por save()
+                cantidad_antes, subtotal_antes = 0, 0
+                crear.append(item)
+            _, cantidad_ahora, subtotal_ahora = item.aporte()
+            delta_items += cantidad_ahora - cantidad_antes
+            delta_subtotal += subtotal_ahora - subtotal_antes
+
+        if actualizar:
+            ItemCarrito.objects.bulk_update(actualizar, ['cantidad', 'precio_unitario'])
+        if crear:
+            ItemCarrito.objects.bulk_create(crear)
+        # bulk_* no pasan por ItemCarrito.save(): los totales se ajustan una vez para todo el lote
+        Carrito.ajustar_totales(carrito.pk, delta_items, delta_subtotal)
+    return carrito
+
+
 # A. Vista para agregar items
 @api_view(['POST'])
 @authentication_classes([TokenAuthentication])
@@ -1015,15 +1250,13 @@ def agregar_al_carrito(request):
 
         if tipo == 'servicio':
             servicio_obj = get_object_or_404(Servicio, pk=item_id)
-            precio = servicio_obj.precio_base
+            precio = precio_de_producto(tipo, servicio_obj)
         elif tipo == 'combo':
             combo_obj = get_object_or_404(Combo, pk=item_id)
-            # Intentar precio_combo primero, luego precio_total si existe (fallback)
-            precio = combo_obj.precio_combo or getattr(combo_obj, 'precio_total', 0)
+            precio = precio_de_producto(tipo, combo_obj)
         elif tipo == 'promocion':
             promocion_obj = get_object_or_404(Promocion, pk=item_id)
-            # Priorizar precio > 0, si es 0 usar descuento_monto
-            precio = promocion_obj.precio if promocion_obj.precio > 0 else (promocion_obj.descuento_monto or 0)
+            precio = precio_de_producto(tipo, promocion_obj)
         
         if not servicio_obj and not combo_obj and not promocion_obj:
             return Response({'error': 'Producto no encontrado'}, status=404)
@@ -1050,10 +1283,132 @@ def agregar_al_carrito(request):
         print(f"ERROR CARRITO: {str(e)}")
         return Response({'error': str(e)}, status=500)
 
+# A.2 Agregar varios items en un solo pedido (ej: botón "reservar este paquete")
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def agregar_lote_al_carrito(request):
+    """
+    Recibe {"items": [{"tipo", "item_id", "cantidad"}, ...]}.
+    - Un in_bulk por tipo de producto
+    - Upsert de los items en una transacción: un bulk_update para los que ya
+      estaban (suma cantidades) y un bulk_create para los nuevos
+    Devuelve el carrito actualizado.
+    """
+    pedidos, error = leer_pedidos_lote(request.data.get('items'))
+    if error:
+        return Response({'error': error}, status=400)
+
+    cliente = RegistroUsuario.objects.filter(email=request.user.email).first()
+    if not cliente:
+        return Response({'error': 'No se encontró tu perfil de cliente.'}, status=404)
+
+    productos, faltantes = buscar_productos(pedidos)
+    if faltantes:
+        return Response({'error': 'Productos no encontrados', 'faltantes': faltantes}, status=404)
+
+    carrito = sumar_al_carrito(cliente, pedidos, productos)
+    carrito = Carrito.objects.prefetch_related('items').get(pk=carrito.pk)
+    return Response(CarritoSerializer(carrito, context={'request': request}).data, status=200)
+
+# A.3 Resumen para el badge del carrito: dos columnas, sin cargar items
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def resumen_carrito(request):
+    resumen = (
+        Carrito.objects.filter(cliente__email=request.user.email)
+        .values('total_items', 'subtotal').first()
+    ) or {'total_items': 0, 'subtotal': Decimal('0.00')}
+    return Response({**resumen, 'subtotal': importe(resumen['subtotal'])})
+
+# A.4 Carrito de invitado: vive en la cache (cookie firmada), sin escrituras a la base
+def _respuesta_carrito_invitado(pedidos, productos):
+    items, total_items, subtotal = [], 0, Decimal('0.00')
+    for (tipo, item_id), cantidad in pedidos.items():
+        producto = productos.get(tipo, {}).get(item_id)
+        if producto is None:
+            continue  # Borrado del catálogo desde que se agregó
+        precio = Decimal(str(precio_de_producto(tipo, producto)))
+        items.append({
+            'tipo': tipo, 'item_id': item_id, 'nombre': producto.nombre,
+            'cantidad': cantidad, 'precio_unitario': importe(precio), 'subtotal': importe(precio * cantidad),
+        })
+        total_items += cantidad
+        subtotal += precio * cantidad
+    return Response({'items': items, 'total_items': total_items, 'subtotal': importe(subtotal)})
+
+
+@api_view(['GET', 'POST', 'DELETE'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def carrito_invitado(request):
+    """
+    GET: carrito con precios actuales.
+    POST {"items": [...]}: suma items (mismo formato que agregar-lote).
+    DELETE: vacía el carrito, o quita un producto con ?tipo=&item_id=.
+    Al iniciar sesión el carrito se pasa al Carrito del cliente (LoginView).
+    """
+    clave = carrito_invitado_store.clave_de_request(request)
+    pedidos = carrito_invitado_store.leer_carrito(clave)
+
+    if request.method == 'POST':
+        nuevos, error = leer_pedidos_lote(request.data.get('items'))
+        if error:
+            return Response({'error': error}, status=400)
+        _, faltantes = buscar_productos(nuevos)
+        if faltantes:
+            return Response({'error': 'Productos no encontrados', 'faltantes': faltantes}, status=404)
+        for producto, cantidad in nuevos.items():
+            pedidos[producto] = pedidos.get(producto, 0) + cantidad
+        clave = clave or carrito_invitado_store.nueva_clave()
+        carrito_invitado_store.guardar_carrito(clave, pedidos)
+    elif request.method == 'DELETE':
+        tipo, item_id = request.query_params.get('tipo'), request.query_params.get('item_id')
+        if tipo or item_id:
+            try:
+                pedidos.pop((tipo, int(item_id)), None)
+            except (TypeError, ValueError):
+                return Response({'error': 'item_id debe ser numérico'}, status=400)
+        else:
+            pedidos = {}
+        if clave:
+            carrito_invitado_store.guardar_carrito(clave, pedidos)
+
+    productos, _ = buscar_productos(pedidos)
+    response = _respuesta_carrito_invitado(pedidos, productos)
+    if clave and request.method == 'POST':
+        # Renovar la cookie en cada escritura: vence junto con la entrada de la cache
+        carrito_invitado_store.firmar_cookie(response, clave)
+    return response
+
+
+def fusionar_carrito_invitado(request, response, cliente):
+    """
+    Pasa el carrito de invitado al Carrito del cliente con un solo upsert
+    (sumar_al_carrito) y borra la entrada de la cache y la cookie.
+    """
+    clave = carrito_invitado_store.clave_de_request(request)
+    if not clave or not cliente:
+        return
+    pedidos = carrito_invitado_store.leer_carrito(clave)
+    if pedidos:
+        productos, _ = buscar_productos(pedidos)
+        # Los productos borrados del catálogo desde que se agregaron se descartan
+        pedidos = {
+            (tipo, item_id): cantidad for (tipo, item_id), cantidad in pedidos.items()
+            if item_id in productos.get(tipo, {})
+        }
+        if pedidos:
+            sumar_al_carrito(cliente, pedidos, productos)
+    carrito_invitado_store.borrar_carrito(clave)
+    carrito_invitado_store.borrar_cookie(response)
+
 # B. Vista para confirmar y convertir en Reserva
 @api_view(['POST'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotente
 def confirmar_carrito(request):
     print("--- CONFIRMANDO RESERVA ---")
     try:
@@ -1065,31 +1420,6 @@ def confirmar_carrito(request):
             return Response({'error': 'Fecha y dirección son obligatorias'}, status=400)
 
         cliente = RegistroUsuario.objects.filter(email=request.user.email).first()
-        carrito = Carrito.objects.filter(cliente=cliente).first()
-
-        if not carrito or not carrito.items.exists():
-            return Response({'error': 'El carrito está vacío'}, status=400)
-
-        # Calcular Totales
-        subtotal_total = sum(item.subtotal for item in carrito.items.all())
-        impuestos = float(subtotal_total) * 0.12 # Ejemplo 12%
-        total = float(subtotal_total) + impuestos
-
-        # Asignar un horario disponible (Lógica simplificada: toma el primero del día)
-        # Nota: Idealmente el usuario debería elegir el bloque horario específico
-        horario = HorarioDisponible.objects.filter(fecha=fecha_evento).first()
-        
-        if not horario:
-            return Response({'error': f'No hay disponibilidad abierta para el {fecha_evento}'}, status=400)
-
-        # Blindaje en confirmar_carrito
-        overlap_carrito = Reserva.objects.filter(
-            fecha_evento=fecha_evento,
-            estado__in=['APROBADA', 'PENDIENTE']
-        ).exists()
-        
-        if overlap_carrito:
-            return Response({'error': 'Lo sentimos, este día ya ha sido reservado por otro usuario mientras procesabas tu pedido.'}, status=400)
 
         # Determinar base de datos activa para la transacción
         from django.db import router
@@ -1097,6 +1427,56 @@ def confirmar_carrito(request):
 
         # Transacción Atómica: O se guarda todo (reserva + detalles) o nada.
         with transaction.atomic(using=active_db):
+            # Lock del carrito: un segundo confirmar del mismo carrito espera acá y
+            # después lo encuentra vacío; los items se leen bajo el lock
+            carrito = Carrito.objects.using(active_db).select_for_update().filter(cliente=cliente).first()
+            items = list(
+                ItemCarrito.objects.using(active_db).filter(carrito=carrito)
+                .select_related('servicio', 'combo', 'promocion')
+            ) if carrito else []
+
+            if not items:
+                return Response({'error': 'El carrito está vacío'}, status=400)
+
+            # Revisión de precios contra el catálogo actual. Si algo cambió (precio,
+            # promoción vencida) se corrige el carrito (se guarda al salir del bloque)
+            # y no se reserva: el cliente ve las diferencias y confirma de nuevo.
+            items, cambios = repreciar_items(items, using=active_db)
+            if cambios:
+                carrito.refresh_from_db(fields=['total_items', 'subtotal'])
+                return Response({
+                    'error': 'Los precios de tu carrito cambiaron. Revisa el nuevo total y confirma de nuevo.',
+                    'cambios': [
+                        {**c, 'precio_anterior': importe(c['precio_anterior']), 'precio_actual': importe(c['precio_actual'])}
+                        for c in cambios
+                    ],
+                    'total_items': carrito.total_items,
+                    'subtotal': importe(carrito.subtotal),
+                }, status=409)
+
+            # Calcular Totales con los items que realmente se reservan (no con el contador)
+            subtotal_total = sum((item.aporte()[2] for item in items), Decimal('0'))
+            impuestos = float(subtotal_total) * 0.12 # Ejemplo 12%
+            total = float(subtotal_total) + impuestos
+
+            # Asignar un horario disponible (Lógica simplificada: toma el primero del día con cupo)
+            # Nota: Idealmente el usuario debería elegir el bloque horario específico
+            if not HorarioDisponible.objects.filter(fecha=fecha_evento).exists():
+                return Response({'error': f'No hay disponibilidad abierta para el {fecha_evento}'}, status=400)
+
+            # Blindaje en confirmar_carrito: un solo evento por día, verificado con
+            # los horarios del día bloqueados (dos checkouts del mismo día no pasan juntos)
+            tomar_dia(fecha_evento, using=active_db)
+
+            # Horario con cupo (contador de ocupación + bloqueos de otros clientes).
+            # Si el cliente retuvo un horario de ese día, se usa ese.
+            horario = primer_horario_con_cupo(fecha_evento, cliente)
+            if not horario:
+                return Response({'error': 'Lo sentimos, este día ya ha sido reservado por otro usuario mientras procesabas tu pedido.'}, status=409)
+
+            # 0. Lock del horario y re-verificación del cupo (el chequeo de arriba fue sin lock)
+            tomar_cupo(horario.id, using=active_db, cliente=cliente)
+
             # 1. Crear Reserva
             nueva_reserva = Reserva.objects.create(
                 cliente=cliente,
@@ -1111,38 +1491,41 @@ def confirmar_carrito(request):
                 estado='PENDIENTE'
             )
 
-            # 2. Mover items de Carrito a DetalleReserva
-            print(f"DEBUG: Moviendo {carrito.items.count()} items al detalle de reserva...")
-            for item in carrito.items.all():
-                try:
-                    detalle = DetalleReserva.objects.create(
-                        reserva=nueva_reserva,
-                        tipo='S' if item.servicio else ('C' if item.combo else 'P'),
-                        servicio=item.servicio,
-                        combo=item.combo,
-                        promocion=item.promocion,
-                        cantidad=item.cantidad,
-                        precio_unitario=item.precio_unitario,
-                        subtotal=item.subtotal
-                    )
-                    print(f"DEBUG: Detalle creado ID={detalle.id} | Tipo={detalle.tipo} | Combo={detalle.combo}")
-                except Exception as e:
-                    print(f"DEBUG ERROR creando detalle: {e}")
-                    raise e # Re-raise to trigger atomic rollback
-            
-            # 3. Vaciar Carrito
-            carrito.items.all().delete()
+            # 2. Mover items de Carrito a DetalleReserva (ya leídos bajo el lock):
+            # un solo INSERT, sin importar el tamaño del carrito
+            detalles = [
+                DetalleReserva(
+                    reserva=nueva_reserva,
+                    tipo='S' if item.servicio_id else ('C' if item.combo_id else 'P'),
+                    servicio=item.servicio,
+                    combo=item.combo,
+                    promocion=item.promocion,
+                    cantidad=item.cantidad,
+                    precio_unitario=item.precio_unitario,
+                    subtotal=item.subtotal
+                )
+                for item in items
+            ]
+            for detalle in detalles:
+                detalle.copiar_producto()  # bulk_create no pasa por save()
+            DetalleReserva.objects.using(active_db).bulk_create(detalles)
+
+            # 3. Vaciar Carrito: los items movidos, y los totales recalculados de lo que
+            # queda (con el carrito bloqueado: 0 / 0), no descontados del contador
+            ItemCarrito.borrar_en_bloque(
+                ItemCarrito.objects.using(active_db).filter(pk__in=[item.pk for item in items]), ajustar=False,
+            )
+            Carrito.recalcular_totales(carrito.pk, using=active_db)
 
             # Silencioso al inicio
             # Enviar correo de confirmación de recepción (PENDIENTE)
             try:
                 # Pasamos los items en formato procesado para no depender de la DB en el template si hay delay
                 detalles_memoria = []
-                for item in carrito.items.all():
-                    tipo_char = 'S' if item.servicio else ('C' if item.combo else 'P')
-                    nombre = item.servicio.nombre if item.servicio else (item.combo.nombre if item.combo else item.promocion.nombre)
-                    detalles_memoria.append({'nombre': nombre, 'cantidad': item.cantidad, 'subtotal': item.subtotal})
-                
+                for detalle in detalles:
+                    nombre = detalle.nombre_item or "Item no especificado"
+                    detalles_memoria.append({'nombre': nombre, 'cantidad': detalle.cantidad, 'subtotal': detalle.subtotal})
+
                 enviar_correo_reserva(nueva_reserva.id, detalles_previa_carga=detalles_memoria)
             except Exception as e:
                 print(f"⚠️ Error enviando correo inicial: {e}")
@@ -1153,6 +1536,10 @@ def confirmar_carrito(request):
             'codigo': nueva_reserva.codigo_reserva
         }, status=201)
 
+    except HorarioBloqueado:
+        return Response({'error': 'Otra persona está reservando este día en este momento. Intenta de nuevo.'}, status=409)
+    except HorarioSinCupo:
+        return Response({'error': 'Lo sentimos, este día ya ha sido reservado por otro usuario mientras procesabas tu pedido.'}, status=409)
     except Exception as e:
         print(f"ERROR CONFIRMACION: {str(e)}")
         return Response({'error': str(e)}, status=500)
@@ -1161,6 +1548,7 @@ def confirmar_carrito(request):
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser, JSONParser])
+@idempotente
 def checkout_pago(request, reserva_id):
     """
     Endpoint para que el usuario elija el método de pago y suba el comprobante si es transferencia.
@@ -1200,7 +1588,10 @@ def checkout_pago(request, reserva_id):
         reserva.comprobante_pago = None
         reserva.transaccion_id = None
         
-    reserva.save()
+    try:
+        reserva.save()
+    except IntegrityError:
+        return Response({'error': 'ANTIFRAUDE: Este ID de transacción ya fue utilizado en otra reserva.'}, status=400)
     
     # Notificar por correo del cambio de método (opcional, pero útil)
     # Por ahora, si es tarjeta y tenemos ID, podríamos enviar el correo de confirmación
@@ -1341,7 +1732,8 @@ class CarritoViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            return Carrito.objects.filter(cliente__email=user.email)
+            # Nombre e imagen de cada item vienen en la misma fila (sin JOIN a productos)
+            return Carrito.objects.filter(cliente__email=user.email).prefetch_related('items')
         return Carrito.objects.none()
 
 